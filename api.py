@@ -0,0 +1,481 @@
+"""
+Local JSON HTTP API for the cost-per-WELLBY model.
+
+Exposes the calculations behind the programme, Marginal Costs and Overall tabs so
+partners can call them from spreadsheets and notebooks without Streamlit:
+
+    GET  /health          Liveness check
+    GET  /defaults        Default inputs of every scenario field
+    GET  /stats           Request, cache and coalescing counters
+    POST /programme       {"programme": "Insomnia", "retention_rate": 0.7, ...}
+    POST /branch-costs    {"coaches_per_cohort": 15, "counsellor_salary": 500, ...}
+    POST /overall         One scenario (see below)
+    POST /batch           {"scenarios": [scenario, ...], "format": "records" | "columns", "gradients": false}
+
+A scenario overrides any of the defaults; everything it leaves out takes the app's
+default slider value:
+
+    {
+        "cost_per_session": 2.36,
+        "branch": {"coaches_per_cohort": 15, ...},
+        "programmes": {"Insomnia": {"retention_rate": 0.7, "annual_decay_rate": 0.6, ...}},
+        "overall": {"num_branches": 3, "fixed_costs": 100000, "client_shares": {"Insomnia": 20, ...}}
+    }
+
+Rates and proportions are fractions (0-1). An explicit "cost_per_session" wins over one
+derived from "branch". Programmes use exponential decay, as in the sampling analyses.
+
+A batch is evaluated as arrays in one vectorized pass. "columns" returns one list per
+result field instead of one object per scenario, which is several times faster to
+encode and parse for large batches. With "gradients": true each result also has the
+exact derivatives and elasticities of every cost per WELLBY with respect to every input
+(see gradients.py), computed in the same pass. Evaluations run on a bounded
+worker pool; identical payloads that arrive while one is being evaluated share its
+result, and responses are kept in an LRU cache.
+
+Usage:
+    python api.py [--host 127.0.0.1] [--port 8600] [--workers 4]
+"""
+import argparse
+import hashlib
+import json
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from config import (
+    offerings,
+    DEFAULT_COST_PER_SESSION,
+    DEFAULT_COACHES_PER_COHORT,
+    DEFAULT_CLIENTS_PER_COACH,
+    DEFAULT_SESSIONS_PER_CLIENT,
+    DEFAULT_COUNSELLOR_SALARY,
+    DEFAULT_HEAD_OF_TRAINING_SALARY,
+    DEFAULT_VA_SALARY,
+    DEFAULT_BRANCH_MANAGER_SALARY,
+    DEFAULT_HIRING_MANAGER_SALARY,
+    DEFAULT_OTHER_SALARY,
+    DEFAULT_TIMEFRAME_OF_INTEREST_MONTHS,
+    DEFAULT_NUM_BRANCHES,
+    ORGANISATION_FIXED_COSTS,
+    API_HOST,
+    API_PORT,
+    API_WORKERS,
+    API_CACHE_ENTRIES,
+    API_MAX_BATCH_SCENARIOS,
+    API_MAX_BODY_BYTES
+)
+from model import (
+    WEEKS_PER_YEAR,
+    PROGRAMME_RESULT_FIELDS,
+    calculate_branch_costs,
+    programme_outcomes,
+    overall_outcomes,
+    clients_per_branch_per_year
+)
+from uncertainty import programme_default_inputs
+from gradients import model_gradients, cost_per_session_gradient, elasticities
+
+BRANCH_DEFAULTS = {
+    "coaches_per_cohort": DEFAULT_COACHES_PER_COHORT,
+    "clients_per_coach": DEFAULT_CLIENTS_PER_COACH,
+    "sessions_per_client": DEFAULT_SESSIONS_PER_CLIENT,
+    "counsellor_salary": DEFAULT_COUNSELLOR_SALARY,
+    "head_of_training_salary": DEFAULT_HEAD_OF_TRAINING_SALARY,
+    "va_salary": DEFAULT_VA_SALARY,
+    "branch_manager_salary": DEFAULT_BRANCH_MANAGER_SALARY,
+    "hiring_manager_salary": DEFAULT_HIRING_MANAGER_SALARY,
+    "other_salary": DEFAULT_OTHER_SALARY,
+    "final_roleplay_assessment": True,
+    "hiring_manager_enabled": True,
+}
+PROGRAMME_FIELDS = [
+    "retention_rate",
+    "baseline_wellbeing",
+    "peak_wellbeing",
+    "annual_decay_rate",
+    "harm_proportion",
+    "sessions_per_participant",
+    "num_participants",
+]
+OVERALL_INPUTS = ["num_branches", "fixed_costs", "client_shares"]
+OVERALL_FIELDS = {
+    "Clients Seen": "clients_seen",
+    "Marginal Programme Cost": "marginal_cost",
+    "WELLBYs Generated": "wellbys",
+    "Clients Retained": "clients_retained",
+    "Allocated Fixed Costs": "allocated_fixed_costs",
+    "Total Cost per WELLBY": "total_cost_per_wellby",
+}
+OVERALL_TOTALS = {
+    "Total Marginal Cost": "total_marginal_cost",
+    "Total WELLBYs": "total_wellbys",
+    "Marginal Cost per WELLBY": "marginal_cost_per_wellby",
+    "Overall Total Cost per WELLBY": "overall_total_cost_per_wellby",
+}
+
+
+class RequestError(ValueError):
+    """The request is malformed; sent back as a 400 response."""
+
+
+def programme_defaults(programme):
+    defaults = programme_default_inputs(programme)
+    defaults["num_participants"] = offerings[programme]["num_participants"]
+    defaults.pop("cost_per_session")
+    return defaults
+
+
+def scenario_defaults():
+    return {
+        "cost_per_session": DEFAULT_COST_PER_SESSION,
+        "branch": dict(BRANCH_DEFAULTS),
+        "programmes": {programme: programme_defaults(programme) for programme in offerings},
+        "overall": {
+            "num_branches": DEFAULT_NUM_BRANCHES,
+            "fixed_costs": ORGANISATION_FIXED_COSTS,
+            "client_shares": {programme: defaults["default_client_share"] for programme, defaults in offerings.items()},
+        },
+    }
+
+
+def _section(scenario, name):
+    section = scenario.get(name) or {}
+    if not isinstance(section, dict):
+        raise RequestError(f"'{name}' must be an object")
+    return section
+
+
+def _check_fields(section, allowed, what):
+    unknown = set(section) - set(allowed)
+    if unknown:
+        raise RequestError(f"Unknown {what}: {sorted(unknown)}")
+
+
+def _flag_column(sections, field, default):
+    """A true/false input across all scenarios; only JSON booleans are accepted."""
+    values = [section.get(field, default) for section in sections]
+    if not all(isinstance(value, bool) for value in values):
+        raise RequestError(f"'{field}' must be true or false in every scenario")
+    return np.array(values, dtype=bool)
+
+
+def _column(sections, field, default, dtype=float):
+    """One input across all scenarios as an array, taking the default where it is missing."""
+    values = [section.get(field, default) for section in sections]
+    try:
+        column = np.array(values, dtype=dtype)
+    except (TypeError, ValueError):
+        raise RequestError(f"'{field}' must be a number in every scenario") from None
+    if dtype is float and not np.isfinite(column).all():
+        raise RequestError(f"'{field}' must be finite in every scenario")
+    return column
+
+
+def _gradient_columns(programme_inputs, overall_inputs, cost_per_session, branch_inputs, derived_cost_per_session, timeframe_weeks):
+    """Derivatives and elasticities of each cost per WELLBY, with the branch inputs driving the cost per session."""
+    gradients = model_gradients(programme_inputs, overall_inputs, cost_per_session=cost_per_session, timeframe_weeks=timeframe_weeks)
+    _, staffing_gradient = cost_per_session_gradient(branch_inputs)
+    columns = {"programmes": {}}
+    for programme, result in [(None, gradients["overall"])] + list(gradients["programmes"].items()):
+        gradient, values = dict(result["gradient"]), dict(result["inputs"])
+        for name, derivative in staffing_gradient.items():
+            # Only where the cost per session comes from the branch inputs
+            gradient[f"branch/{name}"] = np.where(derived_cost_per_session, gradient["cost_per_session"] * derivative, 0.0)
+            values[f"branch/{name}"] = branch_inputs[name]
+        for name in ("coaches_per_cohort", "clients_per_coach"):
+            # The Overall tab's capacity uses the default staffing, not an input of the scenario
+            if name in gradient:
+                gradient.pop(name)
+                values.pop(name)
+        column = {"derivative": gradient, "elasticity": elasticities(result["cost_per_wellby"], gradient, values)}
+        if programme is None:
+            columns["overall"] = column
+        else:
+            columns["programmes"][programme] = column
+    return columns
+
+
+def evaluate_scenarios(scenarios, gradients=False):
+    """
+    Evaluate a batch of scenarios in one vectorized pass.
+
+    Returns a dict of result columns (arrays with one entry per scenario), nested like
+    a scenario: "branch", "programmes" and "overall", plus "gradients" if asked for.
+    """
+    if not isinstance(scenarios, list) or not scenarios:
+        raise RequestError("'scenarios' must be a non-empty list")
+    if len(scenarios) > API_MAX_BATCH_SCENARIOS:
+        raise RequestError(f"At most {API_MAX_BATCH_SCENARIOS:,} scenarios per request")
+    if not all(isinstance(scenario, dict) for scenario in scenarios):
+        raise RequestError("Every scenario must be an object")
+
+    # Marginal Costs tab: branch costs, and the cost per session they imply
+    branch_sections = [_section(scenario, "branch") for scenario in scenarios]
+    for section in branch_sections:
+        _check_fields(section, BRANCH_DEFAULTS, "branch inputs")
+    branch_inputs = {
+        field: _flag_column(branch_sections, field, default) if isinstance(default, bool) else _column(branch_sections, field, default)
+        for field, default in BRANCH_DEFAULTS.items()
+    }
+    branch = calculate_branch_costs(**branch_inputs)
+    has_branch = np.array([bool(section) for section in branch_sections])
+    cost_per_session = np.where(has_branch, branch["cost_per_session"], DEFAULT_COST_PER_SESSION)
+    explicit = np.array(["cost_per_session" in scenario for scenario in scenarios])
+    cost_per_session = np.where(explicit, _column(scenarios, "cost_per_session", DEFAULT_COST_PER_SESSION), cost_per_session)
+
+    # Programme tabs
+    timeframe_weeks = DEFAULT_TIMEFRAME_OF_INTEREST_MONTHS / 12 * WEEKS_PER_YEAR
+    programme_sections = [_section(scenario, "programmes") for scenario in scenarios]
+    for section in programme_sections:
+        _check_fields(section, offerings, "programmes")
+    programme_results = {}
+    programme_inputs = {}
+    for programme in offerings:
+        sections = [_section(section, programme) for section in programme_sections]
+        defaults = programme_defaults(programme)
+        for section in sections:
+            _check_fields(section, defaults, f"{programme} inputs")
+        inputs = {field: _column(sections, field, default) for field, default in defaults.items()}
+        programme_inputs[programme] = inputs
+        programme_results[programme] = programme_outcomes(
+            retention_rate=inputs["retention_rate"],
+            wellbeing_gain=inputs["peak_wellbeing"] - inputs["baseline_wellbeing"],
+            annual_decay_rate=inputs["annual_decay_rate"],
+            harm_proportion=inputs["harm_proportion"],
+            cost_per_session=cost_per_session,
+            sessions_per_participant=inputs["sessions_per_participant"],
+            num_participants=inputs["num_participants"],
+            timeframe_weeks=timeframe_weeks
+        )
+
+    # Overall tab, with programmes on the first axis
+    overall_sections = [_section(scenario, "overall") for scenario in scenarios]
+    share_sections = [_section(section, "client_shares") for section in overall_sections]
+    for section, shares in zip(overall_sections, share_sections):
+        _check_fields(section, OVERALL_INPUTS, "overall inputs")
+        _check_fields(shares, offerings, "programmes in 'client_shares'")
+    num_branches = _column(overall_sections, "num_branches", DEFAULT_NUM_BRANCHES)
+    if ((num_branches < 1) | (num_branches != np.floor(num_branches))).any():
+        raise RequestError("'num_branches' must be a whole number of at least 1 in every scenario")
+    default_shares = scenario_defaults()["overall"]["client_shares"]
+    programmes = list(offerings)
+    clients_seen = np.stack([np.broadcast_to(programme_results[p]["Total Clients Seen"], cost_per_session.shape) for p in programmes])
+    safe_clients = np.where(clients_seen > 0, clients_seen, np.inf)
+    overall_inputs = {
+        "client_shares": {p: _column(share_sections, p, default_shares[p]) for p in programmes},
+        "num_branches": num_branches,
+        "fixed_costs": _column(overall_sections, "fixed_costs", ORGANISATION_FIXED_COSTS),
+        # As on the Overall tab, capacity uses the default staffing; the branch inputs only set the cost per session
+        "coaches_per_cohort": DEFAULT_COACHES_PER_COHORT,
+        "clients_per_coach": DEFAULT_CLIENTS_PER_COACH,
+    }
+    overall = overall_outcomes(
+        np.stack([programme_results[p]["Total Cost (Money Spent)"] for p in programmes]) / safe_clients,
+        np.stack([programme_results[p]["Net WELLBYs Generated"] for p in programmes]) / safe_clients,
+        np.stack([programme_results[p]["Clients Retained"] for p in programmes]) / safe_clients,
+        np.stack([overall_inputs["client_shares"][p] for p in programmes]),
+        num_branches=overall_inputs["num_branches"],
+        fixed_costs=overall_inputs["fixed_costs"],
+        branch_clients_per_year=clients_per_branch_per_year(overall_inputs["coaches_per_cohort"], overall_inputs["clients_per_coach"])
+    )
+
+    size = len(scenarios)
+    results = {
+        "cost_per_session": cost_per_session,
+        "branch": {key: np.broadcast_to(value, (size,)) for key, value in branch.items()},
+        "programmes": {
+            programme: {field: np.broadcast_to(results[key], (size,)) for key, field in PROGRAMME_RESULT_FIELDS.items()}
+            for programme, results in programme_results.items()
+        },
+        "overall": {
+            "programmes": {
+                programme: {field: overall[key][index] for key, field in OVERALL_FIELDS.items()}
+                for index, programme in enumerate(programmes)
+            },
+            **{field: np.broadcast_to(overall[key], (size,)) for key, field in OVERALL_TOTALS.items()},
+        },
+    }
+    if gradients:
+        gradient_columns = _gradient_columns(
+            programme_inputs, overall_inputs, cost_per_session, branch_inputs, has_branch & ~explicit, timeframe_weeks
+        )
+        results["gradients"] = _broadcast(gradient_columns, size)
+    return results
+
+
+def _broadcast(columns, size):
+    if isinstance(columns, dict):
+        return {key: _broadcast(value, size) for key, value in columns.items()}
+    return np.broadcast_to(columns, (size,))
+
+
+def _to_json(columns):
+    """Result columns as JSON-ready lists, with NaN and infinities as null."""
+    if isinstance(columns, dict):
+        return {key: _to_json(value) for key, value in columns.items()}
+    values = np.asarray(columns, dtype=float)
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def _record(columns, index):
+    if isinstance(columns, dict):
+        return {key: _record(value, index) for key, value in columns.items()}
+    return columns[index]
+
+
+POST_ENDPOINTS = ("/batch", "/programme", "/branch-costs", "/overall")
+
+
+def handle(endpoint, payload):
+    """The JSON response for a POST to `endpoint`."""
+    if not isinstance(payload, dict):
+        raise RequestError("The request body must be a JSON object")
+    if endpoint == "/batch":
+        output_format = payload.get("format", "records")
+        if output_format not in ("records", "columns"):
+            raise RequestError("'format' must be 'records' or 'columns'")
+        gradients = payload.get("gradients", False)
+        if not isinstance(gradients, bool):
+            raise RequestError("'gradients' must be true or false")
+        columns = _to_json(evaluate_scenarios(payload.get("scenarios"), gradients=gradients))
+        if output_format == "columns":
+            return {"results": columns}
+        return {"results": [_record(columns, index) for index in range(len(payload["scenarios"]))]}
+    if endpoint == "/programme":
+        programme = payload.get("programme")
+        if programme not in offerings:
+            raise RequestError(f"'programme' must be one of {list(offerings)}")
+        scenario = {"programmes": {programme: {key: value for key, value in payload.items() if key in PROGRAMME_FIELDS}}}
+        if "cost_per_session" in payload:
+            scenario["cost_per_session"] = payload["cost_per_session"]
+        columns = _to_json(evaluate_scenarios([scenario]))
+        return dict(_record(columns["programmes"][programme], 0), cost_per_session=columns["cost_per_session"][0])
+    if endpoint == "/branch-costs":
+        return _record(_to_json(evaluate_scenarios([{"branch": payload}]))["branch"], 0)
+    if endpoint == "/overall":
+        return _record(_to_json(evaluate_scenarios([payload])), 0)
+    raise LookupError(endpoint)
+
+
+class ModelService:
+    """Worker pool with request coalescing and an LRU response cache."""
+
+    def __init__(self, workers=API_WORKERS, cache_entries=API_CACHE_ENTRIES):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._cache = OrderedDict()
+        self._cache_entries = cache_entries
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "cache_hits": 0, "coalesced": 0, "evaluations": 0}
+
+    def _evaluate(self, endpoint, payload):
+        with self._lock:
+            self.counters["evaluations"] += 1
+        return json.dumps(handle(endpoint, payload)).encode("utf-8")
+
+    def respond(self, endpoint, payload):
+        """Response body for a POST, shared with identical requests in flight or cached."""
+        key = hashlib.sha1((endpoint + json.dumps(payload, sort_keys=True)).encode("utf-8")).hexdigest()
+        with self._lock:
+            self.counters["requests"] += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.counters["cache_hits"] += 1
+                return self._cache[key]
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._pool.submit(self._evaluate, endpoint, payload)
+                self._in_flight[key] = future
+            else:
+                self.counters["coalesced"] += 1
+        try:
+            body = future.result()
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+        with self._lock:
+            self._cache[key] = body
+            while len(self._cache) > self._cache_entries:
+                self._cache.popitem(last=False)
+        return body
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, cached_responses=len(self._cache), in_flight=len(self._in_flight))
+
+
+def make_handler(service):
+    class ModelRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, body):
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "ok"})
+            elif self.path == "/defaults":
+                self._send(200, scenario_defaults())
+            elif self.path == "/stats":
+                self._send(200, service.stats())
+            else:
+                self._send(404, {"error": f"Unknown endpoint {self.path}"})
+
+        def do_POST(self):
+            if self.path not in POST_ENDPOINTS:
+                self._send(404, {"error": f"Unknown endpoint {self.path}"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > API_MAX_BODY_BYTES:
+                self._send(413, {"error": f"Request body over {API_MAX_BODY_BYTES:,} bytes"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(length) or b"null")
+                self._send(200, service.respond(self.path, payload))
+            except json.JSONDecodeError as error:
+                self._send(400, {"error": f"Invalid JSON: {error}"})
+            except RequestError as error:
+                self._send(400, {"error": str(error)})
+            except Exception as error:
+                # A bug, not a bad request: answer anyway and keep the traceback for the console
+                traceback.print_exc()
+                self._send(500, {"error": f"Internal error: {type(error).__name__}"})
+
+        def log_message(self, format, *args):
+            # Batch clients send many requests; keep the console for errors
+            pass
+
+    return ModelRequestHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the cost-per-WELLBY model as a local JSON API.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="Evaluations run at once")
+    parser.add_argument("--cache-entries", type=int, default=API_CACHE_ENTRIES, help="Responses kept in the cache")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(ModelService(args.workers, args.cache_entries)))
+    print(f"Serving the model on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 # Save this script as app.py
 
 import streamlit as st
-from config import offerings
+from config import offerings, RESULTS_LOG_ENABLED
 
 # Import tab display functions
 from tabs.model_params_tab import display_model_parameters_tab
@@ -9,6 +9,15 @@ from tabs.assumptions_tab import display_assumptions_tab
 from tabs.overall_tab import display_overall_comparison_tab
 from tabs.programme_tab import display_programme_tab
 from tabs.cost_per_session_tab import display_cost_per_session_tab
+from tabs.projection_tab import display_projection_tab
+from tabs.sensitivity_tab import display_sensitivity_tab
+from tabs.uncertainty_tab import display_uncertainty_tab
+from tabs.scenarios_tab import display_scenarios_tab
+from tabs.breakeven_tab import display_break_even_tab
+from tabs.boundaries_tab import display_boundaries_tab
+from results_store import log_scenario
+from graph import get_session_graph
+from sessions import start_rerun, finish_rerun
 
 
 # Set the page layout to wide
@@ -16,6 +25,9 @@ st.set_page_config(layout="wide")
 
 st.title('CEA: Coaching LMIC natives')
 
+# Mark this session active, and free the memory of sessions that have been idle
+start_rerun()
+
 # ==========================================================
 #                 INSTRUCTIONS
 # ==========================================================
@@ -34,8 +46,8 @@ st.title('CEA: Coaching LMIC natives')
 
 # Define tab names and create tabs
 programme_tab_names = list(offerings.keys())
-# New order: Intro, Programmes, Marginal Costs, Overall, Assumptions, Model Params
-tab_names = ["Intro"] + programme_tab_names + ["Marginal Costs", "Overall", "Assumptions", "Model Parameters"]
+# New order: Intro, Programmes, Marginal Costs, Overall, Scenarios, Break-even, Boundaries, Projection, Sensitivity, Uncertainty, Assumptions, Model Params
+tab_names = ["Intro"] + programme_tab_names + ["Marginal Costs", "Overall", "Scenarios", "Break-even", "Boundaries", "Projection", "Sensitivity", "Uncertainty", "Assumptions", "Model Parameters"]
 
 all_tabs = st.tabs(tab_names)
 
@@ -46,10 +58,18 @@ programme_st_tabs = all_tabs[1 : 1 + len(programme_tab_names)]
 next_tab_index = 1 + len(programme_tab_names)
 marginal_costs_tab_ui = all_tabs[next_tab_index]
 overall_tab_ui = all_tabs[next_tab_index + 1]
-assumptions_tab_ui = all_tabs[next_tab_index + 2]
-model_params_tab_ui = all_tabs[next_tab_index + 3]
+scenarios_tab_ui = all_tabs[next_tab_index + 2]
+break_even_tab_ui = all_tabs[next_tab_index + 3]
+boundaries_tab_ui = all_tabs[next_tab_index + 4]
+projection_tab_ui = all_tabs[next_tab_index + 5]
+sensitivity_tab_ui = all_tabs[next_tab_index + 6]
+uncertainty_tab_ui = all_tabs[next_tab_index + 7]
+assumptions_tab_ui = all_tabs[next_tab_index + 8]
+model_params_tab_ui = all_tabs[next_tab_index + 9]
 
 offering_results = {}
+# Memoized model calculations for this session, shared by the tabs below
+model_graph = get_session_graph(programme_tab_names)
 
 # --- Render Intro Tab ---
 with intro_tab_ui:
@@ -67,9 +87,15 @@ with intro_tab_ui:
 # --- Render Model Parameters Tab ---
 with model_params_tab_ui:
     (
-        cost_per_session_input,
+        cost_per_session_override,
         avg_sessions_dropouts_input
     ) = display_model_parameters_tab()
+model_graph.set("cost_per_session_override", cost_per_session_override)
+
+# --- Render Marginal Costs Tab ---
+# Rendered before the programme tabs because its cost per session feeds them
+with marginal_costs_tab_ui:
+    calculated_cost_per_session, branch_monthly_cost = display_cost_per_session_tab(model_graph)
 
 # --- Render Programme Tabs ---
 for i, tab_name in enumerate(programme_tab_names):
@@ -78,13 +104,14 @@ for i, tab_name in enumerate(programme_tab_names):
         offering_results[tab_name] = display_programme_tab(
             tab_name, 
             tab_defaults, 
-            cost_per_session_input,
+            model_graph,
             avg_sessions_dropouts_input
         )
 
-# --- Render Marginal Costs Tab ---
-with marginal_costs_tab_ui:
-    calculated_cost_per_session = display_cost_per_session_tab()
+# --- Render Projection Tab ---
+# Rendered before the Overall tab because its fixed costs can feed the Overall tables
+with projection_tab_ui:
+    fixed_costs = display_projection_tab(branch_monthly_cost)
 
 
 # --- Render Assumptions Tab ---
@@ -93,6 +120,34 @@ with assumptions_tab_ui:
 
 # --- Render Overall Comparison Tab ---
 with overall_tab_ui:
-    display_overall_comparison_tab(offering_results)
+    overall_results = display_overall_comparison_tab(offering_results, model_graph, fixed_costs)
+
+# --- Render Scenarios Tab ---
+# Rendered after the Overall tab so a saved scenario includes its inputs
+with scenarios_tab_ui:
+    display_scenarios_tab(model_graph)
+
+# --- Render Break-even Tab ---
+with break_even_tab_ui:
+    display_break_even_tab(model_graph)
+
+# --- Render Boundaries Tab ---
+with boundaries_tab_ui:
+    display_boundaries_tab(offering_results, overall_results)
+
+# --- Render Sensitivity Tab ---
+with sensitivity_tab_ui:
+    display_sensitivity_tab(offering_results, overall_results, model_graph)
+
+# --- Render Uncertainty Tab ---
+with uncertainty_tab_ui:
+    display_uncertainty_tab(offering_results, overall_results)
+
+# --- Log this rerun's scenario for later analysis ---
+if RESULTS_LOG_ENABLED:
+    log_scenario(offering_results, overall_results, model_graph.input_values())
+
+# --- Record how much memory this session holds ---
+finish_rerun()
 
 # All function definitions previously here should have been removed by this edit.
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+Conjugate updating of programme inputs from trial summary statistics.
+
+The prior for each input is the existing triangular range from config (low, current
+slider value, high), moment-matched to a conjugate family:
+
+- Retention: Beta prior, binomial likelihood (participants retained out of enrolled).
+- Wellbeing gain: Normal prior, Normal likelihood with the trial's standard error.
+
+Both posteriors are closed-form, so updating is instant. The sampling analyses draw
+from a posterior through its inverse CDF, tabulated once per posterior and cached, so
+random and quasi-random samples alike reuse it without recomputing.
+"""
+from functools import lru_cache
+
+import numpy as np
+from scipy import stats
+
+from config import trial_summaries
+
+# Probabilities at which posterior inverse CDFs are tabulated
+QUANTILE_GRID = np.linspace(0.0, 1.0, 4097)
+# Central interval reported as a posterior input's (low, high) range
+RANGE_PROBABILITIES = (0.005, 0.995)
+
+
+def triangular_moments(low, mode, high):
+    mean = (low + mode + high) / 3
+    variance = (low ** 2 + mode ** 2 + high ** 2 - low * mode - low * high - mode * high) / 18
+    return mean, variance
+
+
+def beta_from_moments(mean, variance):
+    # Shrink the variance if it is too wide for a Beta with this mean
+    variance = min(variance, 0.99 * mean * (1 - mean))
+    strength = mean * (1 - mean) / variance - 1
+    return mean * strength, (1 - mean) * strength
+
+
+def retention_posterior(prior_alpha, prior_beta, participants, retained, evidence_weight=1.0):
+    """Beta posterior (alpha, beta) of the retention rate."""
+    return (
+        prior_alpha + evidence_weight * retained,
+        prior_beta + evidence_weight * (participants - retained)
+    )
+
+
+def gain_posterior(prior_mean, prior_sd, observed_gain, standard_error, evidence_weight=1.0):
+    """Normal posterior (mean, sd) of the wellbeing gain."""
+    prior_precision = 1 / prior_sd ** 2
+    data_precision = evidence_weight / standard_error ** 2
+    precision = prior_precision + data_precision
+    mean = (prior_precision * prior_mean + data_precision * observed_gain) / precision
+    return mean, precision ** -0.5
+
+
+def _frozen(distribution, first, second):
+    if distribution == "beta":
+        return stats.beta(first, second)
+    return stats.norm(first, second)
+
+
+@lru_cache(maxsize=64)
+def inverse_cdf_table(distribution, first, second):
+    """Posterior quantiles at QUANTILE_GRID (the end points are clipped to finite values)."""
+    grid = np.clip(QUANTILE_GRID, 1e-6, 1 - 1e-6)
+    table = _frozen(distribution, first, second).ppf(grid)
+    table.flags.writeable = False
+    return table
+
+
+def draw_from_unit(unit_samples, posterior):
+    """Map samples in [0, 1) onto a posterior with its cached inverse CDF."""
+    table = inverse_cdf_table(posterior["distribution"], posterior["params"][0], posterior["params"][1])
+    return np.interp(unit_samples, QUANTILE_GRID, table)
+
+
+def _posterior(distribution, params):
+    frozen = _frozen(distribution, *params)
+    low, high = frozen.ppf(RANGE_PROBABILITIES)
+    return {
+        "distribution": distribution,
+        "params": (float(params[0]), float(params[1])),
+        "mean": float(frozen.mean()),
+        "low": float(low),
+        "high": float(high),
+    }
+
+
+def programme_posteriors(programme, retention_prior, gain_prior):
+    """
+    Posteriors of a programme's retention rate and wellbeing gain.
+
+    `retention_prior` is a (low, mode, high) triangle and `gain_prior` a (mean, variance)
+    pair. Returns {} if the programme has no trial data.
+    """
+    trial = trial_summaries.get(programme)
+    if trial is None:
+        return {}
+    weight = trial.get("evidence_weight", 1.0)
+    prior_alpha, prior_beta = beta_from_moments(*triangular_moments(*retention_prior))
+    gain_mean, gain_variance = gain_prior
+    return {
+        "retention_rate": _posterior("beta", retention_posterior(
+            prior_alpha, prior_beta, trial["participants"], trial["retained"], weight
+        )),
+        "wellbeing_gain": _posterior("norm", gain_posterior(
+            gain_mean, np.sqrt(gain_variance), trial["wellbeing_gain"], trial["wellbeing_gain_se"], weight
+        )),
+    }
@@ -0,0 +1,227 @@
+"""
+Break-even inputs: the value of one input that gives a target cost per WELLBY.
+
+Each input is solved for with every other input held at its current value. Most enter
+cost per WELLBY as a product or a ratio, so they are inverted exactly:
+
+    programme cost per WELLBY = sessions x cost per session x harm proportion
+                                / (wellbeing gain x weeks of benefit / 52 x retention rate)
+
+The weeks of benefit are a geometric series in the decay rate (exponential decay), which
+is monotonic, so the decay rate is found by bisection, vectorized across all targets at
+once. Under linear decay the benefit is summed over whole weeks, so WELLBYs rise with
+the months to zero but jump at each whole week, and a target can fall inside a jump.
+The months to zero is the smallest whole number of weeks (in months) that reaches the
+target, found by evaluating every week in range at once.
+
+For the Overall tab, the share of one programme (with the others in their current
+proportions) gives a linear-fractional cost per WELLBY, which is inverted exactly.
+Clients seen are rounded down, so the number of branches is solved without rounding and
+then checked against the rounded model.
+
+Targets can be a float or an array; results have the targets' shape, with NaN where no
+value of the input within its range reaches the target.
+"""
+import numpy as np
+
+from config import overall_input_ranges
+from model import WEEKS_PER_YEAR, exponential_decay_wellbys_per_client, linear_decay_wellbys_per_client, overall_outcomes, clients_per_branch_per_year
+from gradients import wellbys_per_completer
+
+# Allowed values of each programme input, as on the programme tabs' sliders
+PROGRAMME_INPUT_BOUNDS = {
+    "retention_rate": (0.0, 1.0),
+    "peak_wellbeing": (0.0, 10.0),
+    "baseline_wellbeing": (0.0, 10.0),
+    "annual_decay_rate": (0.001, 0.999),
+    "months_to_zero": (1.0, 60.0),
+    "harm_proportion": (0.01, 1.0),
+    "sessions_per_participant": (0.0, np.inf),
+    "cost_per_session": (0.0, np.inf),
+}
+BISECTION_STEPS = 60
+
+
+def _within(values, bounds):
+    low, high = bounds
+    values = np.asarray(values, dtype=float)
+    return np.where((values >= low - 1e-12) & (values <= high + 1e-12), values, np.nan)
+
+
+def bisect(function, targets, low, high, steps=BISECTION_STEPS):
+    """
+    x in [low, high] with function(x) == target for each target, for an increasing
+    `function` that works on arrays. NaN where the target is outside function's range.
+    """
+    targets = np.asarray(targets, dtype=float)
+    lower, upper = np.full(targets.shape, float(low)), np.full(targets.shape, float(high))
+    reachable = (function(lower) <= targets) & (targets <= function(upper))
+    for _ in range(steps):
+        middle = (lower + upper) / 2
+        below = function(middle) < targets
+        lower, upper = np.where(below, middle, lower), np.where(below, upper, middle)
+    return np.where(reachable, (lower + upper) / 2, np.nan)
+
+
+def smallest_reaching(function, targets, candidates):
+    """
+    The smallest of the sorted `candidates` with function(candidate) >= target, for each
+    target of a nondecreasing `function` that may jump. NaN where the target is below
+    function(candidates[0]) or above its largest value.
+    """
+    targets = np.asarray(targets, dtype=float)
+    # Running maximum, so the first candidate whose maximum reaches a target reaches it itself
+    values = np.maximum.accumulate(function(candidates))
+    index = np.searchsorted(values, targets, side="left")
+    reachable = (values[0] <= targets) & (index < len(candidates))
+    return np.where(reachable, candidates[np.minimum(index, len(candidates) - 1)], np.nan)
+
+
+def _months_to_zero_candidates(low, high):
+    # Whole weeks in range as months, plus the range's ends. Each week is nudged up so that
+    # converting back to weeks can't round it down to the week before.
+    weeks = np.arange(np.ceil(low / 12 * WEEKS_PER_YEAR), np.floor(high / 12 * WEEKS_PER_YEAR) + 1)
+    months = np.minimum((weeks + 1e-9) / WEEKS_PER_YEAR * 12, high)
+    return np.unique(np.concatenate([[low], months, [high]]))
+
+
+def programme_break_even(inputs, cost_per_session, targets, timeframe_weeks=WEEKS_PER_YEAR):
+    """
+    Break-even value of each of one programme's inputs for each target cost per WELLBY.
+
+    `inputs` are the programme tab's inputs (rates as fractions). Returns a dict of
+    arrays keyed by input name; the decay input depends on the decay model.
+    """
+    targets = np.asarray(targets, dtype=float)
+    retention, harm = inputs["retention_rate"], inputs["harm_proportion"]
+    sessions = inputs["sessions_per_participant"]
+    gain = inputs["peak_wellbeing"] - inputs["baseline_wellbeing"]
+    wellbys, _ = wellbys_per_completer(inputs, timeframe_weeks)
+    cost = sessions * cost_per_session
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Cost per WELLBY is proportional to these...
+        break_even = {
+            "sessions_per_participant": targets * wellbys * retention / (cost_per_session * harm),
+            "cost_per_session": targets * wellbys * retention / (sessions * harm),
+            "harm_proportion": targets * wellbys * retention / cost,
+            # ...and inversely proportional to these
+            "retention_rate": cost * harm / (targets * wellbys),
+        }
+        # WELLBYs are proportional to the gain
+        gain_needed = gain * cost * harm / (targets * wellbys * retention)
+        break_even["peak_wellbeing"] = inputs["baseline_wellbeing"] + gain_needed
+        break_even["baseline_wellbeing"] = inputs["peak_wellbeing"] - gain_needed
+
+        # WELLBYs per completer needed, then the decay input that gives them
+        wellbys_needed = cost * harm / (targets * retention)
+        decay_model = inputs.get("decay_model", "Exponential Decay")
+        if decay_model == "Exponential Decay":
+            # WELLBYs fall as the decay rate rises, so solve on their negation
+            break_even["annual_decay_rate"] = bisect(
+                lambda rate: -exponential_decay_wellbys_per_client(gain, rate, timeframe_weeks),
+                -wellbys_needed, *PROGRAMME_INPUT_BOUNDS["annual_decay_rate"]
+            )
+        elif decay_model == "Linear Decay":
+            break_even["months_to_zero"] = smallest_reaching(
+                lambda months: linear_decay_wellbys_per_client(gain, months, timeframe_weeks),
+                wellbys_needed, _months_to_zero_candidates(*PROGRAMME_INPUT_BOUNDS["months_to_zero"])
+            )
+    return {name: _within(value, PROGRAMME_INPUT_BOUNDS[name]) for name, value in break_even.items()}
+
+
+def overall_break_even(cost_per_client, wellbys_per_client, retained_per_client, client_shares, num_branches, fixed_costs,
+                       branch_clients_per_year, targets, programmes):
+    """
+    Break-even values of the Overall tab's inputs for each target overall cost per
+    WELLBY (including fixed costs).
+
+    Programme arrays hold one value per client seen of each programme, as for
+    overall_outcomes(). Returns "num_branches" (the fewest whole branches that reach the
+    target), "fixed_costs", "marginal_cost_factor" (what every marginal cost would need
+    to be multiplied by) and "client_share/<name>": the percentage of clients in that
+    programme, with the others in their current proportions and without rounding.
+    """
+    targets = np.asarray(targets, dtype=float)
+    cost_per_client = np.asarray(cost_per_client, dtype=float)
+    wellbys_per_client = np.asarray(wellbys_per_client, dtype=float)
+    client_shares = np.asarray(client_shares, dtype=float)
+    outcomes = overall_outcomes(
+        cost_per_client, wellbys_per_client, retained_per_client, client_shares, num_branches, fixed_costs, branch_clients_per_year
+    )
+    total_cost, total_wellbys = outcomes["Total Marginal Cost"], outcomes["Total WELLBYs"]
+    break_even = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Overall cost per WELLBY is linear in the fixed costs and in the marginal costs
+        break_even["fixed_costs"] = np.where(targets * total_wellbys >= total_cost, targets * total_wellbys - total_cost, np.nan)
+        marginal_cost_factor = (targets * total_wellbys - fixed_costs) / total_cost
+        break_even["marginal_cost_factor"] = np.where(marginal_cost_factor >= 0, marginal_cost_factor, np.nan)
+
+        # Branches: (capacity x mean cost + fixed costs) / (capacity x mean WELLBYs) without rounding...
+        shares = client_shares / client_shares.sum(axis=0)
+        mean_cost = np.sum(shares * cost_per_client, axis=0)
+        mean_wellbys = np.sum(shares * wellbys_per_client, axis=0)
+        branches = np.where(
+            targets * mean_wellbys > mean_cost,
+            fixed_costs / (branch_clients_per_year * (targets * mean_wellbys - mean_cost)),
+            np.inf
+        )
+        # ...then the fewest whole branches that reach the target once clients are rounded down
+        max_branches = overall_input_ranges["num_branches"][1]
+        candidates = np.clip(np.ceil(np.where(np.isfinite(branches), branches, max_branches)), 1, max_branches)
+        found = np.full(targets.shape, np.nan)
+        for offset in (1, 0, -1):
+            candidate = np.clip(candidates + offset, 1, max_branches)
+            candidate_cost = overall_outcomes(
+                cost_per_client[..., None], wellbys_per_client[..., None], np.asarray(retained_per_client)[..., None],
+                client_shares[..., None], candidate, fixed_costs, branch_clients_per_year
+            )["Overall Total Cost per WELLBY"]
+            found = np.where(candidate_cost <= targets, candidate, found)
+        break_even["num_branches"] = found
+
+        # One programme's share x, others fixed: cost per WELLBY is (a x + b) / (c x + d) in x
+        capacity = num_branches * branch_clients_per_year
+        for index, programme in enumerate(programmes):
+            others = np.delete(client_shares, index, axis=0)
+            other_share = others.sum(axis=0)
+            other_cost = np.sum(others * np.delete(cost_per_client, index, axis=0), axis=0)
+            other_wellbys = np.sum(others * np.delete(wellbys_per_client, index, axis=0), axis=0)
+            share = (
+                (capacity * other_cost + fixed_costs * other_share - targets * capacity * other_wellbys)
+                / (capacity * (targets * wellbys_per_client[index] - cost_per_client[index]) - fixed_costs)
+            )
+            percentage = 100 * share / (share + other_share)
+            break_even[f"client_share/{programme}"] = np.where((share >= 0) & (other_share > 0), percentage, np.nan)
+    return break_even
+
+
+def scenario_break_even(scenario_inputs, cost_per_session, targets):
+    """
+    Break-even tables of a model graph's input values (see DependencyGraph.input_values)
+    at `cost_per_session`: {"programmes": {name: break-even dict}, "overall": break-even dict}.
+    """
+    programme_inputs = {
+        name.split("/", 1)[1]: inputs for name, inputs in scenario_inputs.items() if name.startswith("programme_inputs/")
+    }
+    programmes = list(programme_inputs)
+    results = {"programmes": {}}
+    cost_per_client, wellbys_per_client, retained_per_client = [], [], []
+    for programme, inputs in programme_inputs.items():
+        results["programmes"][programme] = programme_break_even(inputs, cost_per_session, targets, inputs["timeframe_weeks"])
+        wellbys, _ = wellbys_per_completer(inputs, inputs["timeframe_weeks"])
+        cost_per_client.append(inputs["sessions_per_participant"] * cost_per_session)
+        wellbys_per_client.append(wellbys * inputs["retention_rate"] / inputs["harm_proportion"])
+        retained_per_client.append(inputs["retention_rate"])
+
+    overall_inputs = scenario_inputs["overall_inputs"]
+    overall = overall_break_even(
+        np.array(cost_per_client, dtype=float), np.array(wellbys_per_client, dtype=float), np.array(retained_per_client, dtype=float),
+        np.array([overall_inputs["client_shares"][programme] for programme in programmes], dtype=float),
+        overall_inputs["num_branches"], overall_inputs["fixed_costs"],
+        clients_per_branch_per_year(overall_inputs["coaches_per_cohort"], overall_inputs["clients_per_coach"]),
+        targets, programmes
+    )
+    # The marginal costs are all proportional to the cost per session
+    overall["cost_per_session"] = cost_per_session * overall.pop("marginal_cost_factor")
+    results["overall"] = overall
+    return results
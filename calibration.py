@@ -0,0 +1,207 @@
+"""
+Calibrate programme inputs from our session logs.
+
+The logs have one row per attended session with columns "client_id", "programme",
+"session_number" and (optionally, may be blank) "wellbeing" on the 0-10 scale. Files
+are streamed in chunks and folded into one small record per client, so memory grows
+with the number of clients rather than the number of rows.
+
+Sessions attended are counted as the highest session_number logged for the client, so a
+session logged twice (a re-export, or a second wellbeing entry) isn't counted twice.
+For each programme this computes the retention curve (share of clients who attend at
+least k sessions, given they attended one), the retention rate used by the model
+(share who complete every session of the programme), sessions per client, and
+baseline/post wellbeing of completers. The results are written to
+CALIBRATED_PARAMS_PATH, which config.py loads at startup: the retention and wellbeing
+overlay each programme's defaults, and the mean sessions per client over every programme
+becomes the Marginal Costs tab's default sessions per client.
+
+Usage:
+    python calibration.py logs/*.csv [--chunk-rows 500000]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import offerings, CALIBRATED_PARAMS_PATH
+
+CLIENT_KEYS = ["programme", "client_id"]
+LOG_COLUMNS = ["client_id", "programme", "session_number", "wellbeing"]
+
+
+def iter_log_chunks(paths, chunk_rows):
+    """Yield DataFrames of at most `chunk_rows` rows from CSV and Parquet logs."""
+    for path in paths:
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(path)
+            columns = [column for column in LOG_COLUMNS if column in parquet_file.schema_arrow.names]
+            for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(
+                path,
+                usecols=lambda column: column in LOG_COLUMNS,
+                dtype={"client_id": str, "programme": str},
+                chunksize=chunk_rows,
+            )
+
+
+def chunk_client_states(chunk):
+    """One partial client record per log row, in the same shape as the running state."""
+    if "wellbeing" not in chunk.columns:
+        chunk = chunk.assign(wellbeing=np.nan)
+    session = chunk["session_number"].astype(float)
+    wellbeing = chunk["wellbeing"].astype(float)
+    measured_session = session.where(wellbeing.notna())
+    return pd.DataFrame({
+        # Parquet and CSV exports may type ids differently; compare them as strings
+        "programme": chunk["programme"].astype(str).to_numpy(),
+        "client_id": chunk["client_id"].astype(str).to_numpy(),
+        "max_session": session.to_numpy(),
+        "first_wb_session": measured_session.to_numpy(),
+        "first_wellbeing": wellbeing.to_numpy(),
+        "last_wb_session": measured_session.to_numpy(),
+        "last_wellbeing": wellbeing.to_numpy(),
+    })
+
+
+def _first_in_group(codes, sort_key, num_groups):
+    # Row index of the smallest `sort_key` in each group (NaNs sort last)
+    order = np.lexsort((sort_key, codes))
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    first_rows = np.empty(num_groups, dtype=np.int64)
+    first_rows[codes[order][starts]] = order[starts]
+    return first_rows
+
+
+def reduce_client_states(states):
+    """Merge partial client records: keep the highest session and the first/last wellbeing."""
+    codes = states.groupby(CLIENT_KEYS, sort=False).ngroup().to_numpy()
+    num_groups = int(codes.max()) + 1 if codes.size else 0
+    # With sort=False, group codes follow the order in which clients first appear
+    reduced = states.loc[~states.duplicated(CLIENT_KEYS), CLIENT_KEYS].reset_index(drop=True)
+
+    max_session = np.full(num_groups, -np.inf)
+    np.maximum.at(max_session, codes, states["max_session"].to_numpy())
+    reduced["max_session"] = max_session
+
+    first_rows = _first_in_group(codes, states["first_wb_session"].to_numpy(), num_groups)
+    last_rows = _first_in_group(codes, -states["last_wb_session"].to_numpy(), num_groups)
+    for column, rows in [("first_wb_session", first_rows), ("first_wellbeing", first_rows),
+                         ("last_wb_session", last_rows), ("last_wellbeing", last_rows)]:
+        reduced[column] = states[column].to_numpy()[rows]
+    return reduced
+
+
+def aggregate_logs(paths, chunk_rows=500000, progress=None):
+    """Stream the logs into one record per client."""
+    clients = None
+    rows_read = 0
+    for chunk in iter_log_chunks(paths, chunk_rows):
+        chunk = chunk.dropna(subset=["client_id", "programme", "session_number"])
+        rows_read += len(chunk)
+        states = chunk_client_states(chunk)
+        clients = reduce_client_states(states if clients is None else pd.concat([clients, states], ignore_index=True))
+        if progress is not None:
+            progress(rows_read, len(clients))
+    if clients is None:
+        raise ValueError("The session logs contain no rows.")
+    return clients, rows_read
+
+
+def calibrate_programme(programme_clients, sessions_in_programme, max_curve_sessions=12):
+    """Model inputs for one programme from its per-client records."""
+    sessions = programme_clients["max_session"].to_numpy().astype(np.int64)
+    completed = sessions >= sessions_in_programme
+
+    # Share of clients attending at least k sessions, for k = 1..max_curve_sessions
+    counts = np.bincount(np.minimum(sessions, max_curve_sessions), minlength=max_curve_sessions + 1)
+    at_least = counts[::-1].cumsum()[::-1] / sessions.size
+
+    calibrated = {
+        "num_clients": int(sessions.size),
+        "retention": round(float(completed.mean()) * 100, 1),
+        "mean_sessions_per_client": float(sessions.mean()),
+        "retention_curve": {int(k): float(at_least[k]) for k in range(1, max_curve_sessions + 1)},
+    }
+
+    # Wellbeing before and after, for completers with a measurement at two different sessions
+    completers = programme_clients[completed]
+    paired = completers[completers["last_wb_session"] > completers["first_wb_session"]]
+    if len(paired) > 0:
+        baseline = float(paired["first_wellbeing"].mean())
+        gain = float((paired["last_wellbeing"] - paired["first_wellbeing"]).mean())
+        calibrated.update({
+            "num_wellbeing_pairs": int(len(paired)),
+            "baseline_wellbeing_score": round(baseline, 2),
+            "peak_wellbeing_score": round(min(max(baseline + gain, 0.0), 10.0), 2),
+        })
+    return calibrated
+
+
+def calibrate(clients):
+    """
+    Calibrated inputs of every programme in the logs. Programmes that aren't in
+    config.offerings are listed under "skipped_programmes".
+    """
+    programmes = {}
+    skipped = []
+    for programme, programme_clients in clients.groupby("programme"):
+        sessions_in_programme = offerings.get(programme, {}).get("sessions_per_participant")
+        if sessions_in_programme is None:
+            skipped.append(programme)
+            continue
+        programmes[programme] = calibrate_programme(programme_clients, sessions_in_programme)
+    known = clients[clients["programme"].isin(list(programmes))]
+
+    dropouts = clients[clients["max_session"] < clients["programme"].map(
+        {name: defaults["sessions_per_participant"] for name, defaults in offerings.items()}
+    )]
+    return {
+        "programmes": programmes,
+        "avg_sessions_for_dropouts": float(dropouts["max_session"].mean()) if len(dropouts) else None,
+        "mean_sessions_per_client": float(known["max_session"].mean()) if len(known) else None,
+        "skipped_programmes": skipped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate programme inputs from session logs.")
+    parser.add_argument("paths", nargs="+", help="CSV or Parquet session log exports")
+    parser.add_argument("--chunk-rows", type=int, default=500000, help="Rows read into memory at a time")
+    parser.add_argument("--output", default=CALIBRATED_PARAMS_PATH, help="Where to write the calibrated parameters")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def report(rows_read, num_clients):
+        print(f"\r{rows_read:,} rows read, {num_clients:,} clients", end="", flush=True)
+
+    clients, rows_read = aggregate_logs(args.paths, args.chunk_rows, report)
+    print()
+    calibrated = calibrate(clients)
+    for programme in calibrated["skipped_programmes"]:
+        print(f"Skipping '{programme}': it isn't one of our programmes in config.offerings.")
+    calibrated.update({
+        "calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "rows_read": rows_read,
+        "sources": args.paths,
+    })
+    with open(args.output, "w") as calibrated_file:
+        json.dump(calibrated, calibrated_file, indent=1)
+
+    for programme, params in calibrated["programmes"].items():
+        wellbeing = (
+            f", wellbeing {params['baseline_wellbeing_score']} -> {params['peak_wellbeing_score']}"
+            if "baseline_wellbeing_score" in params else ""
+        )
+        print(f"{programme}: {params['num_clients']:,} clients, retention {params['retention']}%{wellbeing}")
+    print(f"Wrote {args.output} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,133 @@
 # Configuration data for the CEA Coaching Streamlit app
+import json
+import os
 
+from programmes import load_programmes
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Programmes, their defaults and input ranges are read from programmes.json
+# (see programmes.py for the fields and their units)
+PROGRAMMES_PATH = os.path.join(DATA_DIR, "programmes.json")
+PROGRAMME_RANGE_KEYS = ["input_ranges", "client_share_range"]
+programmes = load_programmes(PROGRAMMES_PATH)
 offerings = {
-    "Bespoke Offering": {
-        "retention": 40.0,
-        "num_participants": 400,
-        "sessions_per_participant": 6,
-        "default_effect_duration": 6.0,  # months
-        "baseline_wellbeing_score": 6.5,    # 0-10 scale wellbeing before intervention
-        "peak_wellbeing_score": 8.0,       # 0-10 scale wellbeing at peak effectiveness
-        "default_decay_rate": 50.0,       # percent, for Exponential Decay
-        "default_months_to_zero": 12.0,   # months, for Linear Decay
-        "default_decay_model": "Exponential Decay"
-    },
-    "Procrastination": {
-        "retention": 50.0,
-        "num_participants": 300,
-        "sessions_per_participant": 4,
-        "default_effect_duration": 4.0,
-        "baseline_wellbeing_score": 5.5,
-        "peak_wellbeing_score": 7.0,
-        "default_decay_rate": 80.0,       # percent, for Exponential Decay
-        "default_months_to_zero": 6.0,
-        "default_decay_model": "Exponential Decay"
-    },
-    "Insomnia": {
-        "retention": 70.0,
-        "num_participants": 150,
-        "sessions_per_participant": 4,
-        "default_effect_duration": 4.0,
-        "baseline_wellbeing_score": 4.8,
-        "peak_wellbeing_score": 6.5,
-        "default_decay_rate": 60.0,       # percent, for Exponential Decay
-        "default_months_to_zero": 12.0,
-        "default_decay_model": "Exponential Decay"
-    }
+    programme["name"]: {key: value for key, value in programme.items() if key != "name" and key not in PROGRAMME_RANGE_KEYS}
+    for programme in programmes
 }
 
 DEFAULT_COST_PER_SESSION = 2.36
 DEFAULT_AVG_SESSIONS_FOR_DROPOUTS = 2.0
 
+# Parameters calibrated from our session logs by calibration.py override the
+# hand-typed defaults above when the file exists
+CALIBRATED_PARAMS_PATH = os.path.join(DATA_DIR, "calibrated_params.json")
+CALIBRATED_OFFERING_KEYS = ["retention", "baseline_wellbeing_score", "peak_wellbeing_score"]
+calibrated_programmes = {}
+calibrated_params = {}
+if os.path.exists(CALIBRATED_PARAMS_PATH):
+    with open(CALIBRATED_PARAMS_PATH) as calibrated_file:
+        calibrated_params = json.load(calibrated_file)
+    for programme_name, calibrated in calibrated_params.get("programmes", {}).items():
+        if programme_name in offerings:
+            offerings[programme_name].update({key: calibrated[key] for key in CALIBRATED_OFFERING_KEYS if key in calibrated})
+            calibrated_programmes[programme_name] = calibrated
+    if calibrated_params.get("avg_sessions_for_dropouts") is not None:
+        DEFAULT_AVG_SESSIONS_FOR_DROPOUTS = round(calibrated_params["avg_sessions_for_dropouts"], 1)
+
 DEFAULT_TIMEFRAME_OF_INTEREST_MONTHS = 12.0
 
+# Plausible (low, high) range of each input for the sensitivity and uncertainty analyses.
+# Values are drawn from a triangular distribution peaking at the current slider value.
+# Rates and proportions are fractions (0-1) here, not the percentages on the sliders.
+programme_input_ranges = {
+    programme["name"]: {name: tuple(bounds) for name, bounds in programme["input_ranges"].items()}
+    for programme in programmes
+}
+cost_per_session_range = (1.50, 4.00)
+
+# Trial results that update the programme inputs in the sampling analyses (see bayes.py).
+# "wellbeing_gain" is the intervention-control difference at post on Cantril's ladder;
+# its standard error assumes an outcome SD of 2 points and two arms of the retained participants.
+# "evidence_weight" (0-1] discounts a trial whose setting differs from the programme's.
+trial_summaries = {
+    "Procrastination": {
+        "participants": 44,
+        "retained": 40,  # 90%
+        "wellbeing_gain": 1.8,
+        "wellbeing_gain_se": 0.63,
+        "evidence_weight": 1.0
+    }
+}
+
+overall_input_ranges = {
+    "num_branches": (1, 20),
+    "fixed_costs": (80000, 130000),
+    # distribution slider values (%), before normalising
+    "client_share": {programme["name"]: tuple(programme["client_share_range"]) for programme in programmes}
+}
+
 # Constants for overall cost explanation
 ORGANISATION_FIXED_COSTS = 100000 # Fixed R&D Budget in USD
 
+# Core team making up the organisation's fixed costs.
+# "annual_salary" is in USD; "start_month" is months from now (0 = already on payroll);
+# "optional" salaries can be switched off in the financial projection.
+core_team = [
+    {
+        "name": "Helen",
+        "annual_salary": 39000,
+        "start_month": 0,
+        "optional": False,
+        "role": "She handles RCTs and sale of part-time courses while preparing us to scale by writing our policies and liaising with external partners. She led a team of volunteers that designed insomnia RCT, got it through ethics, trained the coaches, and recruited the participants."
+    },
+    {
+        "name": "Angel",
+        "annual_salary": 36000,
+        "start_month": 0,
+        "optional": False,
+        "role": "Manages triaging, client-coach pairing, coach experience, safeguarding, leads procrastination RCT, and generally does whatever is needed, from website design to database automation. Literally works 100 hours each week every week."
+    },
+    {
+        "name": "David",
+        "annual_salary": 6000,
+        "start_month": 0,
+        "optional": False,
+        "role": "Video editor based in the Philippines. Each other day, he turns one script into a fully edited video, which helps us standardise our training so it can be scaled up with fidelity."
+    },
+    {
+        "name": "Me (Founder)",
+        "annual_salary": 18000,
+        "start_month": 0,
+        "optional": True,
+        "role": "I'm responsible for impact-oriented client demographics (e.g. founders, key people within animal welfare), special projects, organisational strategy, fundraising, B2B sales, hiring, firing, and accounting. I work on this ~70 hours per week ~49 weeks a year. (Happy to keep volunteering if needs be)"
+    },
+    {
+        "name": "Kishah",
+        "annual_salary": 12000,
+        "start_month": 0,
+        "optional": False,
+        "role": "Native Kenyan psychologist. In charge of developing our training and hiring practices."
+    }
+]
+
+# Branches on the Overall tab, which the projection starts from
+DEFAULT_NUM_BRANCHES = 3
+
+# Default values for the multi-year financial projection
+DEFAULT_PROJECTION_YEARS = 5
+DEFAULT_SALARY_GROWTH = 5.0             # percent per year, applied to core team and branch costs
+DEFAULT_BRANCHES_ADDED_PER_YEAR = 1
+DEFAULT_OPENING_BALANCE = 150000        # USD in the bank today
+DEFAULT_MONTHLY_FUNDING = 15000         # USD of grants/donations received per month
+
 # Default values for cost per session calculations
 DEFAULT_COACHES_PER_COHORT = 15
 DEFAULT_CLIENTS_PER_COACH = 15
 DEFAULT_SESSIONS_PER_CLIENT = 5
+if calibrated_params.get("mean_sessions_per_client") is not None:
+    # Whole sessions, as on the Marginal Costs tab
+    DEFAULT_SESSIONS_PER_CLIENT = max(1, round(calibrated_params["mean_sessions_per_client"]))
 DEFAULT_COUNSELLOR_SALARY = 500
 DEFAULT_HEAD_OF_TRAINING_SALARY = 500
 DEFAULT_VA_SALARY = 350
@@ -55,6 +135,50 @@ DEFAULT_BRANCH_MANAGER_SALARY = 500
 DEFAULT_HIRING_MANAGER_SALARY = 400
 DEFAULT_OTHER_SALARY = 300
 
+# Background analysis jobs (shared by every session on this server)
+MAX_CONCURRENT_JOBS = 2        # jobs running at once; the rest wait in the queue
+MAX_QUEUED_JOBS = 8            # jobs waiting to run before new submissions are refused
+JOB_POLL_INTERVAL_SECONDS = 0.5  # how often a running job's progress is redrawn
+
+# Per-session memory (see sessions.py). Idle sessions' model graphs and finished analyses
+# are dropped to free memory; their inputs are kept.
+SESSION_MEMORY_BUDGET_MB = 50       # sessions holding more than this are cleared sooner...
+SESSION_COMPACT_SECONDS = 5 * 60    # ...once idle for this long
+SESSION_IDLE_SECONDS = 60 * 60      # every other session once idle for this long
+SESSION_OVERHEAD_MB = 15            # per session beyond its own state (rerun temporaries, Streamlit's buffers), from loadtest.py
+
+# Named scenarios compared side by side in the Scenarios tab
+MAX_SCENARIOS = 20
+SCENARIO_CACHE_ENTRIES = 500       # evaluated scenarios kept, shared by every session
+
+# Append-only log of every evaluated scenario (see results_store.py), off unless RESULTS_LOG_ENABLED=1
+RESULTS_LOG_ENABLED = os.environ.get("RESULTS_LOG_ENABLED", "0") == "1"
+RESULTS_LOG_DIR = os.environ.get("RESULTS_LOG_DIR", os.path.join(DATA_DIR, "results_log"))
+RESULTS_LOG_BATCH_ROWS = 500       # rows buffered before they are written as one row group
+RESULTS_LOG_FLUSH_SECONDS = 60.0   # ...or after this long, whichever comes first
+
+# Local JSON API for partners (see api.py)
+API_HOST = "127.0.0.1"
+API_PORT = 8600
+API_WORKERS = 4                    # evaluations run at once
+API_CACHE_ENTRIES = 256            # responses kept in the LRU cache
+API_MAX_BATCH_SCENARIOS = 100000
+API_MAX_BODY_BYTES = 64 * 1024 * 1024
+
+# Checkpointed long-running simulations, resumable after a restart (see runs.py)
+RUNS_DIR = os.path.join(DATA_DIR, "runs")
+RUN_CHUNK_SIZE = 16384             # samples per checkpoint; results depend on it, not on the workers
+
+# Funder reports of saved scenarios, cached by scenario (see report.py)
+REPORTS_DIR = os.path.join(DATA_DIR, "reports")
+REPORT_CACHE_FILES = 500           # oldest reports beyond this are deleted
+
+# Precomputed model and page for static hosting, written by static_export.py
+STATIC_EXPORT_DIR = os.path.join(DATA_DIR, "static_site")
+
+# Decay curves fitted to follow-up data by decay_fitting.py
+FITTED_DECAY_PATH = os.path.join(DATA_DIR, "fitted_decay.json")
+
 # Programme-specific introduction text
 programme_introductions = {
     "Bespoke Offering": '''
@@ -0,0 +1,211 @@
+"""
+Cost-per-WELLBY distributions estimated to a target precision.
+
+Samples are drawn in replicates: independent randomisations of the chosen design (see
+uncertainty.SAMPLING_METHODS), each of the same size. Every statistic is computed on
+each replicate, and the spread between replicates gives its standard error, which is
+valid for quasi-random designs where the usual sd / sqrt(N) is not. Replicates are
+added until the largest relative standard error of the mean and percentiles is below
+the target, or the sample budget runs out.
+
+The mean can also use a control variate: the first-order expansion of cost per WELLBY
+around the deterministic point estimate (every input at its current value), with
+exact derivatives from gradients.py. Its expected value is known exactly from the
+input means, so subtracting its sampling error removes most of the noise that the
+inputs' linear effects add to the mean. The coefficient is fitted across the replicate
+means rather than the individual samples, since designs such as antithetic pairs
+already cancel part of the linear effects within a replicate; if the correction does
+not narrow the spread between replicates it is left out. Percentiles are taken from
+all samples pooled.
+
+Samples with no WELLBYs have an undefined cost per WELLBY: they count as infinitely
+expensive for the percentiles and are left out of the mean.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import DEFAULT_COACHES_PER_COHORT, DEFAULT_CLIENTS_PER_COACH, DEFAULT_NUM_BRANCHES, ORGANISATION_FIXED_COSTS
+from gradients import model_gradients
+from uncertainty import (
+    DEFAULT_CLIENT_SHARES,
+    evaluate_programme,
+    evaluate_overall,
+    input_means,
+    values_from_unit,
+    unit_samples
+)
+
+OVERALL_TARGET = "Overall (incl. fixed costs)"
+PERCENTILES = (5, 50, 95)
+MIN_REPLICATES = 4
+
+
+def target_model(target):
+    """Function from sampled values to cost per WELLBY of a programme or the Overall mix."""
+    if target == OVERALL_TARGET:
+        return lambda values: evaluate_overall(values)["Overall Total Cost per WELLBY"]
+    return lambda values: evaluate_programme(values, target)["Cost per WELLBY"]
+
+
+def point_gradient(space, target):
+    """Cost per WELLBY of `target` with every input at its mode, and its derivatives by input name."""
+    point = {parameter["name"]: parameter["mode"] for parameter in space}
+    programmes = list(dict.fromkeys(
+        name.split("/", 1)[0] for name in point if "/" in name and not name.startswith("client_share/")
+    ))
+    programme_inputs = {}
+    for programme in programmes:
+        def value(field):
+            return point[f"{programme}/{field}"]
+        # With trial evidence the gain is sampled on its own; the derivatives are those of the peak
+        gain_is_sampled = f"{programme}/wellbeing_gain" in point
+        programme_inputs[programme] = {
+            "decay_model": "Exponential Decay",
+            "retention_rate": value("retention_rate"),
+            "baseline_wellbeing": 0.0 if gain_is_sampled else value("baseline_wellbeing"),
+            "peak_wellbeing": value("wellbeing_gain") if gain_is_sampled else value("peak_wellbeing"),
+            "annual_decay_rate": value("annual_decay_rate"),
+            "harm_proportion": value("harm_proportion"),
+            "sessions_per_participant": value("sessions_per_participant"),
+        }
+    overall_inputs = {
+        "client_shares": {programme: point.get(f"client_share/{programme}", DEFAULT_CLIENT_SHARES[programme]) for programme in programmes},
+        "num_branches": np.round(point.get("num_branches", DEFAULT_NUM_BRANCHES)),
+        "fixed_costs": point.get("fixed_costs", ORGANISATION_FIXED_COSTS),
+        "coaches_per_cohort": DEFAULT_COACHES_PER_COHORT,
+        "clients_per_coach": DEFAULT_CLIENTS_PER_COACH,
+    }
+    gradients = model_gradients(programme_inputs, overall_inputs, cost_per_session=point["cost_per_session"])
+    result = gradients["overall"] if target == OVERALL_TARGET else gradients["programmes"][target]
+    gradient = {}
+    for name in point:
+        gradient_name = name.replace("/wellbeing_gain", "/peak_wellbeing")
+        gradient[name] = float(np.nan_to_num(result["gradient"].get(gradient_name, 0.0)))
+    return float(result["cost_per_wellby"]), gradient
+
+
+def _linear_control(values, point, gradient):
+    """First-order expansion of cost per WELLBY around the point estimate, for each sample."""
+    return sum(gradient[name] * (values[name] - point[name]) for name in gradient)
+
+
+def _statistics(outputs, controls, percentiles):
+    """Per-replicate sums for the mean and its control, and the replicate's percentiles."""
+    finite = np.isfinite(outputs)
+    sums = np.array([finite.sum(), outputs[finite].sum(), controls.sum(), controls.size])
+    replicate_percentiles = np.percentile(np.where(finite, outputs, np.inf), percentiles, method="inverted_cdf")
+    return sums, replicate_percentiles
+
+
+def _mean_estimate(sums, control_mean, use_control):
+    """
+    Mean over replicates and its standard error, corrected by the control variate when
+    that lowers the standard error, and the standard error without the correction.
+    """
+    replicates = len(sums)
+    means = sums[:, 1] / sums[:, 0]
+    uncorrected_error = means.std(ddof=1) / np.sqrt(replicates)
+    if not use_control:
+        return means.mean(), uncorrected_error, uncorrected_error
+    # Regress the replicate means on the control's sampling error in each replicate
+    control_errors = sums[:, 2] / sums[:, 3] - control_mean
+    control_variance = ((control_errors - control_errors.mean()) ** 2).sum()
+    if control_variance <= 0:
+        return means.mean(), uncorrected_error, uncorrected_error
+    coefficient = ((control_errors - control_errors.mean()) * (means - means.mean())).sum() / control_variance
+    corrected = means - coefficient * control_errors
+    # The fitted coefficient uses up a degree of freedom
+    corrected_error = np.sqrt(((corrected - corrected.mean()) ** 2).sum() / (replicates - 2) / replicates)
+    if not corrected_error < uncorrected_error:
+        return means.mean(), uncorrected_error, uncorrected_error
+    return corrected.mean(), corrected_error, uncorrected_error
+
+
+def _summary(sums, replicate_percentiles, pooled, control_mean, use_control, percentiles):
+    replicates = len(sums)
+    mean, mean_error, uncorrected_error = _mean_estimate(sums, control_mean, use_control)
+    rows = {"Mean": (mean, mean_error)}
+    pooled_percentiles = np.percentile(np.where(np.isfinite(pooled), pooled, np.inf), percentiles, method="inverted_cdf")
+    with np.errstate(invalid="ignore"):
+        spread = np.std(replicate_percentiles, axis=0, ddof=1) / np.sqrt(replicates)
+    for percentile, estimate, error in zip(percentiles, pooled_percentiles, spread):
+        rows[f"{percentile}th percentile"] = (estimate, error)
+    table = pd.DataFrame.from_dict(rows, orient="index", columns=["Estimate", "Standard error"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        table["Relative SE"] = (table["Standard error"] / table["Estimate"].abs()).fillna(np.inf)
+    control_reduction = 1 - mean_error / uncorrected_error if uncorrected_error > 0 else 0.0
+    return table, control_reduction
+
+
+def estimate_to_precision(
+    space,
+    target,
+    method="sobol",
+    use_control=True,
+    target_relative_se=0.005,
+    replicate_size=4096,
+    max_samples=1_048_576,
+    percentiles=PERCENTILES,
+    seed=0,
+    report=None
+):
+    """
+    Mean and percentiles of cost per WELLBY of `target` (a programme or OVERALL_TARGET),
+    with standard errors, sampling until every relative standard error is at most
+    `target_relative_se` or `max_samples` have been evaluated.
+
+    Args:
+        space: Parameter space from uncertainty.py
+        target: Programme name or OVERALL_TARGET
+        method: One of uncertainty.SAMPLING_METHODS
+        use_control: Correct the mean with the linear control variate
+        target_relative_se: Stop when the largest standard error / estimate is below this
+        replicate_size: Samples per replicate (a power of 2 for Sobol designs)
+        max_samples: Sample budget
+        percentiles: Percentiles to estimate
+        seed: Seed of the first replicate's randomisation
+        report: Optional callback report(progress, partial_result=table), e.g. Job.report
+
+    Returns a dict with the "table" of estimates, the "num_samples" and "replicates"
+    used, whether it "converged", the "history" of the largest relative standard error,
+    the share of the outputs' variance the control explains ("control_r_squared") and
+    the "seconds" taken.
+    """
+    started = time.perf_counter()
+    model = target_model(target)
+    point = {parameter["name"]: parameter["mode"] for parameter in space}
+    _, gradient = point_gradient(space, target)
+    means = input_means(space)
+    control_mean = sum(gradient[name] * (means[name] - point[name]) for name in gradient)
+
+    sums, replicate_percentiles, pooled, history = [], [], [], []
+    max_replicates = max(MIN_REPLICATES, max_samples // replicate_size)
+    table, control_reduction = None, 0.0
+    for replicate in range(max_replicates):
+        values = values_from_unit(unit_samples(replicate_size, len(space), method, seed=[seed, replicate]), space)
+        outputs = np.asarray(model(values), dtype=float)
+        replicate_sums, replicate_percentile = _statistics(outputs, _linear_control(values, point, gradient), percentiles)
+        sums.append(replicate_sums)
+        replicate_percentiles.append(replicate_percentile)
+        pooled.append(outputs)
+        if replicate + 1 < MIN_REPLICATES:
+            continue
+        table, control_reduction = _summary(np.array(sums), np.array(replicate_percentiles), np.concatenate(pooled), control_mean, use_control, percentiles)
+        largest = float(table["Relative SE"].max())
+        history.append(((replicate + 1) * replicate_size, largest))
+        if report is not None:
+            report((replicate + 1) / max_replicates, partial_result=table)
+        if largest <= target_relative_se:
+            break
+
+    return {
+        "table": table,
+        "num_samples": len(sums) * replicate_size,
+        "replicates": len(sums),
+        "converged": bool(history and history[-1][1] <= target_relative_se),
+        "history": pd.DataFrame(history, columns=["Samples", "Largest relative SE"]),
+        "control_se_reduction": float(control_reduction),
+        "seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,282 @@
+"""
+Fit benefit-decay curves to individual follow-up data.
+
+Each row of the follow-up data is one client: how many months after the programme
+they were last observed ("months") and whether they had relapsed by then ("relapsed",
+1) or were still in remission (0, i.e. censored). The proportion still in remission,
+S(t), is used as the relative benefit remaining t months after the programme - the
+same quantity shown in "Remission probability vs time.png".
+
+Four survival forms are fitted by maximum likelihood: Exponential, Weibull, Linear and
+a Monotone Spline (piecewise-linear cumulative hazard, so S(t) can only decrease).
+Confidence intervals come from a bootstrap that runs in parallel worker processes.
+Fits are written to FITTED_DECAY_PATH, which the programme tabs read, so nothing is
+refitted on a rerun.
+
+Usage:
+    python decay_fitting.py followup.csv [--bootstrap 200] [--workers 4] [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+from config import FITTED_DECAY_PATH
+
+DECAY_FORMS = ["Exponential", "Weibull", "Linear", "Monotone Spline"]
+CURVE_MONTHS = np.arange(0, 25)  # Months at which fitted curves and their intervals are stored
+MIN_TIME = 1e-6  # Events at month 0 would have zero density under some forms
+
+
+def read_followup_data(path):
+    """Read follow-up data from CSV or Parquet. A "programme" column is optional."""
+    if path.endswith(".parquet"):
+        data = pd.read_parquet(path)
+    else:
+        data = pd.read_csv(path)
+    missing = {"months", "relapsed"} - set(data.columns)
+    if missing:
+        raise ValueError(f"Follow-up data is missing column(s): {', '.join(sorted(missing))}")
+    if "programme" not in data.columns:
+        data["programme"] = "All"
+    data = data.dropna(subset=["months", "relapsed"])
+    if (data["months"] < 0).any():
+        raise ValueError("Follow-up months cannot be negative.")
+    return data
+
+
+# --- Parametric forms ---
+# Each form maps an unconstrained parameter vector `theta` to per-client log density
+# and log survival, evaluated for all clients at once.
+
+def spline_knots(times, events):
+    # Knots at the quartiles of the event times, so each segment has events to fit
+    event_times = times[events > 0]
+    if event_times.size < 4:
+        return np.array([0.0, max(times.max(), MIN_TIME)])
+    inner = np.quantile(event_times, [0.25, 0.5, 0.75])
+    return np.unique(np.concatenate([[0.0], inner, [times.max()]]))
+
+
+def natural_params(form, theta, knots=None, max_time=None):
+    """Turn unconstrained `theta` into the named parameters of a form."""
+    if form == "Exponential":
+        return {"rate": float(np.exp(theta[0]))}
+    if form == "Weibull":
+        return {"shape": float(np.exp(theta[0])), "scale": float(np.exp(theta[1]))}
+    if form == "Linear":
+        # The curve must stay above zero until the last observation
+        return {"months_to_zero": float(max_time + np.exp(theta[0]))}
+    if form == "Monotone Spline":
+        return {"knots": [float(k) for k in knots], "hazards": [float(h) for h in np.exp(theta)]}
+    raise ValueError(f"Unknown decay form: {form}")
+
+
+def _segment_exposure(times, knots):
+    # (n, J) months each client spent in each knot segment; the last segment is open-ended
+    lower = knots[:-1]
+    widths = np.append(np.diff(knots)[:-1], np.inf) if knots.size > 2 else np.array([np.inf])
+    return np.clip(times[:, None] - lower[None, :], 0, widths[None, :])
+
+
+def log_density_and_survival(form, params, times):
+    """Per-client log f(t) and log S(t) for the given natural parameters."""
+    t = np.maximum(times, MIN_TIME)
+    if form == "Exponential":
+        rate = params["rate"]
+        log_survival = -rate * t
+        return np.log(rate) + log_survival, log_survival
+    if form == "Weibull":
+        shape, scale = params["shape"], params["scale"]
+        z = t / scale
+        log_survival = -z ** shape
+        return np.log(shape / scale) + (shape - 1) * np.log(z) + log_survival, log_survival
+    if form == "Linear":
+        months_to_zero = params["months_to_zero"]
+        log_survival = np.log(np.clip(1 - t / months_to_zero, 1e-300, None))
+        return np.full_like(t, -np.log(months_to_zero)), log_survival
+    if form == "Monotone Spline":
+        knots = np.asarray(params["knots"])
+        hazards = np.asarray(params["hazards"])
+        exposure = _segment_exposure(t, knots)
+        log_survival = -(exposure @ hazards)
+        segment = np.clip(np.searchsorted(knots, t, side="right") - 1, 0, hazards.size - 1)
+        return np.log(hazards[segment]) + log_survival, log_survival
+    raise ValueError(f"Unknown decay form: {form}")
+
+
+def survival_curve(form, params, months):
+    """Proportion still in remission (relative benefit remaining) at `months`."""
+    months = np.asarray(months, dtype=float)
+    if form == "Exponential":
+        return np.exp(-params["rate"] * months)
+    if form == "Weibull":
+        return np.exp(-(months / params["scale"]) ** params["shape"])
+    if form == "Linear":
+        return np.clip(1 - months / params["months_to_zero"], 0, 1)
+    if form == "Monotone Spline":
+        exposure = _segment_exposure(np.atleast_1d(months), np.asarray(params["knots"]))
+        return np.exp(-(exposure @ np.asarray(params["hazards"]))).reshape(months.shape)
+    raise ValueError(f"Unknown decay form: {form}")
+
+
+def fit_form(form, times, events, weights=None):
+    """Maximum-likelihood fit of one form. `weights` are bootstrap multiplicities."""
+    if weights is None:
+        weights = np.ones_like(times)
+    total_events = np.sum(weights * events)
+    total_time = np.sum(weights * np.maximum(times, MIN_TIME))
+
+    if form == "Exponential":
+        # Closed-form MLE: events per month of follow-up
+        theta0 = np.array([np.log(max(total_events, 0.5) / total_time)])
+        return natural_params(form, theta0), _log_likelihood(form, natural_params(form, theta0), times, events, weights)
+
+    knots = spline_knots(times, events) if form == "Monotone Spline" else None
+    max_time = times.max()
+    base_rate = max(total_events, 0.5) / total_time
+    if form == "Weibull":
+        theta0 = np.array([0.0, np.log(1 / base_rate)])
+    elif form == "Linear":
+        theta0 = np.array([np.log(max_time)])
+    else:
+        theta0 = np.full(knots.size - 1, np.log(base_rate))
+
+    def negative_log_likelihood(theta):
+        ll = _log_likelihood(form, natural_params(form, theta, knots, max_time), times, events, weights)
+        return -ll if np.isfinite(ll) else 1e300
+
+    result = minimize(negative_log_likelihood, theta0, method="Nelder-Mead", options={"xatol": 1e-6, "fatol": 1e-8, "maxiter": 4000})
+    params = natural_params(form, result.x, knots, max_time)
+    return params, -float(result.fun)
+
+
+def _log_likelihood(form, params, times, events, weights):
+    log_density, log_survival = log_density_and_survival(form, params, times)
+    # Relapses contribute their density, clients still in remission their survival
+    return float(np.sum(weights * np.where(events > 0, log_density, log_survival)))
+
+
+def _bootstrap_chunk(times, events, forms, num_replicates, seed_sequence):
+    # Runs in a worker process; returns (replicates, forms, months) survival curves and params
+    rng = np.random.default_rng(seed_sequence)
+    n = times.size
+    curves = np.empty((num_replicates, len(forms), CURVE_MONTHS.size))
+    replicate_params = [[None] * len(forms) for _ in range(num_replicates)]
+    for replicate in range(num_replicates):
+        # Resampling clients with replacement == multinomial weights on the original rows
+        weights = rng.multinomial(n, np.full(n, 1.0 / n)).astype(float)
+        for form_index, form in enumerate(forms):
+            params, _ = fit_form(form, times, events, weights)
+            curves[replicate, form_index] = survival_curve(form, params, CURVE_MONTHS)
+            replicate_params[replicate][form_index] = params
+    return curves, replicate_params
+
+
+def bootstrap(times, events, forms, num_bootstrap, workers=None, seed=0):
+    """Bootstrap survival curves and params for every form, split across worker processes."""
+    workers = workers or os.cpu_count() or 1
+    num_chunks = max(1, min(workers, num_bootstrap))
+    chunk_sizes = [len(chunk) for chunk in np.array_split(np.arange(num_bootstrap), num_chunks)]
+    seeds = np.random.SeedSequence(seed).spawn(num_chunks)
+    with ProcessPoolExecutor(max_workers=num_chunks) as pool:
+        outcomes = list(pool.map(
+            _bootstrap_chunk,
+            [times] * num_chunks, [events] * num_chunks, [forms] * num_chunks, chunk_sizes, seeds
+        ))
+    curves = np.concatenate([chunk_curves for chunk_curves, _ in outcomes])
+    replicate_params = [params for _, chunk_params in outcomes for params in chunk_params]
+    return curves, replicate_params
+
+
+def _params_interval(replicate_params, form_index, confidence):
+    # Percentile intervals for scalar parameters (spline hazards are summarised by the curve band)
+    first = replicate_params[0][form_index]
+    intervals = {}
+    for name, value in first.items():
+        if isinstance(value, list):
+            continue
+        samples = np.array([params[form_index][name] for params in replicate_params])
+        low, high = np.quantile(samples, [(1 - confidence) / 2, (1 + confidence) / 2])
+        intervals[name] = [float(low), float(high)]
+    return intervals
+
+
+def fit_programme(times, events, num_bootstrap=200, workers=None, confidence=0.95, seed=0):
+    """Fit every form to one programme's follow-up data, with bootstrap intervals."""
+    times = np.asarray(times, dtype=float)
+    events = np.asarray(events, dtype=float)
+    models = {}
+    for form in DECAY_FORMS:
+        params, log_likelihood = fit_form(form, times, events)
+        num_params = 1 if form in ("Exponential", "Linear") else (2 if form == "Weibull" else len(params["hazards"]))
+        models[form] = {
+            "params": params,
+            "log_likelihood": log_likelihood,
+            "aic": 2 * num_params - 2 * log_likelihood,
+            "survival": survival_curve(form, params, CURVE_MONTHS).tolist(),
+        }
+
+    if num_bootstrap > 0:
+        curves, replicate_params = bootstrap(times, events, DECAY_FORMS, num_bootstrap, workers, seed)
+        low, high = np.quantile(curves, [(1 - confidence) / 2, (1 + confidence) / 2], axis=0)
+        for form_index, form in enumerate(DECAY_FORMS):
+            models[form]["survival_ci_low"] = low[form_index].tolist()
+            models[form]["survival_ci_high"] = high[form_index].tolist()
+            models[form]["params_ci"] = _params_interval(replicate_params, form_index, confidence)
+
+    return {
+        "num_clients": int(times.size),
+        "num_relapses": int(events.sum()),
+        "best_model": min(models, key=lambda form: models[form]["aic"]),
+        "curve_months": CURVE_MONTHS.tolist(),
+        "confidence": confidence,
+        "models": models,
+    }
+
+
+def load_fitted_decay(path=FITTED_DECAY_PATH):
+    """Fitted decay curves by programme, or {} if nothing has been fitted yet."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fitted_file:
+        return json.load(fitted_file).get("programmes", {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit decay curves to follow-up data and cache them for the app.")
+    parser.add_argument("path", help="CSV or Parquet file with months, relapsed and (optionally) programme columns")
+    parser.add_argument("--bootstrap", type=int, default=200, help="Bootstrap replicates for confidence intervals")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for the bootstrap")
+    parser.add_argument("--output", default=FITTED_DECAY_PATH, help="Where to write the fitted curves")
+    parser.add_argument("--force", action="store_true", help="Refit even if this data has been fitted before")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as data_file:
+        source_sha1 = hashlib.sha1(data_file.read()).hexdigest()
+    if not args.force and os.path.exists(args.output):
+        with open(args.output) as fitted_file:
+            if json.load(fitted_file).get("source_sha1") == source_sha1:
+                print(f"{args.output} is already fitted to this data; use --force to refit.")
+                return
+
+    data = read_followup_data(args.path)
+    fitted = {}
+    for programme, rows in data.groupby("programme"):
+        started = time.perf_counter()
+        fitted[programme] = fit_programme(rows["months"].to_numpy(), rows["relapsed"].to_numpy(), args.bootstrap, args.workers)
+        print(f"{programme}: {len(rows):,} clients, best fit {fitted[programme]['best_model']} ({time.perf_counter() - started:.1f}s)")
+
+    with open(args.output, "w") as fitted_file:
+        json.dump({"source_sha1": source_sha1, "fitted_at": time.strftime("%Y-%m-%d %H:%M:%S"), "programmes": fitted}, fitted_file, indent=1)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
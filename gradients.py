@@ -0,0 +1,293 @@
+"""
+Exact partial derivatives and elasticities of cost per WELLBY.
+
+Cost per WELLBY is a smooth function of almost every input, so its derivatives are
+written out here instead of being estimated by nudging each input up and down:
+
+    programme:  cost per WELLBY = sessions x cost per session x harm proportion
+                                  / (WELLBYs per completer x retention rate)
+    overall:    (sum of clients seen x cost per client + fixed costs)
+                / sum of clients seen x WELLBYs per client
+
+WELLBYs per completer are linear in the wellbeing gain and have a closed-form
+derivative in the decay rate (exponential decay) or months to zero (linear decay).
+Custom and fitted curves have no decay input. Staffing inputs act through the cost per
+session unless it is overridden.
+
+Clients seen are whole numbers in the Overall tab, which makes them a step function of
+the client shares, number of branches and capacity. Derivatives with respect to those
+inputs are taken of the model with fractional clients, so they describe the trend the
+steps follow rather than being zero.
+
+All functions work on floats or on numpy arrays of any broadcastable shape, so a whole
+batch of scenarios is differentiated in one pass. Inputs are named as in
+uncertainty.py ("Insomnia/retention_rate", "cost_per_session", "client_share/Insomnia")
+with staffing inputs as "branch/<field>".
+"""
+import numpy as np
+
+from model import (
+    WEEKS_PER_YEAR,
+    FINAL_ASSESSMENT_COST_PER_COACH,
+    calculate_branch_costs,
+    exponential_decay_wellbys_per_client,
+    linear_decay_wellbys_per_client,
+    overall_outcomes,
+    clients_per_branch_per_year
+)
+from utils import calculate_total_wellbys_per_ea
+from uncertainty import INPUT_LABELS
+
+BRANCH_SALARIES = [
+    "counsellor_salary",
+    "head_of_training_salary",
+    "va_salary",
+    "branch_manager_salary",
+    "hiring_manager_salary",
+    "other_salary",
+]
+BRANCH_INPUT_LABELS = {
+    "coaches_per_cohort": "Coaches per cohort",
+    "clients_per_coach": "Clients per coach",
+    "sessions_per_client": "Sessions per client",
+    "counsellor_salary": "Counsellor salary",
+    "head_of_training_salary": "Head of training salary",
+    "va_salary": "VA salary",
+    "branch_manager_salary": "Branch manager salary",
+    "hiring_manager_salary": "Hiring manager salary",
+    "other_salary": "Other salaries",
+}
+
+
+def input_label(name):
+    """Display label of a gradient input name."""
+    if name.startswith("branch/"):
+        return f"Marginal costs: {BRANCH_INPUT_LABELS[name.split('/', 1)[1]]}"
+    if name.startswith("client_share/"):
+        return f"{name.split('/', 1)[1]}: {INPUT_LABELS['client_share']}"
+    if "/" in name:
+        programme, field = name.split("/", 1)
+        return f"{programme}: {INPUT_LABELS[field]}"
+    return INPUT_LABELS.get(name, BRANCH_INPUT_LABELS.get(name, name))
+
+
+def exponential_decay_derivative(wellbeing_gain, annual_decay_rate, timeframe_weeks=WEEKS_PER_YEAR):
+    """Derivative of exponential_decay_wellbys_per_client with respect to the annual decay rate."""
+    q = (1.0 - annual_decay_rate) ** (1.0 / WEEKS_PER_YEAR)
+    no_decay = np.abs(1.0 - q) < 1e-9
+    safe_one_minus_q = np.where(no_decay, 1.0, 1.0 - q)
+    # d/dq of (1 - q^T) / (1 - q), and dq/d(rate)
+    d_weeks_dq = ((1.0 - q ** timeframe_weeks) - timeframe_weeks * q ** (timeframe_weeks - 1) * safe_one_minus_q) / safe_one_minus_q ** 2
+    # Limit as q -> 1, from the series 1 + q + ... + q^(T-1)
+    d_weeks_dq = np.where(no_decay, timeframe_weeks * (timeframe_weeks - 1) / 2, d_weeks_dq)
+    dq_drate = -q / (WEEKS_PER_YEAR * np.maximum(1.0 - annual_decay_rate, 1e-12))
+    return wellbeing_gain * d_weeks_dq * dq_drate / WEEKS_PER_YEAR
+
+
+def linear_decay_derivative(wellbeing_gain, months_to_zero, timeframe_weeks=WEEKS_PER_YEAR):
+    """Derivative of linear_decay_wellbys_per_client with respect to months to zero, between whole weeks."""
+    weeks_to_zero = np.asarray(months_to_zero, dtype=float) / 12 * WEEKS_PER_YEAR
+    num_weeks = np.floor(np.minimum(timeframe_weeks, weeks_to_zero))
+    safe_weeks_to_zero = np.where(weeks_to_zero > 0, weeks_to_zero, 1.0)
+    d_weeks_of_benefit = num_weeks * (num_weeks - 1) / (2 * safe_weeks_to_zero ** 2) * WEEKS_PER_YEAR / 12
+    return np.where(weeks_to_zero > 0, wellbeing_gain * d_weeks_of_benefit / WEEKS_PER_YEAR, 0.0)
+
+
+def wellbys_per_completer(inputs, timeframe_weeks):
+    """
+    Gross WELLBYs per completing client of one programme's inputs, and their derivatives
+    with respect to its decay inputs as a dict.
+    """
+    gain = inputs["peak_wellbeing"] - inputs["baseline_wellbeing"]
+    decay_model = inputs.get("decay_model", "Exponential Decay")
+    if decay_model == "Exponential Decay":
+        rate = inputs["annual_decay_rate"]
+        return (
+            exponential_decay_wellbys_per_client(gain, rate, timeframe_weeks),
+            {"annual_decay_rate": exponential_decay_derivative(gain, rate, timeframe_weeks)}
+        )
+    if decay_model == "Linear Decay":
+        months = inputs["months_to_zero"]
+        return (
+            linear_decay_wellbys_per_client(gain, months, timeframe_weeks),
+            {"months_to_zero": linear_decay_derivative(gain, months, timeframe_weeks)}
+        )
+    wellbys = calculate_total_wellbys_per_ea(
+        gain, decay_model, timeframe_weeks, 52, custom_weekly_points=inputs.get("weekly_points")
+    )
+    return wellbys, {}
+
+
+def cost_per_session_gradient(branch_inputs):
+    """Cost per session and its derivatives with respect to the Marginal Costs tab's inputs."""
+    costs = calculate_branch_costs(**branch_inputs)
+    cost_per_session = costs["cost_per_session"]
+    sessions_per_month = costs["sessions_per_month"]
+    has_sessions = sessions_per_month > 0
+    per_session = np.where(has_sessions, 1.0 / np.where(has_sessions, sessions_per_month, 1.0), 0.0)
+
+    def per_unit(value):
+        # -cost per session / value: the sessions a month are proportional to each of these
+        return np.where(has_sessions, -cost_per_session / np.where(value != 0, value, np.inf), 0.0)
+
+    gradient = {salary: per_session for salary in BRANCH_SALARIES}
+    gradient["hiring_manager_salary"] = np.where(branch_inputs.get("hiring_manager_enabled", True), per_session, 0.0)
+    final_assessment = np.where(branch_inputs.get("final_roleplay_assessment", True), FINAL_ASSESSMENT_COST_PER_COACH, 0)
+    gradient["coaches_per_cohort"] = final_assessment * per_session + per_unit(branch_inputs["coaches_per_cohort"])
+    gradient["clients_per_coach"] = per_unit(branch_inputs["clients_per_coach"])
+    gradient["sessions_per_client"] = per_unit(branch_inputs["sessions_per_client"])
+    return cost_per_session, gradient
+
+
+def _wellbys_log_gradient(inputs, wellbys, decay_gradient):
+    """Derivatives of log(WELLBYs per client) with respect to one programme's inputs."""
+    gain = inputs["peak_wellbeing"] - inputs["baseline_wellbeing"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_gradient = {
+            "retention_rate": 1.0 / inputs["retention_rate"],
+            "harm_proportion": -1.0 / inputs["harm_proportion"],
+            # WELLBYs are proportional to the gain, whatever the decay model
+            "peak_wellbeing": 1.0 / gain,
+            "baseline_wellbeing": -1.0 / gain,
+        }
+        for name, derivative in decay_gradient.items():
+            log_gradient[name] = derivative / wellbys
+    return log_gradient
+
+
+def elasticities(value, gradient, inputs):
+    """Percentage change in `value` per 1% change in each input: input x derivative / value."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {name: np.where(inputs[name] == 0, 0.0, inputs[name] * derivative / value) for name, derivative in gradient.items()}
+
+
+def model_gradients(programme_inputs, overall_inputs, cost_per_session=None, branch_inputs=None, timeframe_weeks=WEEKS_PER_YEAR):
+    """
+    Cost per WELLBY of every programme and of the portfolio, with their derivatives and
+    elasticities with respect to every input.
+
+    `programme_inputs` maps programme name to its inputs (as in the programme tabs, rates
+    as fractions); `overall_inputs` holds "client_shares", "num_branches", "fixed_costs",
+    "coaches_per_cohort" and "clients_per_coach" as in the Overall tab. The cost per
+    session is derived from `branch_inputs` unless `cost_per_session` is given.
+
+    Returns {"programmes": {name: result}, "overall": result}, where each result has
+    "cost_per_wellby", "gradient", "elasticity" and the "inputs" they refer to.
+    """
+    programmes = list(programme_inputs)
+    staffing_gradient = {}
+    if cost_per_session is None:
+        cost_per_session, staffing_gradient = cost_per_session_gradient(branch_inputs)
+    staffing_values = {f"branch/{name}": branch_inputs[name] for name in staffing_gradient}
+
+    # Per programme: cost and WELLBYs per client seen
+    cost_per_client, wellbys_per_client, retained_per_client, log_gradients, input_values = [], [], [], [], []
+    results = {}
+    for programme in programmes:
+        inputs = programme_inputs[programme]
+        wellbys, decay_gradient = wellbys_per_completer(inputs, timeframe_weeks)
+        log_gradient = _wellbys_log_gradient(inputs, wellbys, decay_gradient)
+        sessions = inputs["sessions_per_participant"]
+        cost = sessions * cost_per_session
+        net_wellbys = wellbys * inputs["retention_rate"] / inputs["harm_proportion"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cost_per_wellby = np.where(net_wellbys > 0, cost / net_wellbys, np.nan)
+
+        values = {f"{programme}/{name}": inputs[name] for name in log_gradient}
+        values[f"{programme}/sessions_per_participant"] = sessions
+        values["cost_per_session"] = cost_per_session
+        values.update(staffing_values)
+        gradient = {f"{programme}/{name}": -cost_per_wellby * derivative for name, derivative in log_gradient.items()}
+        gradient[f"{programme}/sessions_per_participant"] = cost_per_wellby / sessions
+        gradient["cost_per_session"] = cost_per_wellby / cost_per_session
+        for name, derivative in staffing_gradient.items():
+            gradient[f"branch/{name}"] = gradient["cost_per_session"] * derivative
+        results[programme] = {
+            "cost_per_wellby": cost_per_wellby,
+            "gradient": gradient,
+            "elasticity": elasticities(cost_per_wellby, gradient, values),
+            "inputs": values,
+        }
+        cost_per_client.append(np.asarray(cost, dtype=float))
+        wellbys_per_client.append(np.asarray(net_wellbys, dtype=float))
+        retained_per_client.append(np.asarray(inputs["retention_rate"], dtype=float))
+        log_gradients.append(log_gradient)
+        input_values.append(values)
+
+    # Portfolio
+    shape = np.broadcast_shapes(*(np.shape(array) for array in cost_per_client + wellbys_per_client))
+    cost_per_client = np.stack([np.broadcast_to(array, shape) for array in cost_per_client])
+    wellbys_per_client = np.stack([np.broadcast_to(array, shape) for array in wellbys_per_client])
+    client_shares = np.stack([np.broadcast_to(np.asarray(overall_inputs["client_shares"][p], dtype=float), shape) for p in programmes])
+    num_branches, fixed_costs = overall_inputs["num_branches"], overall_inputs["fixed_costs"]
+    branch_clients = clients_per_branch_per_year(overall_inputs["coaches_per_cohort"], overall_inputs["clients_per_coach"])
+    outcomes = overall_outcomes(
+        cost_per_client, wellbys_per_client, np.stack([np.broadcast_to(array, shape) for array in retained_per_client]),
+        client_shares, num_branches, fixed_costs, branch_clients
+    )
+    overall = outcomes["Overall Total Cost per WELLBY"]
+    clients_seen, total_wellbys = outcomes["Clients Seen"], outcomes["Total WELLBYs"]
+
+    gradient, values = {}, {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Programme inputs act through cost and WELLBYs per client, with clients seen fixed
+        cost_weight = clients_seen / total_wellbys
+        wellbys_weight = -overall * clients_seen * wellbys_per_client / total_wellbys
+        for index, programme in enumerate(programmes):
+            for name, derivative in log_gradients[index].items():
+                gradient[f"{programme}/{name}"] = wellbys_weight[index] * derivative
+            sessions_name = f"{programme}/sessions_per_participant"
+            gradient[sessions_name] = cost_weight[index] * cost_per_session
+            values.update({name: value for name, value in input_values[index].items() if name.startswith(f"{programme}/")})
+        gradient["cost_per_session"] = np.sum(cost_weight * cost_per_client, axis=0) / cost_per_session
+        values["cost_per_session"] = cost_per_session
+        for name, derivative in staffing_gradient.items():
+            gradient[f"branch/{name}"] = gradient["cost_per_session"] * derivative
+        values.update(staffing_values)
+
+        # Scale inputs, with fractional clients seen
+        total_share = client_shares.sum(axis=0)
+        shares = client_shares / total_share
+        mean_cost = np.sum(shares * cost_per_client, axis=0)
+        mean_wellbys = np.sum(shares * wellbys_per_client, axis=0)
+        capacity = num_branches * branch_clients
+        relaxed_overall = (capacity * mean_cost + fixed_costs) / (capacity * mean_wellbys)
+        for index, programme in enumerate(programmes):
+            name = f"client_share/{programme}"
+            gradient[name] = (
+                (cost_per_client[index] - mean_cost) - relaxed_overall * (wellbys_per_client[index] - mean_wellbys)
+            ) / (total_share * mean_wellbys)
+            values[name] = client_shares[index]
+        gradient["num_branches"] = -fixed_costs / (num_branches * capacity * mean_wellbys)
+        gradient["fixed_costs"] = 1.0 / total_wellbys
+        values["num_branches"], values["fixed_costs"] = num_branches, fixed_costs
+        capacity_derivative = -fixed_costs / (capacity * mean_wellbys)
+        for name in ("coaches_per_cohort", "clients_per_coach"):
+            # Capacity is proportional to both
+            gradient[name] = capacity_derivative / overall_inputs[name]
+            values[name] = overall_inputs[name]
+
+    return {
+        "programmes": results,
+        "overall": {
+            "cost_per_wellby": overall,
+            "gradient": gradient,
+            "elasticity": elasticities(overall, gradient, values),
+            "inputs": values,
+        },
+    }
+
+
+def scenario_gradients(scenario_inputs):
+    """model_gradients() of a model graph's input values (see DependencyGraph.input_values)."""
+    programme_inputs = {
+        name.split("/", 1)[1]: inputs for name, inputs in scenario_inputs.items() if name.startswith("programme_inputs/")
+    }
+    timeframe_weeks = next(iter(programme_inputs.values()))["timeframe_weeks"]
+    return model_gradients(
+        programme_inputs,
+        scenario_inputs["overall_inputs"],
+        cost_per_session=scenario_inputs.get("cost_per_session_override"),
+        branch_inputs=scenario_inputs["branch_inputs"],
+        timeframe_weeks=timeframe_weeks
+    )
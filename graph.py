@@ -0,0 +1,161 @@
+"""
+Memoized dependency graph of the model's calculations.
+
+Each rerun the tabs set the graph's input nodes from their widgets, then ask for the
+results they display. A computed node is only recalculated when one of its
+dependencies has changed since it was last computed:
+
+    branch_inputs -> branch_costs -> cost_per_session -> programme/<name> -> overall
+                 cost_per_session_override ----^     programme_inputs/<name> -^   ^
+                                                                  overall_inputs -'
+
+The Overall inputs either describe identical branches or hold a table of branches
+with their own staffing and mix (see portfolio.py); a branch table's costs also depend
+on whether the cost per session is overridden.
+
+Every node carries a version that only increases when its value actually changes, and
+each computed node remembers the versions of the dependencies it was computed from.
+So moving one programme's slider recomputes that programme and the Overall tables but
+no other programme, and a change that leaves a node's value as it was (e.g. staffing
+changes that give the same cost per session) stops there.
+
+One graph is kept per session, in its SessionArtifacts (see sessions.py), so an idle
+session's graph can be dropped and rebuilt when it returns.
+"""
+import numpy as np
+
+from model import calculate_branch_costs, programme_results_array, per_client_results, overall_outcomes, clients_per_branch_per_year
+from portfolio import portfolio_outcomes
+from sessions import session_artifacts
+from utils import calculate_programme_results
+
+
+def _same(a, b):
+    """Deep equality that treats NaN as equal to itself and compares arrays by value."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[key], b[key]) for key in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.shape(a) == np.shape(b) and np.array_equal(a, b, equal_nan=np.asarray(a).dtype.kind == "f")
+    if isinstance(a, float) and isinstance(b, float) and a != a and b != b:
+        return True
+    return type(a) is type(b) and a == b
+
+
+class _Node:
+    __slots__ = ("name", "function", "dependencies", "value", "version", "computed_from")
+
+    def __init__(self, name, function=None, dependencies=()):
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.value = None
+        self.version = 0
+        self.computed_from = None
+
+
+class DependencyGraph:
+    """Input and computed nodes, recomputed lazily when their dependencies change."""
+
+    def __init__(self):
+        self._nodes = {}
+        self.recomputed = []  # Computed nodes recalculated since the last reset_stats()
+
+    def add_input(self, name):
+        self._nodes[name] = _Node(name)
+
+    def add_node(self, name, function, dependencies):
+        """A node whose value is function(*dependency values)."""
+        self._nodes[name] = _Node(name, function, dependencies)
+
+    def __contains__(self, name):
+        return name in self._nodes
+
+    def set(self, name, value):
+        node = self._nodes[name]
+        if node.function is not None:
+            raise ValueError(f"{name} is a computed node")
+        if node.version == 0 or not _same(node.value, value):
+            node.value = value
+            node.version += 1
+
+    def get(self, name):
+        node = self._nodes[name]
+        if node.function is None:
+            if node.version == 0:
+                raise KeyError(f"Input {name} has not been set")
+            return node.value
+        dependency_values = [self.get(dependency) for dependency in node.dependencies]
+        dependency_versions = tuple(self._nodes[dependency].version for dependency in node.dependencies)
+        if dependency_versions != node.computed_from:
+            value = node.function(*dependency_values)
+            self.recomputed.append(name)
+            if node.version == 0 or not _same(node.value, value):
+                node.value = value
+                node.version += 1
+            node.computed_from = dependency_versions
+        return node.value
+
+    def input_values(self):
+        """Every input node that has been set, e.g. to save the current scenario."""
+        return {name: node.value for name, node in self._nodes.items() if node.function is None and node.version > 0}
+
+    def reset_stats(self):
+        self.recomputed = []
+
+
+# --- The model ---
+
+def _cost_per_session(branch_costs, override):
+    return float(branch_costs["cost_per_session"]) if override is None else float(override)
+
+
+def _overall(programmes, overall_inputs, cost_per_session_override, *programme_results):
+    results = programme_results_array(dict(zip(programmes, programme_results)), programmes)
+    if overall_inputs.get("branches") is not None:
+        # A table of branches with their own staffing and mix (see portfolio.py)
+        _, wellbys_per_client, retained_per_client = per_client_results(results)
+        outcomes = portfolio_outcomes(
+            overall_inputs["branches"], programmes,
+            [programme_result["Inputs"]["sessions_per_participant"] for programme_result in programme_results],
+            wellbys_per_client, retained_per_client, overall_inputs["fixed_costs"], cost_per_session_override
+        )
+        outcomes["Programme Results"] = results
+        return outcomes
+    share_array = np.array([overall_inputs["client_shares"][programme] for programme in programmes], dtype=float)
+    outcomes = overall_outcomes(
+        *per_client_results(results), share_array,
+        overall_inputs["num_branches"], overall_inputs["fixed_costs"],
+        clients_per_branch_per_year(overall_inputs["coaches_per_cohort"], overall_inputs["clients_per_coach"])
+    )
+    outcomes["Programme Results"] = results
+    return outcomes
+
+
+def build_model_graph(programmes):
+    graph = DependencyGraph()
+    graph.add_input("branch_inputs")
+    graph.add_input("cost_per_session_override")
+    graph.add_node("branch_costs", lambda inputs: calculate_branch_costs(**inputs), ["branch_inputs"])
+    graph.add_node("cost_per_session", _cost_per_session, ["branch_costs", "cost_per_session_override"])
+    for programme in programmes:
+        graph.add_input(f"programme_inputs/{programme}")
+        graph.add_node(f"programme/{programme}", calculate_programme_results, [f"programme_inputs/{programme}", "cost_per_session"])
+    graph.add_input("overall_inputs")
+    graph.add_node(
+        "overall", lambda overall_inputs, override, *results: _overall(programmes, overall_inputs, override, *results),
+        ["overall_inputs", "cost_per_session_override"] + [f"programme/{programme}" for programme in programmes]
+    )
+    return graph
+
+
+def get_session_graph(programmes):
+    """This session's model graph, rebuilt if the programmes have changed."""
+    artifacts = session_artifacts()
+    graph_programmes, graph = artifacts.get("model_graph", (None, None))
+    if graph is None or graph_programmes != list(programmes):
+        graph = build_model_graph(programmes)
+        artifacts.set("model_graph", (list(programmes), graph))
+    graph.reset_stats()
+    return graph
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from config import MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS, JOB_POLL_INTERVAL_SECONDS
+from sessions import session_artifacts
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's worker function once the job has been cancelled."""
+
+
+class JobQueueFull(Exception):
+    """Raised when the server already has MAX_QUEUED_JOBS jobs waiting to run."""
+
+
+class Job:
+    """
+    A single analysis running on the shared worker pool.
+
+    The worker function receives the Job as its first argument and calls
+    `job.report(...)` to publish progress and partial results. `report` raises
+    JobCancelled once the job has been cancelled, so long loops stop at their
+    next progress update.
+    """
+
+    def __init__(self, name, inputs_key):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.inputs_key = inputs_key
+        self.status = "queued"  # queued -> running -> done / failed / cancelled
+        self.progress = 0.0
+        self.message = ""
+        self.partial_result = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def report(self, progress, message=None, partial_result=None):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        with self._lock:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+            if message is not None:
+                self.message = message
+            if partial_result is not None:
+                self.partial_result = partial_result
+
+    def cancel(self):
+        self._cancel_event.set()
+        with self._lock:
+            if self.status == "queued":
+                self.status = "cancelled"
+                self.finished_at = time.time()
+
+    # Status changes take the lock, so a cancel can't interleave with the worker's updates
+    def _start(self):
+        with self._lock:
+            if self.status != "queued":
+                return False
+            self.status = "running"
+            self.started_at = time.time()
+            return True
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            if status == "done":
+                self.result = result
+                self.progress = 1.0
+            self.error = error
+            self.status = status
+            self.finished_at = time.time()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def snapshot(self):
+        # Consistent view of progress/partial results for rendering
+        with self._lock:
+            return self.progress, self.message, self.partial_result
+
+
+class JobManager:
+    """Runs jobs on a bounded thread pool shared by all sessions of the server."""
+
+    def __init__(self, max_workers, max_queued):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._max_queued = max_queued
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, inputs_key, fn, *args, **kwargs):
+        with self._lock:
+            self._jobs = {job_id: job for job_id, job in self._jobs.items() if not job.finished}
+            queued = sum(1 for job in self._jobs.values() if job.status == "queued")
+            if queued >= self._max_queued:
+                raise JobQueueFull(f"{queued} analyses are already waiting to run. Please try again shortly.")
+            job = Job(name, inputs_key)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if not job._start():
+            return
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            job._finish("cancelled")
+        except Exception as exc:  # Surface the error in the session instead of losing it in the pool
+            job._finish("failed", error=exc)
+        else:
+            job._finish("done", result)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "running": sum(1 for job in jobs if job.status == "running"),
+            "queued": sum(1 for job in jobs if job.status == "queued"),
+        }
+
+
+@st.cache_resource
+def get_job_manager():
+    # One pool per server process, so MAX_CONCURRENT_JOBS caps the whole server
+    return JobManager(MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS)
+
+
+def make_inputs_key(inputs):
+    """Hash a JSON-serialisable description of a job's inputs."""
+    encoded = json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def _keep_running(jobs):
+    # An idle session's finished jobs can be dropped; running ones are still in use
+    for name in [name for name, job in jobs.items() if job.finished]:
+        del jobs[name]
+    return jobs or None
+
+
+def _session_jobs():
+    return session_artifacts().setdefault("analysis_jobs", {}, prune=_keep_running)
+
+
+def get_session_job(name, inputs):
+    """
+    Return this session's job called `name` if it was started with the same inputs.
+
+    A job whose inputs no longer match (e.g. because a slider moved) is stale: it is
+    cancelled, forgotten and None is returned.
+    """
+    jobs = _session_jobs()
+    job = jobs.get(name)
+    if job is None:
+        return None
+    if job.inputs_key != make_inputs_key(inputs):
+        job.cancel()
+        del jobs[name]
+        return None
+    return job
+
+
+def start_session_job(name, inputs, fn, *args, **kwargs):
+    """Start `fn(job, *args, **kwargs)` in the background, replacing any previous job called `name`."""
+    jobs = _session_jobs()
+    previous = jobs.pop(name, None)
+    if previous is not None:
+        previous.cancel()
+    job = get_job_manager().submit(name, make_inputs_key(inputs), fn, *args, **kwargs)
+    jobs[name] = job
+    return job
+
+
+def display_session_job(name, render_partial=None):
+    """
+    Show progress for this session's job called `name` without blocking the rerun.
+
+    Progress is redrawn in a fragment every JOB_POLL_INTERVAL_SECONDS, so the rest of
+    the page stays interactive. When the job finishes the whole app reruns once so the
+    caller can render `job.result`. Returns the job (or None if there is none).
+    """
+    job = _session_jobs().get(name)
+    if job is None:
+        return None
+
+    @st.fragment(run_every=None if job.finished else JOB_POLL_INTERVAL_SECONDS)
+    def _job_progress():
+        progress, message, partial_result = job.snapshot()
+        if job.status == "queued":
+            stats = get_job_manager().stats()
+            st.progress(0.0, text=f"Waiting for a free worker ({stats['running']} running, {stats['queued']} queued)...")
+        elif job.status == "running":
+            st.progress(progress, text=message or f"Running... {progress:.0%}")
+            if st.button("Cancel", key=f"cancel_job_{name}"):
+                job.cancel()
+            if render_partial is not None and partial_result is not None:
+                render_partial(partial_result)
+        elif job.status == "failed":
+            st.error(f"The analysis failed: {job.error}")
+        elif job.status == "cancelled":
+            st.info("The analysis was cancelled.")
+        if job.finished and st.session_state.get(f"_job_rendered_{name}") != job.id:
+            # Rerun the full script once so the finished result replaces the progress view
+            st.session_state[f"_job_rendered_{name}"] = job.id
+            st.rerun()
+
+    _job_progress()
+    return job
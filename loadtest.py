@@ -0,0 +1,129 @@
+"""
+Load-test the app with N concurrent simulated sessions.
+
+Each simulated session is a Streamlit AppTest running app.py. Like the real server,
+every session's script runs in a thread of this one Python process, so the numbers
+reflect what a single server process can sustain. Each session repeatedly moves a
+random slider on a programme tab or the Overall tab and times the rerun.
+
+Usage:
+    python loadtest.py --sessions 1,2,4,8 --reruns 20
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from config import offerings
+from sessions import current_rss_bytes
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+LOADTEST_TAB_NAMES = list(offerings.keys()) + ["Overall"]
+
+
+def random_slider_value(slider, rng):
+    steps = int(round((slider.max - slider.min) / slider.step))
+    value = slider.min + rng.randint(0, steps) * slider.step
+    # Integer sliders (branches, mix) must be set with ints
+    return int(round(value)) if isinstance(slider.value, int) else round(value, 6)
+
+
+def simulate_session(session_index, num_reruns, timeout, start_barrier):
+    rng = random.Random(session_index)
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    app.run()
+    start_barrier.wait()
+
+    latencies = []
+    errors = 0
+    tabs_by_label = {tab.label: tab for tab in app.tabs}
+    for _ in range(num_reruns):
+        tab = tabs_by_label[rng.choice(LOADTEST_TAB_NAMES)]
+        sliders = list(tab.slider)
+        if not sliders:
+            continue
+        slider = rng.choice(sliders)
+        slider.set_value(random_slider_value(slider, rng))
+        started = time.perf_counter()
+        app.run()
+        latencies.append(time.perf_counter() - started)
+        if app.exception:
+            errors += 1
+        tabs_by_label = {tab.label: tab for tab in app.tabs}
+    return app, latencies, errors
+
+
+def run_load_level(num_sessions, num_reruns, timeout):
+    baseline_rss = current_rss_bytes()
+    start_barrier = threading.Barrier(num_sessions)
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=num_sessions) as pool:
+        futures = [
+            pool.submit(simulate_session, i, num_reruns, timeout, start_barrier)
+            for i in range(num_sessions)
+        ]
+        outcomes = [future.result() for future in futures]
+
+    wall_elapsed = time.perf_counter() - wall_started
+    cpu_elapsed = time.process_time() - cpu_started
+    # Measure while every session (and its widget state) is still alive
+    peak_rss = current_rss_bytes()
+    # The sessions' own accounting (see sessions.py), which excludes allocator and cache overheads
+    tracked = [app.session_state["_session_artifacts"] for app, _, _ in outcomes]
+
+    latencies = np.array([latency for _, session_latencies, _ in outcomes for latency in session_latencies])
+    errors = sum(session_errors for _, _, session_errors in outcomes)
+    del outcomes
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies.size else (np.nan, np.nan, np.nan)
+    return {
+        "Sessions": num_sessions,
+        "Reruns": int(latencies.size),
+        "Errors": errors,
+        "p50 (ms)": p50 * 1000,
+        "p95 (ms)": p95 * 1000,
+        "p99 (ms)": p99 * 1000,
+        "Reruns/s": latencies.size / wall_elapsed if wall_elapsed > 0 else np.nan,
+        # Share of the machine's cores kept busy by this process during the level
+        "CPU saturation": cpu_elapsed / (wall_elapsed * (os.cpu_count() or 1)),
+        "MB per session": max(peak_rss - baseline_rss, 0) / num_sessions / 1e6,
+        "Tracked KB/session": np.mean([artifacts.state_bytes + artifacts.artifact_bytes for artifacts in tracked]) / 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent simulated sessions through app.py.")
+    parser.add_argument("--sessions", default="1,2,4,8", help="Comma-separated concurrency levels to test")
+    parser.add_argument("--reruns", type=int, default=20, help="Slider moves per session")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds allowed for a single rerun")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.sessions.split(",") if level.strip()]
+    # Warm up once so imports and module-level caches aren't counted as per-session memory
+    AppTest.from_file(APP_PATH, default_timeout=args.timeout).run()
+
+    header = ["Sessions", "Reruns", "Errors", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Reruns/s", "CPU saturation", "MB per session", "Tracked KB/session"]
+    print("  ".join(f"{column:>14}" for column in header))
+    for num_sessions in levels:
+        row = run_load_level(num_sessions, args.reruns, args.timeout)
+        cells = []
+        for column in header:
+            value = row[column]
+            if column == "CPU saturation":
+                cells.append(f"{value:>14.0%}")
+            elif isinstance(value, float):
+                cells.append(f"{value:>14,.1f}")
+            else:
+                cells.append(f"{value:>14}")
+        print("  ".join(cells), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Pure calculation functions shared by the tabs and the batch analyses.
+
+Every function here works on plain floats or on numpy arrays of any (broadcastable)
+shape, so the same code computes one scenario for the UI or thousands at once.
+"""
+import numpy as np
+
+# Cost of an Overcome core-team member's final roleplay assessment, per coach
+FINAL_ASSESSMENT_COST_PER_COACH = 7
+
+
+def calculate_branch_costs(
+    coaches_per_cohort,
+    clients_per_coach,
+    sessions_per_client,
+    counsellor_salary,
+    head_of_training_salary,
+    va_salary,
+    branch_manager_salary,
+    hiring_manager_salary,
+    other_salary,
+    final_roleplay_assessment=True,
+    hiring_manager_enabled=True,
+):
+    """
+    Marginal monthly costs of one branch, which trains one cohort per month.
+
+    Returns a dict with "final_assessment_cost", "total_monthly_costs",
+    "sessions_per_month" and "cost_per_session".
+    """
+    final_assessment_cost = np.where(final_roleplay_assessment, FINAL_ASSESSMENT_COST_PER_COACH * coaches_per_cohort, 0)
+    hiring_manager_cost = np.where(hiring_manager_enabled, hiring_manager_salary, 0)
+    total_monthly_costs = (
+        counsellor_salary +
+        head_of_training_salary +
+        va_salary +
+        branch_manager_salary +
+        hiring_manager_cost +
+        other_salary +
+        final_assessment_cost
+    )
+    sessions_per_month = coaches_per_cohort * clients_per_coach * sessions_per_client
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cost_per_session = np.where(sessions_per_month > 0, total_monthly_costs / np.maximum(sessions_per_month, 1), 0.0)
+    return {
+        "final_assessment_cost": final_assessment_cost,
+        "total_monthly_costs": total_monthly_costs,
+        "sessions_per_month": sessions_per_month,
+        "cost_per_session": cost_per_session,
+    }
+
+
+# --- Programme and portfolio outcomes ---
+
+WEEKS_PER_YEAR = 52.0
+# Steady-state capacity of one branch: 3 active cohorts x 15 coaches x 5 clients a month, for 12 months
+ACTIVE_COHORTS_PER_BRANCH = 3
+
+
+def exponential_decay_wellbys_per_client(wellbeing_gain, annual_decay_rate, timeframe_weeks=WEEKS_PER_YEAR):
+    """WELLBYs per completing client when the benefit decays by `annual_decay_rate` (0-1) a year."""
+    weekly_decay_factor = (1.0 - annual_decay_rate) ** (1.0 / WEEKS_PER_YEAR)
+    # Sum of the weekly geometric series, falling back to a flat benefit when there is no decay
+    no_decay = np.abs(1.0 - weekly_decay_factor) < 1e-9
+    safe_denominator = np.where(no_decay, 1.0, 1.0 - weekly_decay_factor)
+    weeks_of_benefit = np.where(
+        no_decay,
+        timeframe_weeks,
+        (1.0 - weekly_decay_factor ** timeframe_weeks) / safe_denominator
+    )
+    return wellbeing_gain * weeks_of_benefit / WEEKS_PER_YEAR
+
+
+def linear_decay_wellbys_per_client(wellbeing_gain, months_to_zero, timeframe_weeks=WEEKS_PER_YEAR):
+    """WELLBYs per completing client when the benefit falls linearly to zero after `months_to_zero`."""
+    weeks_to_zero = np.asarray(months_to_zero, dtype=float) / 12 * WEEKS_PER_YEAR
+    # Whole weeks of benefit, as summed week by week in calculate_total_wellbys_per_ea
+    num_weeks = np.floor(np.minimum(timeframe_weeks, weeks_to_zero))
+    safe_weeks_to_zero = np.where(weeks_to_zero > 0, weeks_to_zero, 1.0)
+    weeks_of_benefit = num_weeks - num_weeks * (num_weeks - 1) / (2 * safe_weeks_to_zero)
+    return np.where(weeks_to_zero > 0, wellbeing_gain * weeks_of_benefit / WEEKS_PER_YEAR, 0.0)
+
+
+def programme_outcomes(
+    retention_rate,
+    wellbeing_gain,
+    annual_decay_rate,
+    harm_proportion,
+    cost_per_session,
+    sessions_per_participant,
+    num_participants,
+    timeframe_weeks=WEEKS_PER_YEAR
+):
+    """
+    Results of one programme with exponential decay, as computed by the programme tabs.
+
+    Returns a dict of arrays keyed like the programme tab's results.
+    """
+    gross_wellbys_per_client = exponential_decay_wellbys_per_client(wellbeing_gain, annual_decay_rate, timeframe_weeks)
+    clients_retained = num_participants * retention_rate
+    net_wellbys = gross_wellbys_per_client * clients_retained / harm_proportion
+    total_cost = sessions_per_participant * cost_per_session * num_participants
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cost_per_wellby = np.where(net_wellbys > 0, total_cost / net_wellbys, np.nan)
+        net_wellbys_per_retained_client = np.where(clients_retained > 0, net_wellbys / clients_retained, 0.0)
+    return {
+        "Total Cost (Money Spent)": total_cost,
+        "Net WELLBYs Generated": net_wellbys,
+        "Cost per WELLBY": cost_per_wellby,
+        "Total Clients Seen": num_participants,
+        "Clients Retained": clients_retained,
+        "Net WELLBYs per Retained Client": net_wellbys_per_retained_client,
+    }
+
+
+def clients_per_branch_per_year(coaches_per_cohort, clients_per_coach):
+    # Each coach sees their clients over the 3 months their cohort is active
+    return ACTIVE_COHORTS_PER_BRANCH * coaches_per_cohort * (clients_per_coach / 3) * 12
+
+
+# Per-programme results as one row of a structured array, keyed by the programme tab's result names
+PROGRAMME_RESULT_FIELDS = {
+    "Total Cost (Money Spent)": "total_cost",
+    "Net WELLBYs Generated": "net_wellbys",
+    "Cost per WELLBY": "cost_per_wellby",
+    "Total Clients Seen": "clients_seen",
+    "Clients Retained": "clients_retained",
+    "Net WELLBYs per Retained Client": "net_wellbys_per_retained_client",
+}
+PROGRAMME_RESULT_DTYPE = np.dtype([(field, np.float64) for field in PROGRAMME_RESULT_FIELDS.values()])
+
+
+def programme_results_array(results_by_programme, programmes):
+    """Pack the programme tabs' result dicts into a structured array, one row per programme."""
+    results = np.zeros(len(programmes), dtype=PROGRAMME_RESULT_DTYPE)
+    for row, programme in enumerate(programmes):
+        programme_results = results_by_programme[programme]
+        for key, field in PROGRAMME_RESULT_FIELDS.items():
+            value = programme_results.get(key)
+            results[field][row] = np.nan if value is None else value
+    return results
+
+
+def per_client_results(results):
+    """Cost, WELLBYs and clients retained per client seen, from a programme results array."""
+    clients_seen = np.where(results["clients_seen"] > 0, results["clients_seen"], np.inf)
+    return results["total_cost"] / clients_seen, results["net_wellbys"] / clients_seen, results["clients_retained"] / clients_seen
+
+
+def overall_outcomes(cost_per_client, wellbys_per_client, retained_per_client, client_shares, num_branches, fixed_costs, branch_clients_per_year):
+    """
+    Scale per-client programme results to the Overall tab's portfolio.
+
+    Programme arrays have the programme on the first axis, e.g. (P,) or (P, N) for N
+    scenarios. `client_shares` are the unnormalised distribution slider values.
+    Returns a dict of per-programme arrays and portfolio totals.
+    """
+    client_shares = np.asarray(client_shares, dtype=float)
+    total_share = client_shares.sum(axis=0)
+    normalised_shares = np.where(total_share > 0, client_shares / np.where(total_share > 0, total_share, 1.0), 0.33)
+    capacity = num_branches * branch_clients_per_year
+    clients_seen = np.floor(normalised_shares * capacity)
+
+    marginal_cost = cost_per_client * clients_seen
+    wellbys = wellbys_per_client * clients_seen
+    clients_retained = retained_per_client * clients_seen
+    total_clients = clients_seen.sum(axis=0)
+    allocated_fixed_costs = np.where(total_clients > 0, clients_seen * fixed_costs / np.where(total_clients > 0, total_clients, 1.0), 0.0)
+
+    total_marginal_cost = marginal_cost.sum(axis=0)
+    total_wellbys = wellbys.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "Clients Seen": clients_seen,
+            "Marginal Programme Cost": marginal_cost,
+            "WELLBYs Generated": wellbys,
+            "Clients Retained": clients_retained,
+            "Allocated Fixed Costs": allocated_fixed_costs,
+            "Total Cost per WELLBY": (marginal_cost + allocated_fixed_costs) / wellbys,
+            "Total Marginal Cost": total_marginal_cost,
+            "Total WELLBYs": total_wellbys,
+            "Marginal Cost per WELLBY": np.where(total_wellbys > 0, total_marginal_cost / total_wellbys, np.nan),
+            "Overall Total Cost per WELLBY": np.where(total_wellbys > 0, (total_marginal_cost + fixed_costs) / total_wellbys, np.nan),
+        }
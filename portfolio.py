@@ -0,0 +1,212 @@
+"""
+Portfolios of branches that differ in staffing, capacity and programme mix.
+
+A branch table has one row per branch: its "branch" name and "country", the staffing
+inputs of the Marginal Costs tab (BRANCH_FIELDS) and the percentage of its clients in
+each programme (share_column(programme)). Each branch's cost per session and yearly
+capacity come from calculate_branch_costs() and clients_per_branch_per_year() applied
+to whole columns, and its clients from overall_outcomes() with one column per branch,
+so a table of hundreds of branches takes a handful of array operations.
+
+WELLBYs and clients retained per client seen are the same in every branch; costs scale
+with each branch's cost per session, unless the cost per session is overridden on the
+Model Parameters tab. Clients are rounded down in each branch, and the organisation's
+fixed costs are shared in proportion to clients seen, as on the Overall tab.
+"""
+import numpy as np
+import pandas as pd
+
+from model import calculate_branch_costs, clients_per_branch_per_year, overall_outcomes
+
+BRANCH_FIELDS = [
+    "coaches_per_cohort",
+    "clients_per_coach",
+    "sessions_per_client",
+    "counsellor_salary",
+    "head_of_training_salary",
+    "va_salary",
+    "branch_manager_salary",
+    "hiring_manager_salary",
+    "other_salary",
+    "final_roleplay_assessment",
+    "hiring_manager_enabled",
+]
+FLAG_FIELDS = ["final_roleplay_assessment", "hiring_manager_enabled"]
+_TRUE_VALUES = {"true", "yes", "y", "1", "1.0"}
+_FALSE_VALUES = {"false", "no", "n", "0", "0.0"}
+
+
+def share_column(programme):
+    return f"{programme} (%)"
+
+
+def table_columns(programmes):
+    return ["branch", "country"] + BRANCH_FIELDS + [share_column(programme) for programme in programmes]
+
+
+def default_branch_table(num_branches, branch_inputs, client_shares, programmes):
+    """`num_branches` identical branches with the current staffing and programme mix."""
+    row = {field: branch_inputs[field] for field in BRANCH_FIELDS}
+    row.update({share_column(programme): client_shares[programme] for programme in programmes})
+    rows = [{"branch": f"Branch {index + 1}", "country": "Default", **row} for index in range(num_branches)]
+    return pd.DataFrame(rows, columns=table_columns(programmes))
+
+
+def _flags(values, column, default):
+    def parse(value):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return bool(default)
+        text = str(value).strip().lower()
+        if text in _TRUE_VALUES:
+            return True
+        if text in _FALSE_VALUES or text == "":
+            return False
+        raise ValueError(f"Column {column!r} should be true or false, not {value!r}")
+    return values.map(parse).astype(bool)
+
+
+def clean_branch_table(table, programmes, branch_inputs, client_shares):
+    """
+    A branch table with every column, in order. Missing columns and blank cells take
+    the current staffing and mix. Raises ValueError if a column isn't numeric (or
+    true/false) or has negative values.
+    """
+    table = table.rename(columns=lambda column: str(column).strip()).reset_index(drop=True)
+    names = pd.Series([f"Branch {index + 1}" for index in range(len(table))])
+    table["branch"] = (table["branch"].fillna(names) if "branch" in table else names).astype(str)
+    table["country"] = (table["country"].fillna("Unknown") if "country" in table else "Default")
+    table["country"] = table["country"].astype(str)
+
+    defaults = {field: branch_inputs[field] for field in BRANCH_FIELDS}
+    defaults.update({share_column(programme): client_shares[programme] for programme in programmes})
+    for column, default in defaults.items():
+        if column not in table:
+            table[column] = default
+        elif column in FLAG_FIELDS:
+            table[column] = _flags(table[column], column, default)
+        else:
+            values = pd.to_numeric(table[column], errors="coerce")
+            unreadable = values.isna() & table[column].notna() & (table[column].astype(str).str.strip() != "")
+            if unreadable.any():
+                raise ValueError(f"Column {column!r} has values that aren't numbers, e.g. {table[column][unreadable].iloc[0]!r}")
+            values = values.fillna(default).astype(float)
+            if (values < 0).any():
+                raise ValueError(f"Column {column!r} has negative values")
+            table[column] = values
+    return table[table_columns(programmes)]
+
+
+def branch_lists(table):
+    """The table's columns as lists: the JSON-friendly form kept in the Overall inputs."""
+    return {column: table[column].tolist() for column in table.columns}
+
+
+def _staffing(branches):
+    staffing = {field: np.asarray(branches[field], dtype=float) for field in BRANCH_FIELDS if field not in FLAG_FIELDS}
+    staffing.update({field: np.asarray(branches[field], dtype=bool) for field in FLAG_FIELDS})
+    return staffing
+
+
+def portfolio_mix(branches, programmes):
+    """Percentage of the portfolio's yearly capacity in each programme."""
+    staffing = _staffing(branches)
+    capacity = clients_per_branch_per_year(staffing["coaches_per_cohort"], staffing["clients_per_coach"])
+    shares = np.array([branches[share_column(programme)] for programme in programmes], dtype=float).reshape(len(programmes), -1)
+    total = shares.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalised = np.where(total > 0, shares / np.where(total > 0, total, 1.0), 1.0 / len(programmes))
+        clients = (normalised * capacity).sum(axis=1)
+        percentages = 100 * clients / clients.sum() if clients.sum() > 0 else np.zeros(len(programmes))
+    return {programme: float(percentage) for programme, percentage in zip(programmes, percentages)}
+
+
+def portfolio_outcomes(branches, programmes, sessions_per_participant, wellbys_per_client, retained_per_client, fixed_costs,
+                       cost_per_session_override=None):
+    """
+    Overall tab results of a branch table (as from branch_lists()).
+
+    Programme arrays are (P,). Returns the keys of overall_outcomes() for the whole
+    portfolio, plus "Branches": each branch's "Cost per Session", "Monthly Cost" and
+    "Yearly Capacity" (B,), and its "Clients Seen", "Marginal Programme Cost",
+    "WELLBYs Generated" and "Clients Retained" by programme (P, B).
+    """
+    staffing = _staffing(branches)
+    num_branches = len(staffing["coaches_per_cohort"])
+    costs = calculate_branch_costs(**staffing)
+    if cost_per_session_override is None:
+        cost_per_session = np.asarray(costs["cost_per_session"], dtype=float)
+    else:
+        cost_per_session = np.full(num_branches, float(cost_per_session_override))
+    capacity = clients_per_branch_per_year(staffing["coaches_per_cohort"], staffing["clients_per_coach"])
+    shares = np.array([branches[share_column(programme)] for programme in programmes], dtype=float).reshape(len(programmes), num_branches)
+
+    # One column per branch, each with its own capacity and cost per session
+    by_branch = overall_outcomes(
+        np.asarray(sessions_per_participant, dtype=float)[:, None] * cost_per_session[None, :],
+        np.asarray(wellbys_per_client, dtype=float)[:, None],
+        np.asarray(retained_per_client, dtype=float)[:, None],
+        shares, num_branches=1, fixed_costs=0.0, branch_clients_per_year=capacity
+    )
+    clients_seen = by_branch["Clients Seen"].sum(axis=1)
+    marginal_cost = by_branch["Marginal Programme Cost"].sum(axis=1)
+    wellbys = by_branch["WELLBYs Generated"].sum(axis=1)
+    total_clients = clients_seen.sum()
+    allocated_fixed_costs = clients_seen * fixed_costs / total_clients if total_clients > 0 else np.zeros(len(programmes))
+    total_marginal_cost = marginal_cost.sum()
+    total_wellbys = wellbys.sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "Clients Seen": clients_seen,
+            "Marginal Programme Cost": marginal_cost,
+            "WELLBYs Generated": wellbys,
+            "Clients Retained": by_branch["Clients Retained"].sum(axis=1),
+            "Allocated Fixed Costs": allocated_fixed_costs,
+            "Total Cost per WELLBY": (marginal_cost + allocated_fixed_costs) / wellbys,
+            "Total Marginal Cost": total_marginal_cost,
+            "Total WELLBYs": total_wellbys,
+            "Marginal Cost per WELLBY": total_marginal_cost / total_wellbys if total_wellbys > 0 else np.nan,
+            "Overall Total Cost per WELLBY": (total_marginal_cost + fixed_costs) / total_wellbys if total_wellbys > 0 else np.nan,
+            "Branches": {
+                "Cost per Session": cost_per_session,
+                "Monthly Cost": np.broadcast_to(np.asarray(costs["total_monthly_costs"], dtype=float), (num_branches,)),
+                "Yearly Capacity": capacity,
+                "Clients Seen": by_branch["Clients Seen"],
+                "Marginal Programme Cost": by_branch["Marginal Programme Cost"],
+                "WELLBYs Generated": by_branch["WELLBYs Generated"],
+                "Clients Retained": by_branch["Clients Retained"],
+            },
+        }
+
+
+def branch_results_table(branches, outcomes, fixed_costs):
+    """One row per branch of `outcomes` (from portfolio_outcomes), with its share of the fixed costs."""
+    results = outcomes["Branches"]
+    clients_seen = results["Clients Seen"].sum(axis=0)
+    total_clients = clients_seen.sum()
+    table = pd.DataFrame({
+        "Branch": branches["branch"],
+        "Country": branches["country"],
+        "Cost per Session": results["Cost per Session"],
+        "Yearly Capacity": results["Yearly Capacity"],
+        "Clients Seen": clients_seen,
+        "Marginal Cost": results["Marginal Programme Cost"].sum(axis=0),
+        "Allocated Fixed Costs": clients_seen * fixed_costs / total_clients if total_clients > 0 else 0.0,
+        "WELLBYs Generated": results["WELLBYs Generated"].sum(axis=0),
+    })
+    return _with_cost_per_wellby(table)
+
+
+def _with_cost_per_wellby(table):
+    wellbys = table["WELLBYs Generated"].where(table["WELLBYs Generated"] > 0)
+    table["Marginal Cost per WELLBY"] = table["Marginal Cost"] / wellbys
+    table["Total Cost per WELLBY"] = (table["Marginal Cost"] + table["Allocated Fixed Costs"]) / wellbys
+    return table
+
+
+def rollup(branch_results, by="Country"):
+    """Branch results summed by `by`, with cost per WELLBY recomputed from the sums."""
+    sums = branch_results.groupby(by, sort=True).agg(
+        Branches=("Branch", "size"),
+        **{column: (column, "sum") for column in ["Yearly Capacity", "Clients Seen", "Marginal Cost", "Allocated Fixed Costs", "WELLBYs Generated"]}
+    )
+    return _with_cost_per_wellby(sums)
@@ -0,0 +1,140 @@
+"""
+Load and validate the programme portfolio from programmes.json.
+
+Each programme is one entry of the "programmes" list, in the order the app shows them:
+
+- name: Unique programme name, used as its tab title and key everywhere
+- retention: Retention rate (%)
+- num_participants, sessions_per_participant: Programme size and sessions per client
+- default_effect_duration: Months
+- baseline_wellbeing_score, peak_wellbeing_score: 0-10 scale wellbeing before the
+  intervention and at peak effectiveness
+- default_decay_rate: Annual decay (%), for Exponential Decay
+- default_months_to_zero: Months, for Linear Decay
+- default_decay_model: "Exponential Decay", "Linear Decay" or "Custom Curve"
+- default_harm_proportion: Percent of the harm borne by the affected person
+- default_client_share, client_share_range: Overall tab distribution slider value (%)
+  and its plausible (low, high) range
+- input_ranges: Plausible (low, high) range of each sampled input, with rates and
+  proportions as fractions (0-1), for the sensitivity and uncertainty analyses
+
+Adding a programme or a variant of one only takes a new entry in the file.
+"""
+import json
+
+DECAY_MODELS = ["Exponential Decay", "Linear Decay", "Custom Curve"]
+SAMPLED_INPUTS = [
+    "retention_rate",
+    "baseline_wellbeing",
+    "peak_wellbeing",
+    "annual_decay_rate",
+    "harm_proportion",
+    "sessions_per_participant",
+]
+
+# Numeric fields and their allowed (low, high) values
+NUMERIC_FIELDS = {
+    "retention": (0, 100),
+    "num_participants": (1, None),
+    "sessions_per_participant": (0, None),
+    "default_effect_duration": (0, None),
+    "baseline_wellbeing_score": (0, 10),
+    "peak_wellbeing_score": (0, 10),
+    "default_decay_rate": (0.1, 99.9),
+    "default_months_to_zero": (1, 60),
+    "default_harm_proportion": (1, 100),
+    "default_client_share": (0, 100),
+}
+# Sampled fractions and whether 0 and 1 are excluded from their ranges: a decay rate of 1
+# leaves no WELLBYs, a retention rate of 0 divides by zero in the gradients, and every
+# cost per WELLBY divides by the harm proportion
+FRACTION_INPUT_ENDS = {
+    "retention_rate": (True, True),
+    "annual_decay_rate": (True, True),
+    "harm_proportion": (True, False),
+}
+
+
+class ProgrammeConfigError(ValueError):
+    """The programme file is malformed; the message lists every problem found."""
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _range_errors(prefix, value, bounds=(None, None), open_ends=(False, False)):
+    """Problems with a [low, high] pair; `open_ends` excludes the lower and/or upper bound itself."""
+    if not (isinstance(value, list) and len(value) == 2 and all(_is_number(v) for v in value)):
+        return [f"{prefix} must be a [low, high] pair of numbers"]
+    low, high = value
+    errors = []
+    if low > high:
+        errors.append(f"{prefix} has low {low} above high {high}")
+    too_low = bounds[0] is not None and (low <= bounds[0] if open_ends[0] else low < bounds[0])
+    too_high = bounds[1] is not None and (high >= bounds[1] if open_ends[1] else high > bounds[1])
+    if too_low or too_high:
+        interval = f"{'(' if open_ends[0] else '['}{bounds[0]}, {bounds[1]}{')' if open_ends[1] else ']'}"
+        errors.append(f"{prefix} must lie within {interval}")
+    return errors
+
+
+def validate_programme(programme):
+    """Problems with one programme entry, as a list of messages."""
+    name = programme.get("name")
+    prefix = f"Programme {name!r}" if name else "Programme"
+    errors = []
+    if not isinstance(name, str) or not name.strip():
+        errors.append(f"{prefix}: 'name' must be a non-empty string")
+    for field, (low, high) in NUMERIC_FIELDS.items():
+        value = programme.get(field)
+        if not _is_number(value):
+            errors.append(f"{prefix}: '{field}' must be a number")
+        elif (low is not None and value < low) or (high is not None and value > high):
+            errors.append(f"{prefix}: '{field}' is {value}, outside [{low}, {high}]")
+    if programme.get("default_decay_model") not in DECAY_MODELS:
+        errors.append(f"{prefix}: 'default_decay_model' must be one of {DECAY_MODELS}")
+    errors += _range_errors(f"{prefix}: 'client_share_range'", programme.get("client_share_range"), (0, 100))
+
+    input_ranges = programme.get("input_ranges")
+    if not isinstance(input_ranges, dict):
+        errors.append(f"{prefix}: 'input_ranges' must map each of {SAMPLED_INPUTS} to a [low, high] pair")
+        return errors
+    for input_name in SAMPLED_INPUTS:
+        if input_name not in input_ranges:
+            errors.append(f"{prefix}: 'input_ranges' is missing '{input_name}'")
+    for input_name, value in input_ranges.items():
+        if input_name not in SAMPLED_INPUTS:
+            errors.append(f"{prefix}: unknown input '{input_name}' in 'input_ranges'")
+        elif input_name in FRACTION_INPUT_ENDS:
+            errors += _range_errors(f"{prefix}: 'input_ranges.{input_name}'", value, (0, 1), FRACTION_INPUT_ENDS[input_name])
+        else:
+            errors += _range_errors(f"{prefix}: 'input_ranges.{input_name}'", value, (0, None))
+    return errors
+
+
+def load_programmes(path):
+    """
+    Read and validate the programme file.
+
+    Returns a list of programme dicts in file order. Raises ProgrammeConfigError
+    listing every problem if any entry is invalid.
+    """
+    with open(path) as programmes_file:
+        programmes = json.load(programmes_file).get("programmes")
+    if not isinstance(programmes, list) or not programmes:
+        raise ProgrammeConfigError(f"{path}: expected a non-empty 'programmes' list")
+
+    errors = []
+    seen_names = set()
+    for programme in programmes:
+        if not isinstance(programme, dict):
+            errors.append("Every programme must be an object")
+            continue
+        errors += validate_programme(programme)
+        if programme.get("name") in seen_names:
+            errors.append(f"Programme {programme['name']!r} appears more than once")
+        seen_names.add(programme.get("name"))
+    if errors:
+        raise ProgrammeConfigError(f"{path} is invalid:\n- " + "\n- ".join(errors))
+    return programmes
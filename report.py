@@ -0,0 +1,403 @@
+"""
+Funder reports of a scenario, as a self-contained HTML page or a PDF.
+
+A report shows one scenario - the model graph's input values, as saved on the
+Scenarios tab: the cost per session, each programme's inputs, outcomes and decay curve,
+and the Overall tab's scaled results including fixed costs (and by country for a branch
+table). Charts are drawn with matplotlib's object-oriented API, which doesn't touch
+pyplot's global state and so is safe in worker threads; HTML pages embed them as SVG
+and PDFs are multi-page matplotlib documents.
+
+Finished reports are saved in REPORTS_DIR under a hash of the scenario, the format and
+REPORT_VERSION, so a report that has been rendered once downloads instantly, also after
+a restart. Bump REPORT_VERSION when the layout changes so stale files are never served.
+
+Usage:
+    python report.py scenarios.json [--format html] [--output reports/] [--workers 4]
+"""
+import argparse
+import datetime
+import hashlib
+import html
+import io
+import os
+import textwrap
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+from config import REPORTS_DIR, REPORT_CACHE_FILES
+from graph import build_model_graph
+from model import WEEKS_PER_YEAR
+from portfolio import branch_results_table, rollup
+from scenarios import scenario_key, scenario_programmes, scenarios_from_json
+
+REPORT_VERSION = 1
+REPORT_FORMATS = {"html": "text/html", "pdf": "application/pdf"}
+
+PROGRAMME_FORMATS = {
+    "Decay model": "{}",
+    "Retention rate": "{:.0%}",
+    "Wellbeing gain": "{:.2f}",
+    "Harm on the individual": "{:.0%}",
+    "Sessions per participant": "{:.1f}",
+    "Total cost": "${:,.0f}",
+    "Net WELLBYs": "{:,.1f}",
+    "Net WELLBYs per retained client": "{:.3f}",
+    "Cost per WELLBY": "${:,.2f}",
+}
+OVERALL_FORMATS = {
+    "Clients Seen": "{:,.0f}",
+    "Clients Retained": "{:,.0f}",
+    "WELLBYs Generated": "{:,.1f}",
+    "Marginal Programme Cost": "${:,.0f}",
+    "Allocated Fixed Costs": "${:,.0f}",
+    "Total Cost": "${:,.0f}",
+    "Marginal Cost per WELLBY": "${:,.2f}",
+    "Total Cost per WELLBY": "${:,.2f}",
+}
+COUNTRY_FORMATS = {
+    "Branches": "{:,.0f}",
+    "Clients Seen": "{:,.0f}",
+    "Marginal Cost": "${:,.0f}",
+    "Allocated Fixed Costs": "${:,.0f}",
+    "WELLBYs Generated": "{:,.1f}",
+    "Total Cost per WELLBY": "${:,.2f}",
+}
+
+
+def report_key(name, inputs, report_format):
+    # The name is the report's title, so it is part of the key along with the inputs
+    text = f"{name}/{scenario_key(inputs)}/{report_format}/{REPORT_VERSION}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+
+def report_path(name, inputs, report_format, reports_dir=REPORTS_DIR):
+    return os.path.join(reports_dir, f"{report_key(name, inputs, report_format)}.{report_format}")
+
+
+# --- Report contents ---
+
+def decay_curve(inputs):
+    """Relative benefit remaining each week of the timeframe, under the programme's decay model."""
+    weeks = np.arange(int(round(inputs["timeframe_weeks"])) + 1)
+    if inputs["decay_model"] == "Exponential Decay":
+        return weeks, (1.0 - inputs["annual_decay_rate"]) ** (weeks / WEEKS_PER_YEAR)
+    if inputs["decay_model"] == "Linear Decay":
+        if not inputs["months_to_zero"]:
+            return weeks, np.zeros(len(weeks))
+        weeks_to_zero = inputs["months_to_zero"] / 12 * WEEKS_PER_YEAR
+        return weeks, np.clip(1.0 - weeks / weeks_to_zero, 0.0, 1.0)
+    points = np.asarray(inputs.get("weekly_points") or [], dtype=float)
+    return np.arange(len(points)), points
+
+
+def _total_row(table, label):
+    totals = table[["Clients Seen", "Clients Retained", "WELLBYs Generated", "Marginal Programme Cost", "Allocated Fixed Costs", "Total Cost"]].sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        totals["Marginal Cost per WELLBY"] = totals["Marginal Programme Cost"] / totals["WELLBYs Generated"]
+        totals["Total Cost per WELLBY"] = totals["Total Cost"] / totals["WELLBYs Generated"]
+    return pd.concat([table, totals.to_frame(label).T])
+
+
+def report_data(name, inputs):
+    """Everything a report shows, evaluated on a fresh model graph."""
+    programmes = scenario_programmes(inputs)
+    graph = build_model_graph(programmes)
+    for input_name, value in inputs.items():
+        graph.set(input_name, value)
+    overall_inputs = inputs["overall_inputs"]
+    outcomes = graph.get("overall")
+
+    programme_rows = {}
+    for programme in programmes:
+        programme_inputs = inputs[f"programme_inputs/{programme}"]
+        results = graph.get(f"programme/{programme}")
+        programme_rows[programme] = {
+            "Decay model": programme_inputs["decay_model"],
+            "Retention rate": programme_inputs["retention_rate"],
+            "Wellbeing gain": programme_inputs["peak_wellbeing"] - programme_inputs["baseline_wellbeing"],
+            "Harm on the individual": programme_inputs["harm_proportion"],
+            "Sessions per participant": programme_inputs["sessions_per_participant"],
+            "Total cost": results["Total Cost (Money Spent)"],
+            "Net WELLBYs": results["Net WELLBYs Generated"],
+            "Net WELLBYs per retained client": results["Net WELLBYs per Retained Client"],
+            "Cost per WELLBY": results["Cost per WELLBY"],
+        }
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        overall = pd.DataFrame({
+            "Clients Seen": outcomes["Clients Seen"],
+            "Clients Retained": outcomes["Clients Retained"],
+            "WELLBYs Generated": outcomes["WELLBYs Generated"],
+            "Marginal Programme Cost": outcomes["Marginal Programme Cost"],
+            "Allocated Fixed Costs": outcomes["Allocated Fixed Costs"],
+            "Total Cost": outcomes["Marginal Programme Cost"] + outcomes["Allocated Fixed Costs"],
+            "Marginal Cost per WELLBY": outcomes["Marginal Programme Cost"] / outcomes["WELLBYs Generated"],
+            "Total Cost per WELLBY": outcomes["Total Cost per WELLBY"],
+        }, index=programmes)
+
+    branches = overall_inputs.get("branches")
+    by_country = None
+    if branches is not None:
+        by_country = rollup(branch_results_table(branches, outcomes, overall_inputs["fixed_costs"]))[list(COUNTRY_FORMATS)]
+
+    return {
+        "name": name,
+        "generated": datetime.date.today().isoformat(),
+        "cost_per_session": graph.get("cost_per_session"),
+        "cost_per_session_overridden": inputs["cost_per_session_override"] is not None,
+        "num_branches": overall_inputs["num_branches"],
+        "fixed_costs": overall_inputs["fixed_costs"],
+        "overall_cost_per_wellby": float(outcomes["Overall Total Cost per WELLBY"]),
+        "programmes": pd.DataFrame.from_dict(programme_rows, orient="index"),
+        "overall": _total_row(overall, "Total/Overall Average"),
+        "by_country": by_country,
+        "decay_curves": {programme: decay_curve(inputs[f"programme_inputs/{programme}"]) for programme in programmes},
+    }
+
+
+def _formatted(table, formats):
+    """The table's values as display strings, with N/A for missing values."""
+    formatted = pd.DataFrame(index=table.index)
+    for column, fmt in formats.items():
+        formatted[column] = [
+            "N/A" if isinstance(value, (float, np.floating)) and not np.isfinite(value) else fmt.format(value)
+            for value in table[column]
+        ]
+    return formatted
+
+
+def _summary_lines(data):
+    source = "set on the Model Parameters tab" if data["cost_per_session_overridden"] else "from the Marginal Costs tab's staffing"
+    return [
+        f"Overall cost per WELLBY, including fixed costs: ${data['overall_cost_per_wellby']:,.2f}",
+        f"Cost per session: ${data['cost_per_session']:,.2f} ({source})",
+        f"Branches: {data['num_branches']:,}" + (" (from a branch table)" if data["by_country"] is not None else ""),
+        f"Organisational fixed costs: ${data['fixed_costs']:,.0f}",
+    ]
+
+
+def _decay_figure(data, size=(7.5, 3.2)):
+    figure = Figure(figsize=size)
+    axes = figure.subplots()
+    for programme, (weeks, benefit) in data["decay_curves"].items():
+        axes.plot(weeks / WEEKS_PER_YEAR * 12, benefit, label=programme)
+    axes.set(xlabel="Months after the programme", ylabel="Relative benefit", ylim=(0, 1.05), title="Benefit decay")
+    axes.legend(frameon=False)
+    figure.tight_layout()
+    return figure
+
+
+def _cost_figure(data, size=(7.5, 3.2)):
+    figure = Figure(figsize=size)
+    axes = figure.subplots()
+    overall = data["overall"]
+    positions = np.arange(len(overall))
+    axes.bar(positions - 0.2, overall["Marginal Cost per WELLBY"], width=0.4, label="Marginal")
+    axes.bar(positions + 0.2, overall["Total Cost per WELLBY"], width=0.4, label="Including fixed costs")
+    axes.set_xticks(positions, [label.replace("Total/Overall Average", "Overall") for label in overall.index])
+    axes.set(ylabel="$ per WELLBY", title="Cost per WELLBY")
+    axes.legend(frameon=False)
+    figure.tight_layout()
+    return figure
+
+
+def _svg(figure):
+    buffer = io.StringIO()
+    figure.savefig(buffer, format="svg")
+    svg = buffer.getvalue()
+    return svg[svg.index("<svg"):]
+
+
+_HTML_STYLE = """
+body { font-family: Helvetica, Arial, sans-serif; max-width: 1000px; margin: 2em auto; color: #222; }
+h1 { margin-bottom: 0; } .generated { color: #777; margin-top: 0.2em; }
+table { border-collapse: collapse; margin: 1em 0; font-size: 0.9em; }
+th, td { border-bottom: 1px solid #ddd; padding: 0.35em 0.7em; text-align: right; }
+th:first-child, td:first-child { text-align: left; }
+tr:last-child td { font-weight: bold; } .programmes tr:last-child td { font-weight: normal; }
+svg { max-width: 100%; height: auto; }
+"""
+
+
+def render_html(data):
+    def table(frame, formats, css_class=""):
+        return _formatted(frame, formats).to_html(classes=css_class, border=0, escape=True)
+
+    sections = [
+        f"<h1>Cost-effectiveness report: {html.escape(data['name'])}</h1>",
+        f"<p class='generated'>Generated {data['generated']}</p>",
+        "<ul>" + "".join(f"<li>{html.escape(line)}</li>" for line in _summary_lines(data)) + "</ul>",
+        "<h2>Programmes</h2>",
+        table(data["programmes"], PROGRAMME_FORMATS, "programmes"),
+        _svg(_decay_figure(data)),
+        "<h2>Scaled results, including fixed costs</h2>",
+        "<p>Fixed costs are allocated to programmes in proportion to clients seen.</p>",
+        table(data["overall"], OVERALL_FORMATS),
+        _svg(_cost_figure(data)),
+    ]
+    if data["by_country"] is not None:
+        sections += ["<h2>By country</h2>", table(data["by_country"], COUNTRY_FORMATS)]
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>{html.escape(data['name'])}</title><style>{_HTML_STYLE}</style></head><body>"
+        + "\n".join(sections) + "</body></html>"
+    ).encode("utf-8")
+
+
+def _table_page(title, lines, tables, size=(11.69, 8.27)):
+    """A landscape A4 page with a title, lines of text and (heading, formatted table) pairs."""
+    figure = Figure(figsize=size)
+    figure.text(0.05, 0.94, title, fontsize=16, weight="bold")
+    top = 0.9
+    for line in lines:
+        figure.text(0.05, top, line, fontsize=10)
+        top -= 0.035
+    for heading, frame in tables:
+        figure.text(0.05, top - 0.02, heading, fontsize=12, weight="bold")
+        height = min(0.04 * (len(frame) + 1), top - 0.1)
+        axes = figure.add_axes([0.05, top - 0.04 - height, 0.9, height])
+        axes.axis("off")
+        frame = frame.reset_index(names="")
+        headers = [textwrap.fill(str(column), 16) for column in frame.columns]
+        cells = axes.table(cellText=frame.values, colLabels=headers, loc="upper center", cellLoc="right")
+        cells.auto_set_font_size(False)
+        cells.set_fontsize(8)
+        cells.auto_set_column_width(range(len(headers)))
+        for (row, column), cell in cells.get_celld().items():
+            if row == 0:
+                cell.set_height(cell.get_height() * 2)
+            if column == 0:
+                cell.set_text_props(ha="left")
+        top -= height + 0.15
+    return figure
+
+
+def render_pdf(data):
+    buffer = io.BytesIO()
+    with PdfPages(buffer) as pdf:
+        pdf.savefig(_table_page(
+            f"Cost-effectiveness report: {data['name']}", [f"Generated {data['generated']}"] + _summary_lines(data),
+            [("Programmes", _formatted(data["programmes"], PROGRAMME_FORMATS))]
+        ))
+        overall_tables = [("Scaled results, including fixed costs", _formatted(data["overall"], OVERALL_FORMATS))]
+        if data["by_country"] is not None:
+            overall_tables.append(("By country", _formatted(data["by_country"], COUNTRY_FORMATS).head(15)))
+        pdf.savefig(_table_page("Overall", ["Fixed costs are allocated to programmes in proportion to clients seen."], overall_tables))
+        pdf.savefig(_decay_figure(data, size=(11.69, 4.1)))
+        pdf.savefig(_cost_figure(data, size=(11.69, 4.1)))
+    return buffer.getvalue()
+
+
+RENDERERS = {"html": render_html, "pdf": render_pdf}
+
+
+# --- Cache ---
+
+def is_cached(name, inputs, report_format, reports_dir=REPORTS_DIR):
+    return os.path.exists(report_path(name, inputs, report_format, reports_dir))
+
+
+def cached_report(name, inputs, report_format, reports_dir=REPORTS_DIR):
+    """The finished report of this scenario, or None if it hasn't been rendered."""
+    try:
+        with open(report_path(name, inputs, report_format, reports_dir), "rb") as report_file:
+            return report_file.read()
+    except FileNotFoundError:
+        return None
+
+
+def _prune(reports_dir, keep):
+    paths = [os.path.join(reports_dir, name) for name in os.listdir(reports_dir) if name.split(".")[-1] in REPORT_FORMATS]
+    for path in sorted(paths, key=os.path.getmtime)[:max(0, len(paths) - keep)]:
+        os.remove(path)
+
+
+def get_report(name, inputs, report_format, reports_dir=REPORTS_DIR):
+    """The report of this scenario, rendered and saved unless it already has been."""
+    report = cached_report(name, inputs, report_format, reports_dir)
+    if report is not None:
+        return report
+    report = RENDERERS[report_format](report_data(name, inputs))
+    os.makedirs(reports_dir, exist_ok=True)
+    path = report_path(name, inputs, report_format, reports_dir)
+    temporary_path = f"{path}.{os.getpid()}.{id(report)}.tmp"
+    with open(temporary_path, "wb") as report_file:
+        report_file.write(report)
+    os.replace(temporary_path, path)
+    _prune(reports_dir, REPORT_CACHE_FILES)
+    return report
+
+
+def report_file_name(name, report_format, taken=()):
+    """A safe file name for the report of scenario `name`, not in `taken` (lower-cased file names)."""
+    stem = "".join(character if character.isalnum() or character in "-_" else "_" for character in name).strip("_") or "scenario"
+    if f"{stem}.{report_format}".lower() in taken:
+        # e.g. "A/B" and "A_B"; scenario names are unique, so their hash tells the files apart
+        stem = f"{stem}_{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+    return f"{stem}.{report_format}"
+
+
+def render_reports(scenarios, report_format, reports_dir=REPORTS_DIR, report=None):
+    """
+    Reports of every named scenario, as {file name: bytes}. Scenarios already rendered
+    are read from the cache. `report` is an optional progress callback, e.g. Job.report.
+    """
+    files = {}
+    for index, (name, inputs) in enumerate(scenarios.items()):
+        file_name = report_file_name(name, report_format, taken={taken.lower() for taken in files})
+        files[file_name] = get_report(name, inputs, report_format, reports_dir)
+        if report is not None:
+            report((index + 1) / len(scenarios), f"Rendered {index + 1} of {len(scenarios)} reports")
+    return files
+
+
+def zip_reports(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for file_name, content in files.items():
+            archive.writestr(file_name, content)
+    return buffer.getvalue()
+
+
+def _render_one(name, inputs, report_format, reports_dir):
+    get_report(name, inputs, report_format, reports_dir)
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render funder reports for scenarios saved from the Scenarios tab.")
+    parser.add_argument("path", help="Scenarios JSON downloaded from the Scenarios tab")
+    parser.add_argument("--format", default="html", choices=list(REPORT_FORMATS))
+    parser.add_argument("--output", default=None, help="Also copy the reports to this directory")
+    parser.add_argument("--reports-dir", default=REPORTS_DIR, help="Cache of rendered reports")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    args = parser.parse_args()
+
+    with open(args.path) as scenarios_file:
+        scenarios = scenarios_from_json(scenarios_file.read())
+    missing = {name: inputs for name, inputs in scenarios.items() if not is_cached(name, inputs, args.format, args.reports_dir)}
+    print(f"{len(scenarios) - len(missing)} of {len(scenarios)} reports already rendered")
+    if missing:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(missing)))) as pool:
+            for done, name in enumerate(pool.map(
+                _render_one, list(missing), list(missing.values()),
+                [args.format] * len(missing), [args.reports_dir] * len(missing)
+            ), start=1):
+                print(f"\r{done} of {len(missing)} rendered", end="", flush=True)
+        print()
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        for file_name, content in render_reports(scenarios, args.format, args.reports_dir).items():
+            with open(os.path.join(args.output, file_name), "wb") as report_file:
+                report_file.write(content)
+        print(f"Wrote {len(scenarios)} reports to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
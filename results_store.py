@@ -0,0 +1,267 @@
+"""
+Append-only columnar log of every scenario the app evaluates.
+
+Each rerun with new inputs adds one row per programme and one per row of the Overall
+tab's Total Cost Analysis table. Rows are buffered server-wide and flushed in batches
+as Parquet files (one row group each) under RESULTS_LOG_DIR/date=YYYY-MM-DD/. Files
+are never rewritten, so concurrent readers always see complete data. Logging is off
+unless the app is started with RESULTS_LOG_ENABLED=1 (and optionally RESULTS_LOG_DIR)
+in the environment.
+
+Queries go through pyarrow.dataset over memory-mapped files: only the requested
+columns and the date partitions in range are read, and summaries are computed with
+pyarrow.compute, so nothing is loaded into pandas.
+
+Usage:
+    python results_store.py --programme Insomnia --column cost_per_wellby --days 7
+"""
+import argparse
+import atexit
+import datetime
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs
+import pyarrow.parquet as pq
+import streamlit as st
+
+from config import RESULTS_LOG_DIR, RESULTS_LOG_BATCH_ROWS, RESULTS_LOG_FLUSH_SECONDS
+from scenarios import scenario_key
+
+RESULTS_SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("session_id", pa.string()),
+    ("scenario_hash", pa.string()),
+    ("record_type", pa.dictionary(pa.int8(), pa.string())),  # "programme" or "overall"
+    ("programme", pa.dictionary(pa.int16(), pa.string())),
+    # Programme inputs
+    ("decay_model", pa.dictionary(pa.int8(), pa.string())),
+    ("annual_decay_rate", pa.float64()),
+    ("months_to_zero", pa.float64()),
+    ("baseline_wellbeing", pa.float64()),
+    ("peak_wellbeing", pa.float64()),
+    ("retention_rate", pa.float64()),
+    ("harm_proportion", pa.float64()),
+    ("cost_per_session", pa.float64()),
+    ("sessions_per_participant", pa.float64()),
+    ("num_participants", pa.float64()),
+    # Overall inputs
+    ("num_branches", pa.float64()),
+    ("client_share_pct", pa.float64()),
+    ("fixed_costs", pa.float64()),
+    # Outputs
+    ("total_cost", pa.float64()),
+    ("net_wellbys", pa.float64()),
+    ("cost_per_wellby", pa.float64()),
+    ("clients_seen", pa.float64()),
+    ("clients_retained", pa.float64()),
+    ("allocated_fixed_costs", pa.float64()),
+    ("total_cost_per_wellby", pa.float64()),
+])
+
+# Programme-result and Overall-table names for the output columns
+PROGRAMME_OUTPUT_COLUMNS = {
+    "Total Cost (Money Spent)": "total_cost",
+    "Net WELLBYs Generated": "net_wellbys",
+    "Cost per WELLBY": "cost_per_wellby",
+    "Total Clients Seen": "clients_seen",
+    "Clients Retained": "clients_retained",
+}
+OVERALL_OUTPUT_COLUMNS = {
+    "Marginal Programme Cost": "total_cost",
+    "WELLBYs Generated": "net_wellbys",
+    "Clients Seen": "clients_seen",
+    "Clients Retained": "clients_retained",
+    "Allocated Fixed Costs": "allocated_fixed_costs",
+    "Total Cost per WELLBY": "total_cost_per_wellby",
+}
+
+
+class ResultsLog:
+    """Thread-safe buffer that flushes scenario rows to Parquet in batches."""
+
+    def __init__(self, log_dir, batch_rows, flush_seconds):
+        self.log_dir = log_dir
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def append(self, rows):
+        with self._lock:
+            self._rows.extend(rows)
+            due = len(self._rows) >= self.batch_rows or time.monotonic() - self._last_flush >= self.flush_seconds
+            if not due and self._timer is None:
+                # Flush buffered rows after flush_seconds even if no more arrive
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not rows:
+            return
+        rows_by_date = {}
+        for row in rows:
+            rows_by_date.setdefault(row["timestamp"].strftime("%Y-%m-%d"), []).append(row)
+        for date, date_rows in rows_by_date.items():
+            columns = {field.name: [row.get(field.name) for row in date_rows] for field in RESULTS_SCHEMA}
+            table = pa.Table.from_pydict(columns, schema=RESULTS_SCHEMA)
+            # One file per flush keeps the log append-only; partitioning by day lets
+            # time-bounded queries skip old files entirely
+            partition_dir = os.path.join(self.log_dir, f"date={date}")
+            os.makedirs(partition_dir, exist_ok=True)
+            file_name = f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet"
+            # Written under a hidden name first so readers never see a half-written file
+            temporary_path = os.path.join(partition_dir, "." + file_name)
+            pq.write_table(table, temporary_path, row_group_size=len(date_rows), compression="zstd")
+            os.replace(temporary_path, os.path.join(partition_dir, file_name))
+
+
+@st.cache_resource
+def get_results_log():
+    results_log = ResultsLog(RESULTS_LOG_DIR, RESULTS_LOG_BATCH_ROWS, RESULTS_LOG_FLUSH_SECONDS)
+    atexit.register(results_log.flush)
+    return results_log
+
+
+def _finite_or_none(value):
+    value = None if value is None else float(value)
+    return value if value is not None and np.isfinite(value) else None
+
+
+def scenario_rows(offering_results, overall_results, inputs, session_id=None):
+    """
+    Flatten one rerun's programme and Overall results into log rows. `inputs` are the
+    model graph's input values, which identify the scenario.
+    """
+    timestamp = datetime.datetime.now(datetime.timezone.utc)
+    scenario_hash = scenario_key(inputs)
+    common = {"timestamp": timestamp, "session_id": session_id, "scenario_hash": scenario_hash}
+
+    rows = []
+    for programme, results in offering_results.items():
+        row = dict(common, record_type="programme", programme=programme)
+        for key, value in results.get("Inputs", {}).items():
+            row[key] = value if key == "decay_model" else _finite_or_none(value)
+        for key, column in PROGRAMME_OUTPUT_COLUMNS.items():
+            row[column] = _finite_or_none(results.get(key))
+        rows.append(row)
+
+    if overall_results is not None and overall_results.get("Total Cost Analysis") is not None:
+        shares = overall_results["Client Distribution (%)"]
+        total_share = sum(shares.values())
+        for programme, table_row in overall_results["Total Cost Analysis"].iterrows():
+            row = dict(
+                common,
+                record_type="overall",
+                programme=programme,
+                num_branches=float(overall_results["Number of Branches"]),
+                client_share_pct=(100.0 * shares[programme] / total_share) if programme in shares and total_share > 0 else None,
+                fixed_costs=_finite_or_none(overall_results["Fixed Costs"]),
+            )
+            for key, column in OVERALL_OUTPUT_COLUMNS.items():
+                row[column] = _finite_or_none(table_row.get(key))
+            rows.append(row)
+    return rows
+
+
+def log_scenario(offering_results, overall_results, inputs):
+    """Record this session's scenario, unless it is the same one it logged last."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    context = get_script_run_ctx()
+    session_id = context.session_id if context is not None else None
+    rows = scenario_rows(offering_results, overall_results, inputs, session_id)
+    if st.session_state.get("_last_logged_scenario") == rows[0]["scenario_hash"]:
+        return
+    st.session_state["_last_logged_scenario"] = rows[0]["scenario_hash"]
+    get_results_log().append(rows)
+
+
+# --- Reading the log ---
+
+def open_results(log_dir=RESULTS_LOG_DIR):
+    """The whole log as a lazily-read, memory-mapped dataset (None if nothing is logged yet)."""
+    if not os.path.isdir(log_dir):
+        return None
+    filesystem = pyarrow.fs.LocalFileSystem(use_mmap=True)
+    partitioning = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+    return ds.dataset(log_dir, format="parquet", partitioning=partitioning, filesystem=filesystem)
+
+
+def results_filter(programme=None, record_type="programme", since=None):
+    """Dataset filter expression; `since` is a timezone-aware datetime."""
+    expression = ds.field("record_type") == record_type
+    if programme is not None:
+        expression = expression & (ds.field("programme") == programme)
+    if since is not None:
+        # The date partition prunes whole files before the timestamp check
+        expression = expression & (ds.field("date") >= since.strftime("%Y-%m-%d"))
+        expression = expression & (ds.field("timestamp") >= pa.scalar(since, type=pa.timestamp("ms", tz="UTC")))
+    return expression
+
+
+def query_column(column, programme=None, record_type="programme", since=None, log_dir=RESULTS_LOG_DIR):
+    """One column of the matching rows, as an Arrow array."""
+    dataset = open_results(log_dir)
+    if dataset is None:
+        return pa.array([], type=RESULTS_SCHEMA.field(column).type)
+    table = dataset.to_table(columns=[column], filter=results_filter(programme, record_type, since))
+    return table.column(column).combine_chunks()
+
+
+def describe_distribution(column, programme=None, record_type="programme", since=None, log_dir=RESULTS_LOG_DIR):
+    """Count, mean and percentiles of a logged column, e.g. cost per WELLBY for Insomnia this week."""
+    values = pc.drop_null(query_column(column, programme, record_type, since, log_dir))
+    summary = {"count": len(values)}
+    if len(values) == 0:
+        return summary
+    quantiles = pc.quantile(values, q=[0.05, 0.25, 0.5, 0.75, 0.95]).to_pylist()
+    summary.update({
+        "mean": pc.mean(values).as_py(),
+        "min": pc.min(values).as_py(),
+        "p5": quantiles[0],
+        "p25": quantiles[1],
+        "median": quantiles[2],
+        "p75": quantiles[3],
+        "p95": quantiles[4],
+        "max": pc.max(values).as_py(),
+        "scenarios": pc.count_distinct(
+            query_column("scenario_hash", programme, record_type, since, log_dir)
+        ).as_py(),
+    })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a column of the scenario results log.")
+    parser.add_argument("--column", default="cost_per_wellby", help="Logged column to summarise")
+    parser.add_argument("--programme", default=None, help="Only this programme")
+    parser.add_argument("--record-type", default="programme", choices=["programme", "overall"])
+    parser.add_argument("--days", type=float, default=7, help="Only scenarios from the last N days")
+    parser.add_argument("--log-dir", default=RESULTS_LOG_DIR)
+    args = parser.parse_args()
+
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=args.days)
+    summary = describe_distribution(args.column, args.programme, args.record_type, since, args.log_dir)
+    for key, value in summary.items():
+        print(f"{key:>10}: {value:,.4g}" if isinstance(value, float) else f"{key:>10}: {value:,}")
+
+
+if __name__ == "__main__":
+    main()
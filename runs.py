@@ -0,0 +1,326 @@
+"""
+Checkpointed, resumable long-running simulations.
+
+A run is described by a JSON-serialisable spec: the workload (one of WORKLOADS), its
+parameters, the number of samples, the chunk size and a seed. The samples are split
+into chunks of `chunk_size`, and chunk i draws only from the i-th stream spawned from
+SeedSequence(seed). So every chunk's output depends on the spec alone - not on how many
+workers there are, which order the chunks finish in, or whether the run was interrupted.
+
+Each finished chunk is saved to its own .npz file in the run's directory under RUNS_DIR,
+named by a hash of the spec. Files are written under a temporary name and renamed into
+place, so a process killed mid-write leaves either a complete checkpoint or none.
+Running the same spec again skips the chunks already on disk, and the outputs are
+always joined in chunk order, so a resumed run gives bit-identical results to one that
+was never interrupted.
+
+Usage:
+    python runs.py uncertainty --samples 10000000 [--workers 4] [--seed 0] [--output results.parquet]
+    python runs.py rollout --samples 1000000 [--years 5] ...
+    python runs.py uncertainty --samples 10000000 --status
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    RUNS_DIR,
+    RUN_CHUNK_SIZE,
+    DEFAULT_PROJECTION_YEARS,
+    DEFAULT_OPENING_BALANCE,
+    DEFAULT_COACHES_PER_COHORT,
+    DEFAULT_CLIENTS_PER_COACH,
+    DEFAULT_SESSIONS_PER_CLIENT,
+    DEFAULT_COUNSELLOR_SALARY,
+    DEFAULT_HEAD_OF_TRAINING_SALARY,
+    DEFAULT_VA_SALARY,
+    DEFAULT_BRANCH_MANAGER_SALARY,
+    DEFAULT_HIRING_MANAGER_SALARY,
+    DEFAULT_OTHER_SALARY,
+    programme_input_ranges
+)
+from model import calculate_branch_costs
+from projection import core_team_arrays, project_finances
+from uncertainty import overall_parameter_space, values_from_unit, evaluate_programme, evaluate_overall
+
+
+# --- Workloads: columns(params) and chunk(params, size, rng) -> (size, columns) array ---
+
+def _uncertainty_columns(params):
+    return [f"{programme} cost per WELLBY" for programme in params["programmes"]] + ["Overall cost per WELLBY"]
+
+
+def _uncertainty_chunk(params, size, rng):
+    """Cost per WELLBY of every programme and the Overall mix, with inputs drawn at random."""
+    space = params["space"]
+    values = values_from_unit(rng.random((size, len(space))), space)
+    outputs = [evaluate_programme(values, programme)["Cost per WELLBY"] for programme in params["programmes"]]
+    outputs.append(evaluate_overall(values, params["programmes"])["Overall Total Cost per WELLBY"])
+    return np.column_stack([np.broadcast_to(np.asarray(output, dtype=float), (size,)) for output in outputs])
+
+
+def _rollout_columns(params):
+    return ["salary_growth", "branches_added_per_year", "monthly_funding", "runway_months", "total_costs", "closing_balance"]
+
+
+def _rollout_chunk(params, size, rng):
+    """Multi-year financial projections with salary growth, expansion and funding drawn at random."""
+    salary_growth = rng.uniform(*params["salary_growth"], size)
+    branches_added = rng.integers(params["branches_added_per_year"][0], params["branches_added_per_year"][1] + 1, size)
+    monthly_funding = rng.uniform(*params["monthly_funding"], size)
+    annual_salaries, start_months = core_team_arrays(params["include_optional"])
+    projection = project_finances(
+        annual_salaries, start_months,
+        salary_growth=salary_growth,
+        initial_branches=params["initial_branches"],
+        branches_added_per_year=branches_added,
+        branch_monthly_cost=params["branch_monthly_cost"],
+        opening_balance=params["opening_balance"],
+        monthly_funding=monthly_funding,
+        months=params["years"] * 12
+    )
+    return np.column_stack([
+        salary_growth, branches_added, monthly_funding, projection["runway_months"],
+        projection["total_costs"].sum(axis=1), projection["cash_balance"][:, -1]
+    ])
+
+
+WORKLOADS = {
+    "uncertainty": (_uncertainty_columns, _uncertainty_chunk),
+    "rollout": (_rollout_columns, _rollout_chunk),
+}
+
+
+def uncertainty_params(use_trial_evidence=False):
+    """Parameters of an uncertainty run over the default parameter space."""
+    return {
+        "programmes": list(programme_input_ranges),
+        "space": overall_parameter_space(use_trial_evidence=use_trial_evidence),
+    }
+
+
+def rollout_params(
+    years=DEFAULT_PROJECTION_YEARS,
+    salary_growth=(0.0, 0.10),
+    branches_added_per_year=(0, 3),
+    monthly_funding=(5000, 30000),
+    initial_branches=3,
+    opening_balance=DEFAULT_OPENING_BALANCE,
+    branch_monthly_cost=None,
+    include_optional=True
+):
+    """Parameters of a rollout run. The branch cost defaults to that of the default staffing."""
+    if branch_monthly_cost is None:
+        branch_monthly_cost = float(calculate_branch_costs(
+            DEFAULT_COACHES_PER_COHORT, DEFAULT_CLIENTS_PER_COACH, DEFAULT_SESSIONS_PER_CLIENT,
+            DEFAULT_COUNSELLOR_SALARY, DEFAULT_HEAD_OF_TRAINING_SALARY, DEFAULT_VA_SALARY,
+            DEFAULT_BRANCH_MANAGER_SALARY, DEFAULT_HIRING_MANAGER_SALARY, DEFAULT_OTHER_SALARY
+        )["total_monthly_costs"])
+    return {
+        "years": int(years),
+        "salary_growth": [float(value) for value in salary_growth],
+        "branches_added_per_year": [int(value) for value in branches_added_per_year],
+        "monthly_funding": [float(value) for value in monthly_funding],
+        "initial_branches": int(initial_branches),
+        "opening_balance": float(opening_balance),
+        "branch_monthly_cost": float(branch_monthly_cost),
+        "include_optional": bool(include_optional),
+    }
+
+
+# --- Runs ---
+
+def make_spec(workload, params, num_samples, chunk_size=RUN_CHUNK_SIZE, seed=0):
+    """A run spec; the same spec always gives the same run directory and results."""
+    if workload not in WORKLOADS:
+        raise ValueError(f"Unknown workload {workload!r}; expected one of {list(WORKLOADS)}")
+    # Round-trip through JSON so the spec is exactly what is hashed and saved
+    return json.loads(json.dumps({
+        "workload": workload,
+        "params": params,
+        "num_samples": int(num_samples),
+        "chunk_size": int(chunk_size),
+        "seed": int(seed),
+    }, default=float))
+
+
+def run_id(spec):
+    encoded = json.dumps(spec, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+def run_dir(spec, runs_dir=RUNS_DIR):
+    return os.path.join(runs_dir, run_id(spec))
+
+
+def num_chunks(spec):
+    return -(-spec["num_samples"] // spec["chunk_size"])
+
+
+def _chunk_path(directory, index):
+    return os.path.join(directory, f"chunk_{index:06d}.npz")
+
+
+def completed_chunks(spec, runs_dir=RUNS_DIR):
+    """Indices of the chunks already checkpointed."""
+    directory = run_dir(spec, runs_dir)
+    return [index for index in range(num_chunks(spec)) if os.path.exists(_chunk_path(directory, index))]
+
+
+def _run_chunk(spec, index, seed_sequence):
+    _, chunk = WORKLOADS[spec["workload"]]
+    size = min(spec["chunk_size"], spec["num_samples"] - index * spec["chunk_size"])
+    return index, np.asarray(chunk(spec["params"], size, np.random.default_rng(seed_sequence)), dtype=float)
+
+
+def _save_chunk(directory, index, outputs):
+    # Write under a temporary name and rename, so a checkpoint is never half-written
+    path = _chunk_path(directory, index)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as chunk_file:
+        np.savez(chunk_file, outputs=outputs)
+        chunk_file.flush()
+        os.fsync(chunk_file.fileno())
+    os.replace(temporary_path, path)
+
+
+def run(spec, workers=1, runs_dir=RUNS_DIR, report=None):
+    """
+    Evaluate every chunk of `spec` not yet checkpointed, then return all the results.
+
+    Args:
+        spec: Run spec from make_spec()
+        workers: Worker processes; 1 evaluates the chunks in this process
+        runs_dir: Where run directories are kept
+        report: Optional callback report(progress, message), e.g. Job.report. If it
+            raises, the run stops and the chunks finished so far are kept.
+
+    Returns load_results(spec): a DataFrame with one row per sample, in sample order.
+    """
+    directory = run_dir(spec, runs_dir)
+    os.makedirs(directory, exist_ok=True)
+    # Half-written checkpoints of a process that was killed
+    for name in os.listdir(directory):
+        if name.endswith(".tmp"):
+            os.remove(os.path.join(directory, name))
+    spec_path = os.path.join(directory, "spec.json")
+    if not os.path.exists(spec_path):
+        with open(spec_path, "w") as spec_file:
+            json.dump(spec, spec_file, indent=2)
+
+    total = num_chunks(spec)
+    seed_sequences = np.random.SeedSequence(spec["seed"]).spawn(total)
+    done = set(completed_chunks(spec, runs_dir))
+    pending = [index for index in range(total) if index not in done]
+
+    def finished(index, outputs):
+        _save_chunk(directory, index, outputs)
+        done.add(index)
+        if report is not None:
+            report(len(done) / total, f"{len(done):,} of {total:,} chunks done")
+
+    if report is not None:
+        report(len(done) / total, f"{len(done):,} of {total:,} chunks done")
+    if workers <= 1:
+        for index in pending:
+            finished(*_run_chunk(spec, index, seed_sequences[index]))
+    elif pending:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [pool.submit(_run_chunk, spec, index, seed_sequences[index]) for index in pending]
+            for future in as_completed(futures):
+                finished(*future.result())
+        finally:
+            # Don't start queued chunks once the run has stopped early
+            pool.shutdown(cancel_futures=True)
+    return load_results(spec, runs_dir)
+
+
+def load_results(spec, runs_dir=RUNS_DIR):
+    """Every sample of a finished run, joined in chunk order."""
+    directory = run_dir(spec, runs_dir)
+    missing = num_chunks(spec) - len(completed_chunks(spec, runs_dir))
+    if missing:
+        raise FileNotFoundError(f"Run {run_id(spec)} has {missing} chunk(s) still to run")
+    outputs = []
+    for index in range(num_chunks(spec)):
+        with np.load(_chunk_path(directory, index)) as chunk:
+            outputs.append(chunk["outputs"])
+    columns, _ = WORKLOADS[spec["workload"]]
+    return pd.DataFrame(np.concatenate(outputs), columns=columns(spec["params"]))
+
+
+def delete_run(spec, runs_dir=RUNS_DIR):
+    shutil.rmtree(run_dir(spec, runs_dir), ignore_errors=True)
+
+
+def summarise(results, percentiles=(5, 50, 95)):
+    """Mean and percentiles of each output; undefined values (no WELLBYs) count as infinitely expensive."""
+    values = results.to_numpy()
+    summary = pd.DataFrame(index=results.columns)
+    with np.errstate(invalid="ignore"):
+        summary["Mean"] = np.nanmean(np.where(np.isfinite(values), values, np.nan), axis=0)
+    for percentile in percentiles:
+        summary[f"{percentile}th percentile"] = np.percentile(
+            np.where(np.isnan(values), np.inf, values), percentile, axis=0, method="inverted_cdf"
+        )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run (or resume) a checkpointed simulation.")
+    parser.add_argument("workload", choices=list(WORKLOADS))
+    parser.add_argument("--samples", type=int, required=True, help="Total samples to draw")
+    parser.add_argument("--chunk-size", type=int, default=RUN_CHUNK_SIZE, help="Samples per checkpointed chunk")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--runs-dir", default=RUNS_DIR)
+    parser.add_argument("--trial-evidence", action="store_true", help="uncertainty: sample from the trial posteriors")
+    parser.add_argument("--years", type=int, default=DEFAULT_PROJECTION_YEARS, help="rollout: years to project")
+    parser.add_argument("--salary-growth", type=float, nargs=2, default=(0.0, 10.0), metavar=("LOW", "HIGH"),
+                        help="rollout: range of annual salary growth (%%)")
+    parser.add_argument("--branches-added", type=int, nargs=2, default=(0, 3), metavar=("LOW", "HIGH"),
+                        help="rollout: range of branches opened each year")
+    parser.add_argument("--funding", type=float, nargs=2, default=(5000, 30000), metavar=("LOW", "HIGH"),
+                        help="rollout: range of monthly funding ($)")
+    parser.add_argument("--status", action="store_true", help="Only report how many chunks are done")
+    parser.add_argument("--output", default=None, help="Write every sample to this CSV or Parquet file")
+    args = parser.parse_args()
+
+    if args.workload == "uncertainty":
+        params = uncertainty_params(args.trial_evidence)
+    else:
+        params = rollout_params(
+            years=args.years,
+            salary_growth=[value / 100.0 for value in args.salary_growth],
+            branches_added_per_year=args.branches_added,
+            monthly_funding=args.funding
+        )
+    spec = make_spec(args.workload, params, args.samples, args.chunk_size, args.seed)
+    print(f"Run {run_id(spec)} in {run_dir(spec, args.runs_dir)}")
+    if args.status:
+        print(f"{len(completed_chunks(spec, args.runs_dir)):,} of {num_chunks(spec):,} chunks done")
+        return
+
+    def report(progress, message):
+        print(f"\r{message} ({progress:.0%})", end="", flush=True)
+
+    results = run(spec, args.workers, args.runs_dir, report)
+    print()
+    print(summarise(results).to_string(float_format=lambda value: f"{value:,.4g}"))
+    if args.output:
+        if args.output.endswith(".parquet"):
+            results.to_parquet(args.output)
+        else:
+            results.to_csv(args.output, index=False)
+        print(f"Wrote {len(results):,} samples to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
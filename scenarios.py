@@ -0,0 +1,114 @@
+"""
+Evaluate named scenarios for side-by-side comparison.
+
+A scenario is the set of input-node values of the model graph (see graph.py) when it
+was saved: staffing, the cost-per-session override, every programme tab's inputs and
+the Overall tab's inputs. Evaluating it on a fresh graph reproduces exactly what the
+app showed, whatever decay model each programme used.
+
+Results are cached server-wide by a hash of the scenario's inputs, so re-comparing a
+set of scenarios only evaluates the ones that are new or changed; those are evaluated
+concurrently on a small thread pool.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from config import MAX_CONCURRENT_JOBS, SCENARIO_CACHE_ENTRIES
+from graph import build_model_graph
+
+# Portfolio totals compared across scenarios
+SUMMARY_METRICS = ["Total WELLBYs", "Total Marginal Cost", "Marginal Cost per WELLBY", "Overall Total Cost per WELLBY"]
+PROGRAMME_METRICS = ["Clients Seen", "WELLBYs Generated", "Marginal Programme Cost", "Total Cost per WELLBY"]
+
+
+def scenario_key(inputs):
+    encoded = json.dumps(inputs, sort_keys=True, default=float).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def scenario_programmes(inputs):
+    prefix = "programme_inputs/"
+    return [name[len(prefix):] for name in inputs if name.startswith(prefix)]
+
+
+def evaluate_scenario(inputs):
+    """Overall outcomes and cost per session of one scenario."""
+    programmes = scenario_programmes(inputs)
+    graph = build_model_graph(programmes)
+    for name, value in inputs.items():
+        graph.set(name, value)
+    overall = graph.get("overall")
+    summary = {metric: float(overall[metric]) for metric in SUMMARY_METRICS}
+    summary["Cost per Session"] = graph.get("cost_per_session")
+    per_programme = {
+        programme: {metric: float(overall[metric][index]) for metric in PROGRAMME_METRICS}
+        for index, programme in enumerate(programmes)
+    }
+    return {"summary": summary, "programmes": per_programme}
+
+
+class ScenarioEvaluator:
+    """LRU cache of evaluated scenarios, with misses evaluated on a thread pool."""
+
+    def __init__(self, workers, cache_entries):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scenario")
+        self._cache = OrderedDict()
+        self._cache_entries = cache_entries
+        self._lock = threading.Lock()
+
+    def evaluate(self, scenarios):
+        """
+        Results of every scenario, by name.
+
+        Returns (results, num_evaluated): how many scenarios had to be evaluated
+        rather than being found in the cache.
+        """
+        keys = {name: scenario_key(inputs) for name, inputs in scenarios.items()}
+        with self._lock:
+            cached = {key: self._cache[key] for key in keys.values() if key in self._cache}
+            for key in cached:
+                self._cache.move_to_end(key)
+        missing = {key: scenarios[name] for name, key in keys.items() if key not in cached}
+        futures = {key: self._pool.submit(evaluate_scenario, inputs) for key, inputs in missing.items()}
+        evaluated = {key: future.result() for key, future in futures.items()}
+        with self._lock:
+            self._cache.update(evaluated)
+            while len(self._cache) > self._cache_entries:
+                self._cache.popitem(last=False)
+        results = {**cached, **evaluated}
+        return {name: results[key] for name, key in keys.items()}, len(missing)
+
+
+@st.cache_resource
+def get_scenario_evaluator():
+    return ScenarioEvaluator(MAX_CONCURRENT_JOBS, SCENARIO_CACHE_ENTRIES)
+
+
+def scenarios_to_json(scenarios):
+    return json.dumps(scenarios, indent=1, default=float)
+
+
+def scenarios_from_json(text):
+    """Scenarios saved with scenarios_to_json; raises ValueError if they are malformed."""
+    scenarios = json.loads(text)
+    if not isinstance(scenarios, dict) or not all(isinstance(inputs, dict) for inputs in scenarios.values()):
+        raise ValueError("Expected an object of named scenarios")
+    for name, inputs in scenarios.items():
+        missing = {"branch_inputs", "cost_per_session_override", "overall_inputs"} - set(inputs)
+        if missing or not scenario_programmes(inputs):
+            raise ValueError(f"Scenario {name!r} is missing {sorted(missing) or 'programme inputs'}")
+    return scenarios
+
+
+def summary_deltas(results, baseline):
+    """Change in each summary metric from the baseline scenario, by scenario."""
+    base = results[baseline]["summary"]
+    return {
+        name: {metric: result["summary"][metric] - base[metric] for metric in SUMMARY_METRICS}
+        for name, result in results.items()
+    }
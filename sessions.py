@@ -0,0 +1,240 @@
+"""
+Per-session memory accounting, and eviction of idle sessions' heavy state.
+
+Each session keeps the objects that are large to hold but can be rebuilt - its model
+graph and its finished background analyses - in a SessionArtifacts container in
+st.session_state, registered with the server's SessionMonitor. At the end of every
+rerun the session measures its own state (widget values, saved scenarios and
+artifacts), so the monitor knows roughly how much memory each open session holds.
+
+When any session starts a rerun, the monitor drops the artifacts of sessions that have
+been idle for SESSION_IDLE_SECONDS, or for SESSION_COMPACT_SECONDS if they hold more
+than SESSION_MEMORY_BUDGET_MB. Their widget values and saved scenarios are kept, so a
+returning user sees the same inputs: the graph is rebuilt on their next rerun and
+finished analyses are run again on request. Running analyses are never dropped.
+Eviction only happens when a session reruns, which is when memory is being asked for.
+
+DataFrames and charts that a rerun creates without storing them are freed when it
+ends, and st.cache_data entries are shared by every session, so neither is counted.
+What a session costs beyond its own state is SESSION_OVERHEAD_MB, measured with
+loadtest.py, and is added when estimating how many sessions an instance can hold.
+"""
+import os
+import sys
+import threading
+import time
+import types
+import uuid
+import weakref
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import SESSION_MEMORY_BUDGET_MB, SESSION_COMPACT_SECONDS, SESSION_IDLE_SECONDS, SESSION_OVERHEAD_MB
+
+_ARTIFACTS_KEY = "_session_artifacts"
+_OPAQUE_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def current_rss_bytes():
+    # Resident set size of this process; /proc is only available on Linux
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def deep_sizeof(value, seen=None):
+    """Approximate bytes held by `value` and everything it references, counting shared objects once."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        # A view's memory belongs to its base array
+        return sys.getsizeof(value) + (deep_sizeof(value.base, seen) if value.base is not None else value.nbytes)
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, int, float, bool, type(None))) or isinstance(value, _OPAQUE_TYPES):
+        return size
+    if isinstance(value, dict):
+        return size + sum(deep_sizeof(key, seen) + deep_sizeof(item, seen) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(item, seen) for item in value)
+    if hasattr(value, "__dict__"):
+        size += deep_sizeof(vars(value), seen)
+    for slot in getattr(type(value), "__slots__", ()):
+        size += deep_sizeof(getattr(value, slot, None), seen)
+    return size
+
+
+class SessionArtifacts:
+    """
+    One session's rebuildable objects, by key. Each key can have a `prune` function that
+    returns the part of its value to keep when the session is evicted (None for nothing).
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.last_active = time.time()
+        self.state_bytes = 0      # Widget values and other session state, at the end of the last rerun
+        self.artifact_bytes = 0
+        self.evictions = 0
+        self.evicted_since_rerun = False
+        self._items = {}
+        self._prune = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._items.get(key, default)
+
+    def set(self, key, value, prune=None):
+        with self._lock:
+            self._items[key] = value
+            self._prune[key] = prune
+
+    def setdefault(self, key, default, prune=None):
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = default
+                self._prune[key] = prune
+            return self._items[key]
+
+    def touch(self):
+        with self._lock:
+            self.last_active = time.time()
+
+    def measure(self):
+        with self._lock:
+            self.artifact_bytes = deep_sizeof(self._items)
+
+    def evict_if_idle(self, now, budget_bytes, compact_seconds, idle_seconds):
+        """Drop the artifacts if the session has been idle long enough; True if anything was dropped."""
+        with self._lock:
+            idle = now - self.last_active
+            over_budget = self.state_bytes + self.artifact_bytes > budget_bytes
+            if not self._items or idle < (compact_seconds if over_budget else idle_seconds):
+                return False
+            for key in list(self._items):
+                prune = self._prune.get(key)
+                kept = prune(self._items[key]) if prune is not None else None
+                if kept is None:
+                    del self._items[key]
+                    self._prune.pop(key)
+                else:
+                    self._items[key] = kept
+            self.artifact_bytes = deep_sizeof(self._items)
+            self.evictions += 1
+            self.evicted_since_rerun = True
+            return True
+
+
+class SessionMonitor:
+    """Every open session's artifacts, held weakly so closed sessions drop out on their own."""
+
+    def __init__(self, budget_bytes, compact_seconds, idle_seconds, overhead_bytes=0):
+        self.budget_bytes = budget_bytes
+        self.overhead_bytes = overhead_bytes
+        self.compact_seconds = compact_seconds
+        self.idle_seconds = idle_seconds
+        self.evicted_sessions = 0
+        self._sessions = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def register(self, artifacts):
+        with self._lock:
+            self._sessions[artifacts.id] = artifacts
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def evict_idle(self):
+        now = time.time()
+        evicted = sum(
+            artifacts.evict_if_idle(now, self.budget_bytes, self.compact_seconds, self.idle_seconds)
+            for artifacts in self.sessions()
+        )
+        with self._lock:
+            self.evicted_sessions += evicted
+        return evicted
+
+    def session_table(self):
+        """Memory held by each open session, largest first."""
+        now = time.time()
+        rows = [{
+            "Session": artifacts.id[:8],
+            "Idle (s)": now - artifacts.last_active,
+            "State (MB)": artifacts.state_bytes / 1e6,
+            "Artifacts (MB)": artifacts.artifact_bytes / 1e6,
+            "Total (MB)": (artifacts.state_bytes + artifacts.artifact_bytes) / 1e6,
+            "Evictions": artifacts.evictions,
+        } for artifacts in self.sessions()]
+        columns = ["Session", "Idle (s)", "State (MB)", "Artifacts (MB)", "Total (MB)", "Evictions"]
+        return pd.DataFrame(rows, columns=columns).sort_values("Total (MB)", ascending=False, ignore_index=True)
+
+    def stats(self):
+        sessions = self.sessions()
+        now = time.time()
+        total = sum(artifacts.state_bytes + artifacts.artifact_bytes for artifacts in sessions)
+        rss = current_rss_bytes()
+        return {
+            "sessions": len(sessions),
+            "idle_sessions": sum(now - artifacts.last_active >= self.compact_seconds for artifacts in sessions),
+            "session_bytes": total,
+            "mean_session_bytes": total / len(sessions) if sessions else 0.0,
+            "max_session_bytes": max((artifacts.state_bytes + artifacts.artifact_bytes for artifacts in sessions), default=0),
+            # Memory the server uses whatever the number of sessions: code, imports and shared caches
+            "baseline_bytes": max(rss - total - self.overhead_bytes * len(sessions), 0),
+            "rss_bytes": rss,
+            "evicted_sessions": self.evicted_sessions,
+        }
+
+    def sessions_supported(self, instance_bytes, session_bytes=None):
+        """Sessions an instance with `instance_bytes` of memory could hold at the current mean (or given) session size."""
+        stats = self.stats()
+        if not stats["sessions"] and session_bytes is None:
+            return None
+        session_bytes = (stats["mean_session_bytes"] if session_bytes is None else session_bytes) + self.overhead_bytes
+        return max(int((instance_bytes - stats["baseline_bytes"]) // session_bytes), 0)
+
+
+@st.cache_resource
+def get_session_monitor():
+    # One monitor per server process, shared by every session
+    return SessionMonitor(SESSION_MEMORY_BUDGET_MB * 1e6, SESSION_COMPACT_SECONDS, SESSION_IDLE_SECONDS, SESSION_OVERHEAD_MB * 1e6)
+
+
+def session_artifacts():
+    """This session's SessionArtifacts, created and registered on first use."""
+    artifacts = st.session_state.get(_ARTIFACTS_KEY)
+    if artifacts is None:
+        artifacts = SessionArtifacts()
+        st.session_state[_ARTIFACTS_KEY] = artifacts
+        get_session_monitor().register(artifacts)
+    return artifacts
+
+
+def start_rerun():
+    """Mark this session active and evict idle sessions. Call at the top of the app."""
+    artifacts = session_artifacts()
+    artifacts.touch()
+    get_session_monitor().evict_idle()
+    if artifacts.evicted_since_rerun:
+        artifacts.evicted_since_rerun = False
+        st.toast("This page was idle, so its stored results were cleared to free memory. Finished analyses need to be run again.")
+
+
+def finish_rerun():
+    """Measure this session's memory. Call at the end of the app."""
+    artifacts = session_artifacts()
+    state = {key: value for key, value in st.session_state.to_dict().items() if key != _ARTIFACTS_KEY}
+    artifacts.state_bytes = deep_sizeof(state)
+    artifacts.measure()
+    artifacts.touch()
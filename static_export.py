@@ -0,0 +1,193 @@
+"""
+Export a precomputed copy of the model for static hosting.
+
+Public visitors mostly look at the defaults and move a few sliders, so they do not
+need a Python server. This writes a directory that any static host can serve:
+
+- wellbys_grid.bin.gz: gzip-compressed little-endian float32 grid of WELLBYs per
+  enrolled participant (before the harm adjustment) over annual decay rate x wellbeing
+  gain x retention rate, with exponential decay over the app's timeframe. The grid is
+  the same for every programme, so it is computed and downloaded once.
+- manifest.json: grid axes, programme defaults from config, the constants the Overall
+  tab uses, and reference results at the defaults.
+- index.html: a page that looks up and trilinearly interpolates the grid in the
+  browser, then scales the results to the chosen mix and number of branches exactly
+  as the Overall tab does.
+
+The interpolation is exact along the gain and retention axes (WELLBYs are linear in
+both) and the decay axis is fine enough that the error is reported at export time.
+The full Streamlit app remains the tool for analysts.
+
+Usage:
+    python static_export.py [--output static_site] [--decay-points 81]
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from config import (
+    offerings,
+    DEFAULT_COST_PER_SESSION,
+    DEFAULT_COACHES_PER_COHORT,
+    DEFAULT_CLIENTS_PER_COACH,
+    DEFAULT_TIMEFRAME_OF_INTEREST_MONTHS,
+    DEFAULT_NUM_BRANCHES,
+    ORGANISATION_FIXED_COSTS,
+    STATIC_EXPORT_DIR
+)
+from model import WEEKS_PER_YEAR, exponential_decay_wellbys_per_client, programme_outcomes, overall_outcomes, clients_per_branch_per_year
+
+PAGE_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "index.html")
+GRID_FILE = "wellbys_grid.bin.gz"
+
+# Grid axes, matching the programme tab sliders' ranges
+DECAY_RANGE = (0.001, 0.999)  # Annual decay rate, as a fraction
+GAIN_AXIS = np.round(np.arange(0.0, 5.01, 0.1), 2)  # Wellbeing gain, points on the 0-10 scale
+RETENTION_AXIS = np.round(np.arange(0.0, 1.001, 0.05), 3)
+
+
+def decay_axis(num_points):
+    # Evenly spaced in log(1 - rate), where the WELLBY curve is smoothest
+    return 1.0 - np.exp(np.linspace(np.log(1 - DECAY_RANGE[0]), np.log(1 - DECAY_RANGE[1]), num_points))
+
+
+def wellbys_grid(decay_rates, gains, retention_rates, timeframe_weeks):
+    """WELLBYs per enrolled participant, shape (decay, gain, retention)."""
+    per_completer = exponential_decay_wellbys_per_client(
+        gains[None, :, None], decay_rates[:, None, None], timeframe_weeks
+    )
+    return per_completer * retention_rates[None, None, :]
+
+
+def interpolate(grid, axes, points):
+    """Trilinear interpolation, as done in the browser; `points` has shape (N, 3)."""
+    result = np.zeros(len(points))
+    positions = []
+    for axis, values in zip(axes, points.T):
+        index = np.clip(np.searchsorted(axis, values, side="right") - 1, 0, len(axis) - 2)
+        fraction = np.clip((values - axis[index]) / (axis[index + 1] - axis[index]), 0.0, 1.0)
+        positions.append((index, fraction))
+    for corner in range(8):
+        weight = np.ones(len(points))
+        indices = []
+        for dimension, (index, fraction) in enumerate(positions):
+            upper = (corner >> dimension) & 1
+            weight = weight * (fraction if upper else 1 - fraction)
+            indices.append(index + upper)
+        result += weight * grid[tuple(indices)]
+    return result
+
+
+def interpolation_error(grid, axes, timeframe_weeks, num_points=20000, seed=0):
+    """Largest relative error of the interpolated grid at random slider values."""
+    rng = np.random.default_rng(seed)
+    points = np.column_stack([rng.uniform(axis[0], axis[-1], num_points) for axis in axes])
+    exact = exponential_decay_wellbys_per_client(points[:, 1], points[:, 0], timeframe_weeks) * points[:, 2]
+    approximate = interpolate(grid, axes, points)
+    scale = np.maximum(np.abs(exact), 1e-9)
+    return float(np.max(np.abs(approximate - exact) / scale * (exact > 1e-6)))
+
+
+def reference_results(timeframe_weeks):
+    """Results at the app's default sliders, for checking the page against the app."""
+    programmes = list(offerings)
+    per_programme = {}
+    for programme, defaults in offerings.items():
+        results = programme_outcomes(
+            retention_rate=defaults["retention"] / 100,
+            wellbeing_gain=defaults["peak_wellbeing_score"] - defaults["baseline_wellbeing_score"],
+            annual_decay_rate=defaults["default_decay_rate"] / 100,
+            harm_proportion=defaults["default_harm_proportion"] / 100,
+            cost_per_session=DEFAULT_COST_PER_SESSION,
+            sessions_per_participant=defaults["sessions_per_participant"],
+            num_participants=defaults["num_participants"],
+            timeframe_weeks=timeframe_weeks
+        )
+        per_programme[programme] = results
+    num_participants = np.array([offerings[programme]["num_participants"] for programme in programmes], dtype=float)
+    overall = overall_outcomes(
+        np.array([per_programme[p]["Total Cost (Money Spent)"] for p in programmes]) / num_participants,
+        np.array([per_programme[p]["Net WELLBYs Generated"] for p in programmes]) / num_participants,
+        np.array([per_programme[p]["Clients Retained"] for p in programmes]) / num_participants,
+        [offerings[programme]["default_client_share"] for programme in programmes],
+        DEFAULT_NUM_BRANCHES,
+        ORGANISATION_FIXED_COSTS,
+        clients_per_branch_per_year(DEFAULT_COACHES_PER_COHORT, DEFAULT_CLIENTS_PER_COACH)
+    )
+    return {
+        "cost_per_wellby": {programme: float(results["Cost per WELLBY"]) for programme, results in per_programme.items()},
+        "overall_total_cost_per_wellby": float(overall["Overall Total Cost per WELLBY"]),
+    }
+
+
+def export_static_site(output_dir, decay_points=81):
+    """Write the grid, manifest and page to `output_dir`. Returns the manifest."""
+    timeframe_weeks = DEFAULT_TIMEFRAME_OF_INTEREST_MONTHS / 12 * WEEKS_PER_YEAR
+    axes = [decay_axis(decay_points), GAIN_AXIS, RETENTION_AXIS]
+    grid = wellbys_grid(*axes, timeframe_weeks)
+
+    os.makedirs(output_dir, exist_ok=True)
+    with gzip.open(os.path.join(output_dir, GRID_FILE), "wb", compresslevel=9) as grid_file:
+        grid_file.write(grid.astype("<f4").tobytes(order="C"))
+
+    manifest = {
+        "exported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "grid": {
+            "file": GRID_FILE,
+            "dtype": "float32",
+            "shape": list(grid.shape),
+            "axes": {
+                "annual_decay_rate": axes[0].tolist(),
+                "wellbeing_gain": axes[1].tolist(),
+                "retention_rate": axes[2].tolist(),
+            },
+            "max_relative_error": interpolation_error(grid, axes, timeframe_weeks),
+        },
+        "programmes": [
+            {
+                "name": programme,
+                "num_participants": defaults["num_participants"],
+                "sessions_per_participant": defaults["sessions_per_participant"],
+                "retention": defaults["retention"],
+                "wellbeing_gain": round(defaults["peak_wellbeing_score"] - defaults["baseline_wellbeing_score"], 2),
+                "decay_rate": defaults["default_decay_rate"],
+                "harm_proportion": defaults["default_harm_proportion"],
+                "client_share": defaults["default_client_share"],
+            }
+            for programme, defaults in offerings.items()
+        ],
+        "constants": {
+            "cost_per_session": DEFAULT_COST_PER_SESSION,
+            "clients_per_branch_per_year": clients_per_branch_per_year(DEFAULT_COACHES_PER_COHORT, DEFAULT_CLIENTS_PER_COACH),
+            "num_branches": DEFAULT_NUM_BRANCHES,
+            "fixed_costs": ORGANISATION_FIXED_COSTS,
+        },
+        "reference": reference_results(timeframe_weeks),
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+    shutil.copyfile(PAGE_TEMPLATE_PATH, os.path.join(output_dir, "index.html"))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a precomputed model and static page for static hosting.")
+    parser.add_argument("--output", default=STATIC_EXPORT_DIR, help="Directory to write the site to")
+    parser.add_argument("--decay-points", type=int, default=81, help="Grid points along the annual decay rate")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    manifest = export_static_site(args.output, args.decay_points)
+    total_bytes = sum(os.path.getsize(os.path.join(args.output, name)) for name in os.listdir(args.output))
+    print(f"Grid {' x '.join(str(size) for size in manifest['grid']['shape'])}, "
+          f"max interpolation error {manifest['grid']['max_relative_error']:.2e}")
+    print(f"Wrote {args.output} ({total_bytes / 1024:,.0f} KB) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
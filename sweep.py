@@ -0,0 +1,141 @@
+"""
+Adaptive parameter sweeps that refine only around decision boundaries.
+
+A sweep varies 2-4 inputs of the parameter space (see uncertainty.py) over their
+ranges, with every other input at its current value, and labels each point, e.g. by
+which programme has the lowest cost per WELLBY or whether cost per WELLBY beats a
+threshold. It starts from a coarse grid and repeatedly splits only the cells whose
+corners have different labels, so the evaluations concentrate on the boundaries.
+
+Points live on an integer lattice at the finest resolution, so a point shared by
+neighbouring cells or levels is evaluated once. Each level's new points are evaluated
+together, in vectorized chunks.
+
+A boundary that passes through a cell without changing any corner's label (a region
+narrower than a coarse cell) is not detected, so the coarse grid should be fine enough
+to see every region.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from uncertainty import evaluate_programme, evaluate_overall
+
+# Points per model call, bounding memory on large sweeps
+CHUNK_POINTS = 131072
+
+
+def ranking_classifier(programmes):
+    """Label each point with the index of the programme with the lowest cost per WELLBY."""
+    def classify(values):
+        costs = np.stack([evaluate_programme(values, programme)["Cost per WELLBY"] for programme in programmes])
+        return np.argmin(np.where(np.isfinite(costs), costs, np.inf), axis=0)
+    return classify
+
+
+def threshold_classifier(target, threshold):
+    """Label each point 1 if cost per WELLBY of `target` (a programme or None for Overall) is at most `threshold`."""
+    def classify(values):
+        if target is None:
+            costs = evaluate_overall(values)["Overall Total Cost per WELLBY"]
+        else:
+            costs = evaluate_programme(values, target)["Cost per WELLBY"]
+        return (np.nan_to_num(costs, nan=np.inf) <= threshold).astype(int)
+    return classify
+
+
+class _Lattice:
+    """Labels of evaluated lattice points, looked up by their flattened index."""
+
+    def __init__(self, sizes):
+        self.sizes = np.array(sizes)
+        self.codes = np.empty(0, dtype=np.int64)
+        self.labels = np.empty(0, dtype=np.int64)
+
+    def encode(self, points):
+        return np.ravel_multi_index(tuple(points.T), tuple(self.sizes))
+
+    def missing(self, codes):
+        return codes[~np.isin(codes, self.codes)]
+
+    def add(self, codes, labels):
+        self.codes = np.concatenate([self.codes, codes])
+        self.labels = np.concatenate([self.labels, labels])
+        order = np.argsort(self.codes)
+        self.codes, self.labels = self.codes[order], self.labels[order]
+
+    def lookup(self, codes):
+        return self.labels[np.searchsorted(self.codes, codes)]
+
+
+def adaptive_sweep(classify, base_values, sweep_parameters, coarse_points=9, levels=5):
+    """
+    Sweep `sweep_parameters` (2-4 parameters from a space, each with "name", "low" and
+    "high") and refine the cells where `classify` changes.
+
+    Args:
+        classify: Function from a values dict of arrays to an integer label per point
+        base_values: Value of every input of the model, e.g. {name: mode} of a space
+        sweep_parameters: The inputs to vary, each over [low, high]
+        coarse_points: Points per input of the starting grid
+        levels: Number of times boundary cells are split in half along every input
+
+    Returns a dict with "points" (a DataFrame of every evaluated point and its label),
+    "boundary" (the centres of the finest cells a boundary passes through), the number
+    of "evaluations" and "dense_evaluations" (the size of a uniform grid at the finest
+    resolution).
+    """
+    dimensions = len(sweep_parameters)
+    if not 2 <= dimensions <= 4:
+        raise ValueError("A sweep varies 2 to 4 inputs")
+    names = [parameter["name"] for parameter in sweep_parameters]
+    lows = np.array([parameter["low"] for parameter in sweep_parameters], dtype=float)
+    highs = np.array([parameter["high"] for parameter in sweep_parameters], dtype=float)
+    finest_size = 2 ** levels
+    lattice = _Lattice([(coarse_points - 1) * finest_size + 1] * dimensions)
+    corners = np.array(list(itertools.product([0, 1], repeat=dimensions)))
+
+    def to_values(points):
+        values = {name: np.full(len(points), value, dtype=float) for name, value in base_values.items()}
+        positions = lows + (highs - lows) * points / (lattice.sizes - 1)
+        for column, name in enumerate(names):
+            values[name] = positions[:, column]
+        return values
+
+    def evaluate(points):
+        codes = np.unique(lattice.encode(points))
+        new_codes = lattice.missing(codes)
+        if len(new_codes):
+            new_points = np.column_stack(np.unravel_index(new_codes, tuple(lattice.sizes)))
+            labels = [
+                np.asarray(classify(to_values(new_points[start:start + CHUNK_POINTS])), dtype=np.int64)
+                for start in range(0, len(new_points), CHUNK_POINTS)
+            ]
+            lattice.add(new_codes, np.concatenate(labels))
+
+    # Cells are given by their lowest corner and size on the lattice
+    cell_size = finest_size
+    cells = np.array(list(itertools.product(range(coarse_points - 1), repeat=dimensions))) * cell_size
+    boundary_cells = np.empty((0, dimensions), dtype=np.int64)
+    for level in range(levels + 1):
+        cell_corners = (cells[:, None, :] + cell_size * corners[None, :, :]).reshape(-1, dimensions)
+        evaluate(cell_corners)
+        labels = lattice.lookup(lattice.encode(cell_corners)).reshape(len(cells), len(corners))
+        mixed = cells[(labels != labels[:, :1]).any(axis=1)]
+        if level == levels or len(mixed) == 0:
+            boundary_cells = mixed
+            break
+        # Split every mixed cell into 2^d halves
+        cell_size //= 2
+        cells = (mixed[:, None, :] + cell_size * corners[None, :, :]).reshape(-1, dimensions)
+
+    points = np.column_stack(np.unravel_index(lattice.codes, tuple(lattice.sizes)))
+    positions = lows + (highs - lows) * points / (lattice.sizes - 1)
+    centres = lows + (highs - lows) * (boundary_cells + cell_size / 2) / (lattice.sizes - 1)
+    return {
+        "points": pd.DataFrame(dict(zip(names, positions.T), label=lattice.labels)),
+        "boundary": pd.DataFrame(dict(zip(names, centres.T))),
+        "evaluations": len(lattice.codes),
+        "dense_evaluations": int(np.prod(lattice.sizes)),
+    }
@@ -16,7 +16,9 @@ def display_assumptions_tab():
 
     - **Decay Model Accuracy:** The different decay models (Exponential, Linear) are simplifications 
       of how wellbeing benefits actually diminish over time. The default decay parameters for each programme are based 
-      on the best available evidence or conservative estimates where evidence is limited.
+      on the best available evidence or conservative estimates where evidence is limited. Where we have 
+      follow-up data, a 'Fitted Curve' treats the proportion of clients still in remission as the share of 
+      the benefit that remains.
 
     - **Accuracy of User Inputs:** The validity of the outputs heavily depends on the accuracy of your inputs for:
         - Baseline and peak wellbeing scores.
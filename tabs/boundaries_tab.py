@@ -0,0 +1,97 @@
+import streamlit as st
+import altair as alt
+from uncertainty import overall_parameter_space, point_values
+from sweep import adaptive_sweep, ranking_classifier, threshold_classifier
+
+BEST_PROGRAMME = "Best programme"
+OVERALL_TARGET = "Overall (incl. fixed costs)"
+# Refinement levels by number of inputs, keeping sweeps to a few seconds
+DEFAULT_LEVELS = {2: 5, 3: 3, 4: 2}
+# Points drawn in the chart; the download has all of them
+MAX_CHART_POINTS = 20000
+
+@st.cache_data(max_entries=10)
+def compute_sweep(space, programmes, sweep_names, question, target, threshold, coarse_points, levels):
+    if question == BEST_PROGRAMME:
+        classify = ranking_classifier(programmes)
+    else:
+        classify = threshold_classifier(None if target == OVERALL_TARGET else target, threshold)
+    base_values = {name: float(value[0]) for name, value in point_values(space).items()}
+    by_name = {parameter["name"]: parameter for parameter in space}
+    return adaptive_sweep(classify, base_values, [by_name[name] for name in sweep_names], coarse_points, levels)
+
+def display_boundaries_tab(offering_results, overall_results):
+    st.header("Decision Boundaries")
+    st.markdown("""
+    Where does one programme overtake another, or cost per WELLBY cross a funding threshold? Choose 2-4 inputs to vary
+    across their plausible ranges, with everything else at its current value. The sweep starts from a coarse grid and only
+    refines the cells where the answer changes, so it traces the boundary finely with far fewer model evaluations than a
+    uniform grid.
+    """)
+    programme_inputs = {name: results.get("Inputs") for name, results in offering_results.items()}
+    space = overall_parameter_space(programme_inputs, overall_results)
+    labels = {parameter["name"]: parameter["label"] for parameter in space}
+    programmes = list(offering_results)
+
+    sweep_names = st.multiselect(
+        "Inputs to vary (2-4)", list(labels), default=[f"{programmes[-1]}/retention_rate", "cost_per_session"],
+        format_func=labels.get, max_selections=4, key="sweep_inputs"
+    )
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        question = st.radio("Question", [BEST_PROGRAMME, "Beats a threshold"], key="sweep_question")
+    target, threshold = None, None
+    if question != BEST_PROGRAMME:
+        with col2:
+            target = st.selectbox("Output", programmes + [OVERALL_TARGET], index=len(programmes), key="sweep_target")
+        with col3:
+            threshold = st.number_input("Threshold ($ per WELLBY)", min_value=0.0, value=30.0, step=5.0, key="sweep_threshold")
+    if len(sweep_names) < 2:
+        st.info("Choose at least two inputs to vary.")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        coarse_points = st.slider("Starting grid points per input", 5, 17, 9, 2, key="sweep_coarse_points")
+    with col2:
+        levels = st.slider("Refinement levels", 1, 6, DEFAULT_LEVELS[len(sweep_names)], key=f"sweep_levels_{len(sweep_names)}")
+
+    result = compute_sweep(space, programmes, sweep_names, question, target, threshold, coarse_points, levels)
+    if question == BEST_PROGRAMME:
+        label_names = dict(enumerate(programmes))
+    else:
+        label_names = {0: f"Above ${threshold:,.0f}", 1: f"At or below ${threshold:,.0f}"}
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Model evaluations", f"{result['evaluations']:,}")
+    with col2:
+        st.metric("Uniform grid at the same resolution", f"{result['dense_evaluations']:,}")
+    with col3:
+        st.metric("Boundary cells", f"{len(result['boundary']):,}")
+
+    # Chart the first two inputs; with more, points and boundary cells are projected onto them
+    x_name, y_name = sweep_names[:2]
+    points = result["points"].assign(Answer=result["points"]["label"].map(label_names))
+    points = points.rename(columns={x_name: "x", y_name: "y"})[["x", "y", "Answer"]]
+    boundary = result["boundary"].rename(columns={x_name: "x", y_name: "y"})[["x", "y"]]
+    if len(points) > MAX_CHART_POINTS:
+        points = points.sample(MAX_CHART_POINTS, random_state=0)
+    if len(boundary) > MAX_CHART_POINTS:
+        boundary = boundary.sample(MAX_CHART_POINTS, random_state=0)
+    point_layer = alt.Chart(points).mark_circle(size=12, opacity=0.6).encode(
+        x=alt.X('x:Q', title=labels[x_name]),
+        y=alt.Y('y:Q', title=labels[y_name]),
+        color=alt.Color('Answer:N', title=None)
+    )
+    boundary_layer = alt.Chart(boundary).mark_square(size=6, color='black').encode(x='x:Q', y='y:Q')
+    st.altair_chart((point_layer + boundary_layer).properties(height=450), use_container_width=True)
+    caption = "Coloured dots are the evaluated points and black squares the finest cells the boundary passes through."
+    if result["evaluations"] > MAX_CHART_POINTS or len(result["boundary"]) > MAX_CHART_POINTS:
+        caption += f" A random {MAX_CHART_POINTS:,} of each are drawn."
+    if len(sweep_names) > 2:
+        caption += f" The other {len(sweep_names) - 2} inputs are projected onto this view; download the boundary to see every input."
+    st.caption(caption)
+
+    boundary_csv = result["boundary"].rename(columns=labels).to_csv(index=False)
+    st.download_button("Download boundary (CSV)", boundary_csv, file_name="decision_boundary.csv", mime="text/csv")
@@ -0,0 +1,80 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+from breakeven import scenario_break_even
+from gradients import input_label
+
+DEFAULT_TARGETS = "10, 15, 20, 30, 50"
+# Inputs shown as percentages, as on their sliders
+PERCENT_INPUTS = ("retention_rate", "harm_proportion", "annual_decay_rate")
+
+def _parse_targets(text):
+    try:
+        targets = sorted({float(value) for value in text.replace("$", "").split(",") if value.strip()})
+    except ValueError:
+        return None
+    return targets if targets and all(target > 0 for target in targets) else None
+
+def _format_value(name, value):
+    if not np.isfinite(value):
+        return "N/A"
+    field = name.split("/", 1)[-1]
+    if field in PERCENT_INPUTS:
+        return f"{value * 100:.1f}%"
+    if name.startswith("client_share/"):
+        return f"{value:.1f}%"
+    if name == "num_branches":
+        return f"{value:.0f}"
+    if field in ("fixed_costs", "cost_per_session"):
+        return f"${value:,.2f}" if value < 1000 else f"${value:,.0f}"
+    return f"{value:.2f}"
+
+def _break_even_table(break_even, current_values, targets):
+    rows = {
+        input_label(name): [_format_value(name, current_values[name])] + [_format_value(name, value) for value in values]
+        for name, values in break_even.items()
+    }
+    return pd.DataFrame.from_dict(rows, orient="index", columns=["Current"] + [f"${target:,.0f}" for target in targets])
+
+def display_break_even_tab(graph):
+    st.header("Break-even Inputs")
+    st.markdown("""
+    What would an input need to be to reach a target cost per WELLBY, with every other input at its current value?
+    Each cell is the break-even value of one input; **N/A** means no value within the input's range reaches that target.
+    """)
+    targets_text = st.text_input("Target costs per WELLBY ($, comma-separated)", DEFAULT_TARGETS, key="break_even_targets")
+    targets = _parse_targets(targets_text)
+    if targets is None:
+        st.error("Enter one or more positive numbers separated by commas, e.g. 10, 20, 30.")
+        return
+
+    scenario_inputs = graph.input_values()
+    cost_per_session = graph.get("cost_per_session")
+    results = scenario_break_even(scenario_inputs, cost_per_session, np.array(targets))
+
+    for programme, break_even in results["programmes"].items():
+        st.subheader(programme)
+        inputs = scenario_inputs[f"programme_inputs/{programme}"]
+        current = {name: inputs.get(name, cost_per_session) for name in break_even}
+        st.dataframe(_break_even_table(
+            {f"{programme}/{name}": values for name, values in break_even.items()},
+            {f"{programme}/{name}": value for name, value in current.items()}, targets
+        ))
+        st.caption(f"Current cost per WELLBY: ${graph.get(f'programme/{programme}')['Cost per WELLBY']:,.2f}.")
+
+    st.subheader("Overall (incl. fixed costs)")
+    overall_inputs = scenario_inputs["overall_inputs"]
+    total_share = sum(overall_inputs["client_shares"].values())
+    current = {
+        "num_branches": overall_inputs["num_branches"],
+        "fixed_costs": overall_inputs["fixed_costs"],
+        "cost_per_session": cost_per_session,
+        **{f"client_share/{programme}": 100 * share / total_share if total_share > 0 else np.nan
+           for programme, share in overall_inputs["client_shares"].items()},
+    }
+    st.dataframe(_break_even_table(results["overall"], current, targets))
+    st.caption(
+        f"Current overall cost per WELLBY: ${float(graph.get('overall')['Overall Total Cost per WELLBY']):,.2f}. "
+        "Client shares are the percentage of clients in that programme, with the other programmes in their current proportions. "
+        "The number of branches is the fewest that reach the target."
+    )
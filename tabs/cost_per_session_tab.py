@@ -11,8 +11,9 @@ from config import (
     DEFAULT_HIRING_MANAGER_SALARY,
     DEFAULT_OTHER_SALARY
 )
+from model import FINAL_ASSESSMENT_COST_PER_COACH
 
-def display_cost_per_session_tab():
+def display_cost_per_session_tab(graph):
     st.header("Marginal Costs Calculator")
     st.markdown("Calculate the marginal costs per coaching session for a single branch based on staffing and operational parameters.")
     
@@ -122,31 +123,32 @@ def display_cost_per_session_tab():
     # Calculations
     st.subheader("Cost Calculations")
     
-    # Calculate additional cost for final roleplay assessment
-    final_assessment_cost = 7 * coaches_per_cohort if final_roleplay_assessment else 0
-    
-    # Calculate hiring manager cost
-    hiring_manager_cost = DEFAULT_HIRING_MANAGER_SALARY if hiring_manager_enabled else 0
-    
-    # Calculate total monthly salary costs
-    total_monthly_salaries = (
-        counsellor_salary + 
-        head_of_training_salary + 
-        va_salary + 
-        branch_manager_salary +
-        hiring_manager_cost +
-        other_salary +
-        final_assessment_cost
-    )
+    # The programme tabs take their cost per session from here, through the model graph
+    graph.set("branch_inputs", {
+        "coaches_per_cohort": coaches_per_cohort,
+        "clients_per_coach": clients_per_coach,
+        "sessions_per_client": sessions_per_client,
+        "counsellor_salary": counsellor_salary,
+        "head_of_training_salary": head_of_training_salary,
+        "va_salary": va_salary,
+        "branch_manager_salary": branch_manager_salary,
+        "hiring_manager_salary": DEFAULT_HIRING_MANAGER_SALARY,
+        "other_salary": other_salary,
+        "final_roleplay_assessment": final_roleplay_assessment,
+        "hiring_manager_enabled": hiring_manager_enabled
+    })
+    branch_costs = graph.get("branch_costs")
+    final_assessment_cost = int(branch_costs["final_assessment_cost"])
+    total_monthly_salaries = float(branch_costs["total_monthly_costs"])
     
     # Calculate total clients per cohort
     total_clients_per_cohort = coaches_per_cohort * clients_per_coach
     
     # Calculate total sessions per cohort
-    total_sessions_per_cohort = total_clients_per_cohort * sessions_per_client
+    total_sessions_per_cohort = int(branch_costs["sessions_per_month"])
     
     # Assuming each cohort runs for one month (you might want to make this configurable)
-    cost_per_session = total_monthly_salaries / total_sessions_per_cohort if total_sessions_per_cohort > 0 else 0
+    cost_per_session = float(branch_costs["cost_per_session"])
     
     # Display results
     col1, col2, col3 = st.columns(3)
@@ -169,7 +171,7 @@ def display_cost_per_session_tab():
             st.metric(
                 label="Final Roleplay Assessment Cost", 
                 value=f"${final_assessment_cost}",
-                help=f"${7} × {coaches_per_cohort} coaches"
+                help=f"${FINAL_ASSESSMENT_COST_PER_COACH} × {coaches_per_cohort} coaches"
             )
         else:
             st.metric(
@@ -213,5 +215,5 @@ def display_cost_per_session_tab():
             value=f"${total_monthly_salaries:,.2f}"
         )
     
-    # Return the calculated cost per session for use in other tabs if needed
-    return cost_per_session 
\ No newline at end of file
+    # Return the calculated cost per session and the branch's monthly costs for use in other tabs
+    return cost_per_session, total_monthly_salaries 
\ No newline at end of file
@@ -2,19 +2,30 @@ import streamlit as st
 # Import DEFAULT values from the main config file
 from config import (
     DEFAULT_COST_PER_SESSION, 
-    DEFAULT_AVG_SESSIONS_FOR_DROPOUTS
+    DEFAULT_AVG_SESSIONS_FOR_DROPOUTS,
+    SESSION_MEMORY_BUDGET_MB,
+    SESSION_COMPACT_SECONDS,
+    SESSION_IDLE_SECONDS,
+    SESSION_OVERHEAD_MB
 )
+from sessions import get_session_monitor
 
 def display_model_parameters_tab():
     st.header("Model Parameters")
     st.markdown("Adjust the global parameters that affect all programme calculations.")
     
+    override_cost_per_session = st.checkbox(
+        "Override the cost per session from the Marginal Costs tab",
+        value=False,
+        key="override_cost_per_session"
+    )
     cost_per_session = st.number_input(
         "Cost per Coaching Session ($)", 
         min_value=0.0, 
         value=DEFAULT_COST_PER_SESSION, 
         step=0.50,
-        help="The direct financial cost for one coaching session."
+        disabled=not override_cost_per_session,
+        help="The direct financial cost for one coaching session. By default this is calculated from staffing in the Marginal Costs tab."
     )
     
     avg_sessions_for_dropouts = st.number_input(
@@ -25,7 +36,35 @@ def display_model_parameters_tab():
         help="On average, how many sessions does a participant who drops out complete?"
     )
     
+    with st.expander("Server memory"):
+        _display_memory_stats()
+
     return (
-        cost_per_session,
+        cost_per_session if override_cost_per_session else None,
         avg_sessions_for_dropouts
-    ) 
\ No newline at end of file
+    ) 
+
+def _display_memory_stats():
+    monitor = get_session_monitor()
+    stats = monitor.stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Open sessions", f"{stats['sessions']:,}", help=f"{stats['idle_sessions']:,} idle for at least {SESSION_COMPACT_SECONDS // 60} minutes")
+    col2.metric(
+        "Memory per session", f"{stats['mean_session_bytes'] / 1e6 + SESSION_OVERHEAD_MB:,.1f} MB",
+        help=f"State held by the session (largest: {stats['max_session_bytes'] / 1e6:,.1f} MB) plus {SESSION_OVERHEAD_MB} MB of per-session overhead measured with loadtest.py"
+    )
+    col3.metric("Server baseline", f"{stats['baseline_bytes'] / 1e6:,.0f} MB", help="Code, imports and shared caches, whatever the number of sessions")
+    instance_gb = st.number_input("Instance memory (GB)", min_value=0.5, value=2.0, step=0.5, key="memory_instance_gb")
+    supported = monitor.sessions_supported(instance_gb * 1e9)
+    if supported is not None:
+        worst_case = monitor.sessions_supported(instance_gb * 1e9, SESSION_MEMORY_BUDGET_MB * 1e6)
+        st.markdown(
+            f"An instance with {instance_gb:g} GB could hold about **{supported:,}** sessions like the current ones, "
+            f"or {worst_case:,} if every session held its full {SESSION_MEMORY_BUDGET_MB} MB budget."
+        )
+    st.caption(
+        f"Sessions holding more than {SESSION_MEMORY_BUDGET_MB} MB have their model results and finished analyses cleared "
+        f"after {SESSION_COMPACT_SECONDS // 60} idle minutes, and every other session after {SESSION_IDLE_SECONDS // 60}; "
+        f"their inputs are kept. {stats['evicted_sessions']:,} idle session(s) cleared since the server started."
+    )
+    st.dataframe(monitor.session_table(), hide_index=True, use_container_width=True)
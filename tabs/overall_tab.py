@@ -1,21 +1,53 @@
 import streamlit as st
 import pandas as pd
-import numpy as np # For np.nan
+import numpy as np
 import plotly.express as px
-from config import ORGANISATION_FIXED_COSTS, DEFAULT_COACHES_PER_COHORT, DEFAULT_CLIENTS_PER_COACH # Import the R&D budget and operational defaults
+from config import offerings, ORGANISATION_FIXED_COSTS, DEFAULT_COACHES_PER_COHORT, DEFAULT_CLIENTS_PER_COACH, DEFAULT_NUM_BRANCHES # Import the R&D budget and operational defaults
+from model import clients_per_branch_per_year
+from portfolio import (
+    FLAG_FIELDS,
+    default_branch_table,
+    clean_branch_table,
+    branch_lists,
+    portfolio_mix,
+    branch_results_table,
+    rollup
+)
 
-def display_overall_comparison_tab(results_data):
+BRANCH_MODES = ["Identical branches", "Branch table"]
+BRANCH_RESULT_FORMATS = {
+    'Branches': '{:,.0f}',
+    'Cost per Session': '${:,.2f}',
+    'Yearly Capacity': '{:,.0f}',
+    'Clients Seen': '{:,.0f}',
+    'Marginal Cost': '${:,.0f}',
+    'Allocated Fixed Costs': '${:,.0f}',
+    'WELLBYs Generated': '{:,.2f}',
+    'Marginal Cost per WELLBY': '${:,.2f}',
+    'Total Cost per WELLBY': '${:,.2f}'
+}
+
+def display_overall_comparison_tab(results_data, graph, fixed_costs=ORGANISATION_FIXED_COSTS):
     
     # Add controls for branches and client distribution
     st.subheader("Scale and Distribution")
+    programmes = list(offerings.keys())
+    branch_mode = st.radio(
+        "Branches", BRANCH_MODES, horizontal=True, key="overall_branch_mode",
+        help="Model every branch with the Marginal Costs tab's staffing and one programme mix, "
+             "or give each branch (e.g. in different countries) its own staffing and mix."
+    )
+    if branch_mode == "Branch table":
+        return _display_branch_table_mode(results_data, graph, fixed_costs, programmes)
     
     # Number of branches slider
     num_branches = st.slider(
         "Number of branches", 
         min_value=1, 
         max_value=20, 
-        value=3, 
+        value=DEFAULT_NUM_BRANCHES, 
         step=1,
+        key="overall_num_branches",
         help="Each branch can serve approximately 2,700 clients per year (225 per month)"
     )
     
@@ -51,34 +83,25 @@ def display_overall_comparison_tab(results_data):
     
     with col1:
         st.markdown("**Adjust the proportion of clients in each programme:**")
-        bespoke_pct = st.slider("Bespoke Offering (%)", 0, 100, 60, 5)
-        procrastination_pct = st.slider("Procrastination (%)", 0, 100, 20, 5)
-        insomnia_pct = st.slider("Insomnia (%)", 0, 100, 20, 5)
+        client_pcts = {
+            programme: st.slider(f"{programme} (%)", 0, 100, offerings[programme]["default_client_share"], 5)
+            for programme in programmes
+        }
+        share_array = np.array([client_pcts[programme] for programme in programmes], dtype=float)
         
         # Normalize to 100%
-        total_pct = bespoke_pct + procrastination_pct + insomnia_pct
-        if total_pct > 0:
-            bespoke_norm = bespoke_pct / total_pct
-            procrastination_norm = procrastination_pct / total_pct  
-            insomnia_norm = insomnia_pct / total_pct
-        else:
-            bespoke_norm = procrastination_norm = insomnia_norm = 0.33
+        total_pct = share_array.sum()
+        normalised_shares = share_array / total_pct if total_pct > 0 else np.full(len(programmes), 0.33)
         
-        st.caption(f"Total: {total_pct}% (automatically normalized to 100%)")
+        st.caption(f"Total: {total_pct:.0f}% (automatically normalized to 100%)")
     
     with col2:
         # Create pie chart
-        pie_data = {
-            'Programme': ['Bespoke Offering', 'Procrastination', 'Insomnia'],
-            'Percentage': [bespoke_norm * 100, procrastination_norm * 100, insomnia_norm * 100],
-            'Clients': [
-                int(bespoke_norm * total_clients_capacity),
-                int(procrastination_norm * total_clients_capacity), 
-                int(insomnia_norm * total_clients_capacity)
-            ]
-        }
-        
-        pie_df = pd.DataFrame(pie_data)
+        pie_df = pd.DataFrame({
+            'Programme': programmes,
+            'Percentage': normalised_shares * 100,
+            'Clients': np.floor(normalised_shares * total_clients_capacity).astype(int)
+        })
         fig = px.pie(pie_df, values='Percentage', names='Programme', 
                     title=f"Client Distribution Across {total_clients_capacity:,} Total Clients")
         st.plotly_chart(fig, use_container_width=True)
@@ -87,81 +110,55 @@ def display_overall_comparison_tab(results_data):
     if not results_data or not all(isinstance(res, dict) for res in results_data.values()) or \
        not all('Cost per WELLBY' in res for res in results_data.values()):
         st.info('Adjust parameters in the other tabs to see a comparison here.')
-        return
-
-    # Scale the results based on new client numbers
-    scaled_results = {}
-    client_distribution = {
-        'Bespoke Offering': int(bespoke_norm * total_clients_capacity),
-        'Procrastination': int(procrastination_norm * total_clients_capacity),
-        'Insomnia': int(insomnia_norm * total_clients_capacity)
-    }
-    
-    for programme, original_data in results_data.items():
-        if programme in client_distribution:
-            # Get scaling factor
-            original_clients = original_data.get('Total Clients Seen', 1)
-            new_clients = client_distribution[programme]
-            scale_factor = new_clients / original_clients if original_clients > 0 else 0
-            
-            # Scale the results
-            scaled_results[programme] = {
-                'Total Cost (Money Spent)': original_data.get('Total Cost (Money Spent)', 0) * scale_factor,
-                'Net WELLBYs Generated': original_data.get('Net WELLBYs Generated', 0) * scale_factor,
-                'Cost per WELLBY': original_data.get('Cost per WELLBY', 0),  # This stays the same per unit
-                'Total Clients Seen': new_clients,
-                'Clients Retained': original_data.get('Clients Retained', 0) * scale_factor,
-                'Net WELLBYs per Retained Client': original_data.get('Net WELLBYs per Retained Client', 0)  # This stays the same per client
-            }
-
-    df = pd.DataFrame.from_dict(scaled_results, orient='index')
-
-    # Rename columns for clarity in the table
-    column_renames = {
-        'Total Cost (Money Spent)': 'Marginal Programme Cost',
-        'Net WELLBYs Generated': 'WELLBYs Generated',
-        'Cost per WELLBY': 'Cost per WELLBY',
-        'Total Clients Seen': 'Clients Seen',
-        'Clients Retained': 'Clients Retained'
-    }
-    df = df.rename(columns=column_renames)
-
-    # Desired column order for display
-    desired_columns_order = [
-        'Marginal Programme Cost',
-        'WELLBYs Generated',
-        'Clients Seen',
-        'Clients Retained',
-        'Cost per WELLBY'
-    ]
-    existing_columns_in_order = [col for col in desired_columns_order if col in df.columns]
-    df_display = df[existing_columns_in_order]
-
-    ordered_programmes = ['Bespoke Offering', 'Procrastination', 'Insomnia']
-    ordered_programmes_in_results = [p for p in ordered_programmes if p in df_display.index]
-    df_display = df_display.reindex(ordered_programmes_in_results)
-
-    # Calculate Summary Row (only for display columns)
-    if not df_display.empty:
-        summary_data = {}
-        if 'Marginal Programme Cost' in df_display.columns: 
-            summary_data['Marginal Programme Cost'] = df_display['Marginal Programme Cost'].sum()
-        if 'WELLBYs Generated' in df_display.columns: 
-            summary_data['WELLBYs Generated'] = df_display['WELLBYs Generated'].sum()
-        if 'Clients Seen' in df_display.columns: 
-            summary_data['Clients Seen'] = df_display['Clients Seen'].sum()
-        if 'Clients Retained' in df_display.columns: 
-            summary_data['Clients Retained'] = df_display['Clients Retained'].sum()
-        
-        # For averages/derived metrics in summary:
-        total_direct_cost_sum = summary_data.get('Marginal Programme Cost', 0)
-        total_wellbys_sum = summary_data.get('WELLBYs Generated', 0)
+        return None
 
-        summary_data['Cost per WELLBY'] = (total_direct_cost_sum / total_wellbys_sum) if total_wellbys_sum > 0 else np.nan
-        
-        summary_df_cols = {k: [v] for k, v in summary_data.items() if k in df_display.columns}
-        summary_row = pd.DataFrame(summary_df_cols, index=["Total/Overall Average"])
-        df_display = pd.concat([df_display, summary_row])
+    # Scale every programme's per-client results to its share of capacity in one vectorized step
+    graph.set("overall_inputs", {
+        "client_shares": client_pcts,
+        "num_branches": num_branches,
+        "fixed_costs": fixed_costs,
+        "coaches_per_cohort": coaches_per_cohort,
+        "clients_per_coach": clients_per_coach_total
+    })
+    outcomes = graph.get("overall")
+
+    df_display, fixed_cost_display = _display_results_tables(outcomes, programmes, fixed_costs)
+
+    return {
+        "Number of Branches": num_branches,
+        "Client Distribution (%)": client_pcts,
+        "Fixed Costs": fixed_costs,
+        "Scaled Programme Results": df_display,
+        "Total Cost Analysis": fixed_cost_display
+    } 
+
+
+def _display_results_tables(outcomes, programmes, fixed_costs):
+    programme_results = outcomes["Programme Results"]
+
+    df_display = pd.DataFrame({
+        'Marginal Programme Cost': outcomes["Marginal Programme Cost"],
+        'WELLBYs Generated': outcomes["WELLBYs Generated"],
+        'Clients Seen': outcomes["Clients Seen"],
+        'Clients Retained': outcomes["Clients Retained"],
+        'Cost per WELLBY': programme_results["cost_per_wellby"]  # This stays the same per unit
+    }, index=programmes)
+    if "Branches" in outcomes:
+        # ...unless branches have different costs per session
+        with np.errstate(divide="ignore", invalid="ignore"):
+            df_display['Cost per WELLBY'] = np.where(
+                outcomes["WELLBYs Generated"] > 0, outcomes["Marginal Programme Cost"] / outcomes["WELLBYs Generated"], np.nan
+            )
+
+    # Calculate Summary Row
+    summary_row = pd.DataFrame({
+        'Marginal Programme Cost': [outcomes["Total Marginal Cost"]],
+        'WELLBYs Generated': [outcomes["Total WELLBYs"]],
+        'Clients Seen': [outcomes["Clients Seen"].sum()],
+        'Clients Retained': [outcomes["Clients Retained"].sum()],
+        'Cost per WELLBY': [float(outcomes["Marginal Cost per WELLBY"])]
+    }, index=["Total/Overall Average"])
+    df_display = pd.concat([df_display, summary_row])
 
     # Formatting dictionary
     formats = {
@@ -171,83 +168,179 @@ def display_overall_comparison_tab(results_data):
         'Clients Retained': '{:,.0f}',
         'Cost per WELLBY': '${:,.0f}'
     }
-    valid_formats = {k: v for k, v in formats.items() if k in df_display.columns}
     
     # Display the table
     st.subheader("Scaled Programme Results")
-    st.dataframe(df_display.style.format(valid_formats, na_rep="N/A"), height=(df_display.shape[0] + 1) * 35 + 3) 
+    st.dataframe(df_display.style.format(formats, na_rep="N/A"), height=(df_display.shape[0] + 1) * 35 + 3) 
     
     # Add table with fixed costs included
     st.subheader("Total Cost Analysis (Including Fixed Costs)")
     
-    if not df_display.empty:
-        # Create a copy of the scaled results for fixed cost calculations
-        fixed_cost_df = df_display.copy()
+    fixed_cost_display = None
+    total_clients = outcomes["Clients Seen"].sum()
+    if total_clients > 0:
+        # Fixed costs are allocated proportionally to clients seen
+        total_cost = outcomes["Marginal Programme Cost"] + outcomes["Allocated Fixed Costs"]
+        fixed_cost_display = pd.DataFrame({
+            'Marginal Programme Cost': outcomes["Marginal Programme Cost"],
+            'Allocated Fixed Costs': outcomes["Allocated Fixed Costs"],
+            'Total Cost': total_cost,
+            'WELLBYs Generated': outcomes["WELLBYs Generated"],
+            'Clients Seen': outcomes["Clients Seen"],
+            'Clients Retained': outcomes["Clients Retained"],
+            'Total Cost per WELLBY': outcomes["Total Cost per WELLBY"]
+        }, index=programmes)
+
+        # Add summary row
+        fixed_summary_row = pd.DataFrame({
+            'Marginal Programme Cost': [outcomes["Total Marginal Cost"]],
+            'Allocated Fixed Costs': [outcomes["Allocated Fixed Costs"].sum()],
+            'Total Cost': [total_cost.sum()],
+            'WELLBYs Generated': [outcomes["Total WELLBYs"]],
+            'Clients Seen': [total_clients],
+            'Clients Retained': [outcomes["Clients Retained"].sum()],
+            'Total Cost per WELLBY': [total_cost.sum() / outcomes["Total WELLBYs"] if outcomes["Total WELLBYs"] > 0 else np.nan]
+        }, index=["Total/Overall Average"])
+        fixed_cost_display = pd.concat([fixed_cost_display, fixed_summary_row])
         
-        # Remove the summary row temporarily for calculations
-        programmes_only_df = fixed_cost_df.drop("Total/Overall Average", errors='ignore')
+        # Format the fixed cost table
+        fixed_formats = {
+            'Marginal Programme Cost': '${:,.0f}',
+            'Allocated Fixed Costs': '${:,.0f}',
+            'Total Cost': '${:,.0f}',
+            'WELLBYs Generated': '{:,.2f}',
+            'Clients Seen': '{:,.0f}',
+            'Clients Retained': '{:,.0f}',
+            'Total Cost per WELLBY': '${:,.0f}'
+        }
+        
+        # Show explanation
+        st.markdown(f"""
+        **Fixed costs (${fixed_costs:,.0f}) are allocated proportionally based on clients seen.**
         
-        # Calculate fixed cost allocation based on clients seen
-        total_clients = programmes_only_df['Clients Seen'].sum() if 'Clients Seen' in programmes_only_df.columns else 0
+        This gives a more complete picture of the true cost per WELLBY when including R&D and organizational overhead costs.
+        """)
         
-        if total_clients > 0:
-            # Allocate fixed costs proportionally to clients seen
-            programmes_only_df['Allocated Fixed Costs'] = programmes_only_df['Clients Seen'] * (ORGANISATION_FIXED_COSTS / total_clients)
-            programmes_only_df['Total Cost'] = programmes_only_df['Marginal Programme Cost'] + programmes_only_df['Allocated Fixed Costs']
-            programmes_only_df['Total Cost per WELLBY'] = programmes_only_df['Total Cost'] / programmes_only_df['WELLBYs Generated']
-            
-            # Calculate new summary row
-            fixed_summary_data = {
-                'Marginal Programme Cost': programmes_only_df['Marginal Programme Cost'].sum(),
-                'Allocated Fixed Costs': programmes_only_df['Allocated Fixed Costs'].sum(),
-                'Total Cost': programmes_only_df['Total Cost'].sum(),
-                'WELLBYs Generated': programmes_only_df['WELLBYs Generated'].sum(),
-                'Clients Seen': programmes_only_df['Clients Seen'].sum(),
-                'Clients Retained': programmes_only_df['Clients Retained'].sum()
-            }
-            
-            # Calculate overall total cost per WELLBY
-            fixed_summary_data['Total Cost per WELLBY'] = (fixed_summary_data['Total Cost'] / 
-                                                         fixed_summary_data['WELLBYs Generated']) if fixed_summary_data['WELLBYs Generated'] > 0 else np.nan
-            
-            # Add summary row
-            fixed_summary_row = pd.DataFrame({k: [v] for k, v in fixed_summary_data.items()}, 
-                                           index=["Total/Overall Average"])
-            fixed_cost_display = pd.concat([programmes_only_df, fixed_summary_row])
-            
-            # Define column order for fixed cost table
-            fixed_cost_columns = [
-                'Marginal Programme Cost',
-                'Allocated Fixed Costs', 
-                'Total Cost',
-                'WELLBYs Generated',
-                'Clients Seen',
-                'Clients Retained',
-                'Total Cost per WELLBY'
-            ]
-            
-            # Filter to existing columns
-            fixed_cost_display = fixed_cost_display[[col for col in fixed_cost_columns if col in fixed_cost_display.columns]]
-            
-            # Format the fixed cost table
-            fixed_formats = {
-                'Marginal Programme Cost': '${:,.0f}',
-                'Allocated Fixed Costs': '${:,.0f}',
-                'Total Cost': '${:,.0f}',
-                'WELLBYs Generated': '{:,.2f}',
-                'Clients Seen': '{:,.0f}',
-                'Clients Retained': '{:,.0f}',
-                'Total Cost per WELLBY': '${:,.0f}'
-            }
-            fixed_valid_formats = {k: v for k, v in fixed_formats.items() if k in fixed_cost_display.columns}
-            
-            # Show explanation
-            st.markdown(f"""
-            **Fixed costs (${ORGANISATION_FIXED_COSTS:,}) are allocated proportionally based on clients seen.**
-            
-            This gives a more complete picture of the true cost per WELLBY when including R&D and organizational overhead costs.
-            """)
-            
-            # Display the fixed cost table
-            st.dataframe(fixed_cost_display.style.format(fixed_valid_formats, na_rep="N/A"), 
-                        height=(fixed_cost_display.shape[0] + 1) * 35 + 3) 
\ No newline at end of file
+        # Display the fixed cost table
+        st.dataframe(fixed_cost_display.style.format(fixed_formats, na_rep="N/A"), 
+                    height=(fixed_cost_display.shape[0] + 1) * 35 + 3)
+
+    return df_display, fixed_cost_display
+
+
+def modelled_num_branches():
+    """
+    Branches modelled on this tab, from its widgets' state, for tabs rendered before it.
+    In table mode this is the table's rows after the editor's added and deleted rows.
+    """
+    if st.session_state.get("overall_branch_mode") == "Branch table" and "branch_table_base" in st.session_state:
+        edits = st.session_state.get("branch_table_editor") or {}
+        return len(st.session_state["branch_table_base"]) + len(edits.get("added_rows", [])) - len(edits.get("deleted_rows", []))
+    return st.session_state.get("overall_num_branches", DEFAULT_NUM_BRANCHES)
+
+def _branch_table_base(graph, programmes):
+    """The table the editor starts from: uploaded, or identical branches with the current staffing."""
+    if "branch_table_base" not in st.session_state:
+        client_shares = {programme: offerings[programme]["default_client_share"] for programme in programmes}
+        st.session_state["branch_table_base"] = default_branch_table(3, graph.get("branch_inputs"), client_shares, programmes)
+    return st.session_state["branch_table_base"]
+
+
+def _display_branch_table_mode(results_data, graph, fixed_costs, programmes):
+    branch_inputs = graph.get("branch_inputs")
+    default_shares = {programme: offerings[programme]["default_client_share"] for programme in programmes}
+    st.markdown(
+        "Give each branch its own staffing, cohort size and programme mix (as percentages, normalised per branch). "
+        "Blank cells take the Marginal Costs tab's staffing and the default mix. Upload a CSV with the same columns "
+        "to model hundreds of branches."
+    )
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        uploaded = st.file_uploader("Load branches (CSV)", type="csv", key="branch_table_upload")
+        if uploaded is not None and st.session_state.get("_branch_table_upload_id") != uploaded.file_id:
+            try:
+                st.session_state["branch_table_base"] = clean_branch_table(
+                    pd.read_csv(uploaded), programmes, branch_inputs, default_shares
+                )
+                st.session_state["_branch_table_upload_id"] = uploaded.file_id
+                st.session_state.pop("branch_table_editor", None)
+            except (ValueError, pd.errors.ParserError) as error:
+                st.error(f"Couldn't load the branches: {error}")
+    with col2:
+        num_identical = st.number_input("Identical branches", min_value=1, max_value=1000, value=3, step=1, key="branch_table_num_identical")
+    with col3:
+        st.write("")
+        if st.button("Reset to identical branches", key="branch_table_reset"):
+            st.session_state["branch_table_base"] = default_branch_table(int(num_identical), branch_inputs, default_shares, programmes)
+            st.session_state.pop("branch_table_editor", None)
+
+    edited = st.data_editor(
+        _branch_table_base(graph, programmes),
+        num_rows="dynamic",
+        key="branch_table_editor",
+        height=min(35 * (len(_branch_table_base(graph, programmes)) + 2), 400),
+        column_config={field: st.column_config.CheckboxColumn(field) for field in FLAG_FIELDS},
+        use_container_width=True
+    )
+    try:
+        table = clean_branch_table(edited, programmes, branch_inputs, default_shares)
+    except ValueError as error:
+        st.error(f"The branch table has a problem: {error}")
+        return None
+    if table.empty:
+        st.info("Add at least one branch to see the portfolio's results.")
+        return None
+    st.download_button("Download branches (CSV)", table.to_csv(index=False), file_name="branches.csv", mime="text/csv")
+
+    branches = branch_lists(table)
+    client_pcts = portfolio_mix(branches, programmes)
+    yearly_capacity = clients_per_branch_per_year(table["coaches_per_cohort"], table["clients_per_coach"])
+    capacity_col1, capacity_col2, capacity_col3 = st.columns(3)
+    capacity_col1.metric("Branches", f"{len(table):,}", help=f"In {table['country'].nunique():,} countries")
+    capacity_col2.metric("Yearly Client Capacity", f"{yearly_capacity.sum():,.0f} clients")
+    capacity_col3.metric("Portfolio Mix", " / ".join(f"{client_pcts[programme]:.0f}%" for programme in programmes),
+                         help=" / ".join(programmes))
+
+    if not results_data or not all(isinstance(res, dict) for res in results_data.values()) or \
+       not all('Cost per WELLBY' in res for res in results_data.values()):
+        st.info('Adjust parameters in the other tabs to see a comparison here.')
+        return None
+
+    # Analyses of identical branches (break-even, sensitivity, uncertainty) see the portfolio's
+    # size and overall mix; the tables below use every branch's own inputs
+    graph.set("overall_inputs", {
+        "client_shares": client_pcts,
+        "num_branches": len(table),
+        "fixed_costs": fixed_costs,
+        "coaches_per_cohort": DEFAULT_COACHES_PER_COHORT,
+        "clients_per_coach": DEFAULT_CLIENTS_PER_COACH,
+        "branches": branches
+    })
+    outcomes = graph.get("overall")
+    df_display, fixed_cost_display = _display_results_tables(outcomes, programmes, fixed_costs)
+
+    branch_results = branch_results_table(branches, outcomes, fixed_costs)
+    st.subheader("Results by Country")
+    by_country = rollup(branch_results, "Country")
+    st.dataframe(by_country.style.format(BRANCH_RESULT_FORMATS, na_rep="N/A"), use_container_width=True)
+    fig = px.bar(
+        by_country.reset_index(), x="Country", y="Total Cost per WELLBY", hover_data=["Branches", "Clients Seen"],
+        title="Total Cost per WELLBY by Country (including allocated fixed costs)"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    with st.expander(f"Results by branch ({len(branch_results):,})"):
+        st.dataframe(branch_results.style.format(BRANCH_RESULT_FORMATS, na_rep="N/A"), hide_index=True, use_container_width=True)
+    st.caption(
+        f"The Break-even and Sensitivity tabs and the uncertainty analyses treat this portfolio as {len(table):,} branches "
+        "with the Marginal Costs tab's staffing and the portfolio's overall programme mix."
+    )
+
+    return {
+        "Number of Branches": len(table),
+        "Client Distribution (%)": client_pcts,
+        "Fixed Costs": fixed_costs,
+        "Scaled Programme Results": df_display,
+        "Total Cost Analysis": fixed_cost_display,
+        "Results by Country": by_country
+    }
@@ -1,19 +1,26 @@
+import os
 import streamlit as st
-import numpy as np
 # pandas and altair are not directly used by display_programme_tab itself,
 # but by display_decay_visualisation which it calls from utils.py.
 # So, they are not strictly needed here if display_decay_visualisation handles its own chart objects.
 
 # Import helper functions from utils.py
-from utils import display_decay_visualisation, calculate_total_wellbys_per_ea
+from utils import display_decay_visualisation, display_fitted_decay_visualisation
+from decay_fitting import DECAY_FORMS, load_fitted_decay
 # No direct config import needed here as `offerings` (tab_defaults) is passed in.
 from config import DEFAULT_TIMEFRAME_OF_INTEREST_MONTHS
 from config import programme_introductions, programme_wellbeing_gain_explanations
+from config import FITTED_DECAY_PATH, calibrated_programmes
+
+@st.cache_data
+def get_fitted_decay(fitted_file_mtime):
+    # Keyed on the file's modification time so a refit is picked up without a restart
+    return load_fitted_decay(FITTED_DECAY_PATH)
 
 def display_programme_tab(
     tab_name, 
     tab_defaults, 
-    cost_per_session_global,
+    graph,
     avg_sessions_dropouts_global
 ):
     st.header(f"{tab_name} Programme")
@@ -24,6 +31,10 @@ def display_programme_tab(
     
     st.subheader("Benefit Duration and Decay")
     decay_model_options = ["Exponential Decay", "Linear Decay", "Custom Curve"]
+    fitted_mtime = os.path.getmtime(FITTED_DECAY_PATH) if os.path.exists(FITTED_DECAY_PATH) else None
+    fitted_programme = get_fitted_decay(fitted_mtime).get(tab_name) if fitted_mtime else None
+    if fitted_programme:
+        decay_model_options.append("Fitted Curve")
     default_decay_model = tab_defaults.get("default_decay_model", "Exponential Decay")
 
     # Evidence base text (optional, keep if you want to show it)
@@ -54,7 +65,7 @@ def display_programme_tab(
         options=decay_model_options, 
         index=decay_model_options.index(default_decay_model),
         key=f"decay_model_{tab_name}",
-        help="'Exponential Decay': Benefits reduce by a fixed percentage each period. 'Linear Decay': Benefits reduce by a fixed amount each period until zero. 'Custom Curve': Define your own decay curve by adjusting control points.'"
+        help="'Exponential Decay': Benefits reduce by a fixed percentage each period. 'Linear Decay': Benefits reduce by a fixed amount each period until zero. 'Custom Curve': Define your own decay curve by adjusting control points. 'Fitted Curve': Use a curve fitted to our follow-up data (only shown once decay_fitting.py has been run).'"
     )
 
     timeframe_of_interest_months = DEFAULT_TIMEFRAME_OF_INTEREST_MONTHS
@@ -89,17 +100,26 @@ def display_programme_tab(
         with col2:
             custom_month_sliders['month_6'] = st.slider('Benefit at 6 months (%)', 0.0, 100.0, 50.0, 1.0, key=f"custom_6month_{tab_name}") / 100.0
             custom_month_sliders['month_12'] = st.slider('Benefit at 12 months (%)', 0.0, 100.0, 15.0, 1.0, key=f"custom_12month_{tab_name}") / 100.0
+    elif decay_model == "Fitted Curve":
+        best_form = fitted_programme["best_model"]
+        fitted_form = st.selectbox(
+            "Fitted Decay Form", options=DECAY_FORMS, index=DECAY_FORMS.index(best_form), key=f"fitted_form_{tab_name}",
+            help=f"{best_form} fits the follow-up data best (lowest AIC)."
+        )
     
-    weekly_points_for_calc = display_decay_visualisation(
-        decay_model,
-        annual_decay_rate_input=annual_decay_rate_input,
-        months_to_zero_input=months_to_zero_input,
-        month_3_slider=custom_month_sliders.get('month_3'),
-        month_6_slider=custom_month_sliders.get('month_6'),
-        month_9_slider=custom_month_sliders.get('month_9'),
-        month_12_slider=custom_month_sliders.get('month_12'),
-        timeframe_of_interest_weeks=timeframe_of_interest_weeks
-    )
+    if decay_model == "Fitted Curve":
+        weekly_points_for_calc = display_fitted_decay_visualisation(fitted_form, fitted_programme, timeframe_of_interest_weeks)
+    else:
+        weekly_points_for_calc = display_decay_visualisation(
+            decay_model,
+            annual_decay_rate_input=annual_decay_rate_input,
+            months_to_zero_input=months_to_zero_input,
+            month_3_slider=custom_month_sliders.get('month_3'),
+            month_6_slider=custom_month_sliders.get('month_6'),
+            month_9_slider=custom_month_sliders.get('month_9'),
+            month_12_slider=custom_month_sliders.get('month_12'),
+            timeframe_of_interest_weeks=timeframe_of_interest_weeks
+        )
 
     st.subheader("Wellbeing Impact & Participants")
     # Add explanatory sentence about dropouts
@@ -117,6 +137,9 @@ def display_programme_tab(
         help="Wellbeing score at peak effectiveness, before any decay begins."
     )
     
+    if tab_name in calibrated_programmes and "baseline_wellbeing_score" in calibrated_programmes[tab_name]:
+        st.caption(f"Defaults calibrated from the session logs of {calibrated_programmes[tab_name]['num_wellbeing_pairs']:,} clients who completed the programme.")
+    
     wellbeing_gain = peak_wellbeing - baseline_wellbeing
     # Make the wellbeing gain text larger
     st.markdown(f"<span style='font-size:1.5em'><b>Wellbeing Gain: {wellbeing_gain:.1f} points</b></span>", unsafe_allow_html=True)
@@ -129,6 +152,8 @@ def display_programme_tab(
     retention_rate = st.slider(
         'Retention Rate (%)', 0.0, 100.0, value=tab_defaults["retention"], step=0.1, key=f"retention_rate_{tab_name}"
     ) / 100
+    if tab_name in calibrated_programmes:
+        st.caption(f"Default calibrated from the session logs of {calibrated_programmes[tab_name]['num_clients']:,} clients.")
     # Add explanation and 65% statistic next to retention rate for Bespoke Offering
     if tab_name == "Bespoke Offering":
         st.caption("On average, 65% of clients who do one session will go on to do at least six sessions. Retention rate here means the probability that a participant will complete every session in the programme, given that they attended the first session.")
@@ -152,11 +177,8 @@ def display_programme_tab(
         slider_text = "What percentage of the harm from each case of depression / anxiety is bore by the affected person? (%)"
         caption_condition = "depression / anxiety"
     
-    # Set default harm proportion based on programme type
-    if tab_name == "Procrastination":
-        default_harm_proportion = 50  # 50/50 split for procrastination
-    else:
-        default_harm_proportion = 75  # 75% for other programmes
+    # Default harm proportion is set per programme in config (50/50 split for procrastination)
+    default_harm_proportion = tab_defaults.get("default_harm_proportion", 75)
     
     harm_proportion = st.slider(
         slider_text,
@@ -165,45 +187,26 @@ def display_programme_tab(
     ) / 100.0
     st.caption(f"This means {harm_proportion:.0%} of the total harm from {caption_condition} affects the individual directly, while {(1-harm_proportion):.0%} affects their broader network (friends, family, colleagues, community).")
     
-    sessions_per_participant = tab_defaults["sessions_per_participant"]
-    
-    # Use default number of participants for calculations (will be overridden by overall tab)
-    num_participants = tab_defaults["num_participants"]
-    total_EAs = num_participants
-    overall_retention_rate = retention_rate
-    total_retained_EAs = total_EAs * overall_retention_rate
-    
-    # Calculate initial weekly wellbeing gain (in wellbeing points per week)
-    initial_weekly_wellbeing_gain_per_ea = wellbeing_gain  # The gain is continuous, not just during work hours
-
-    # This calculates GROSS WELLBYs gained per client over the period, before accounting for time spent on intervention
-    gross_wellbys_per_ea_who_completes = calculate_total_wellbys_per_ea(
-        initial_weekly_wellbeing_gain_per_ea=initial_weekly_wellbeing_gain_per_ea,
-        decay_model=decay_model,
-        timeframe_of_interest_weeks=timeframe_of_interest_weeks,
-        working_weeks_per_year=52,  # Default value since we removed the parameter
-        annual_decay_rate=annual_decay_rate_input,
-        months_to_zero=months_to_zero_input,
-        custom_weekly_points=weekly_points_for_calc
-    )
-
-    # Total gross WELLBYs from all clients who are retained
-    gross_wellbys_from_retained = gross_wellbys_per_ea_who_completes * total_retained_EAs
-    
-    # Simplified calculation - no time opportunity costs or disappointment
-    # The main benefit is the wellbeing gain from those who complete the program
-    # Divide by harm proportion to account for broader societal benefits beyond the individual
-    net_wellbys_gained = gross_wellbys_from_retained / harm_proportion
-    
-    # Calculate base cost from sessions (This is now the total direct cost for this programme)
-    base_sessions_cost = sessions_per_participant * cost_per_session_global * total_EAs
-    total_cost = base_sessions_cost # Total cost is now only the direct sessions cost
-
-    cost_per_wellby = total_cost / net_wellbys_gained if net_wellbys_gained > 0 else np.nan
+    # The results come from the model graph, which only recalculates them when these
+    # inputs or the cost per session have changed
+    graph.set(f"programme_inputs/{tab_name}", {
+        "decay_model": decay_model,
+        "annual_decay_rate": annual_decay_rate_input,
+        "months_to_zero": months_to_zero_input,
+        "weekly_points": weekly_points_for_calc,
+        "timeframe_weeks": timeframe_of_interest_weeks,
+        "baseline_wellbeing": baseline_wellbeing,
+        "peak_wellbeing": peak_wellbeing,
+        "retention_rate": retention_rate,
+        "harm_proportion": harm_proportion,
+        "sessions_per_participant": tab_defaults["sessions_per_participant"],
+        # Use default number of participants for calculations (will be overridden by overall tab)
+        "num_participants": tab_defaults["num_participants"]
+    })
+    results = graph.get(f"programme/{tab_name}")
 
-    # Calculate metrics for display
-    net_wellbys_per_retained_client = (net_wellbys_gained / total_retained_EAs) if total_retained_EAs > 0 else 0
-    gross_wellbys_per_retained_client = (gross_wellbys_from_retained / total_retained_EAs) if total_retained_EAs > 0 else 0
+    net_wellbys_per_retained_client = results["Net WELLBYs per Retained Client"]
+    gross_wellbys_per_retained_client = results["Gross WELLBYs per Retained Client"]
     societal_wellbys_per_retained_client = net_wellbys_per_retained_client - gross_wellbys_per_retained_client
 
     # Display the breakdown of WELLBYs per retained client
@@ -233,11 +236,4 @@ def display_programme_tab(
             help="Combined wellbeing benefit including both individual and societal impact per person who completes the programme"
         )
 
-    return {
-        "Total Cost (Money Spent)": total_cost, # This is the direct cost
-        "Net WELLBYs Generated": net_wellbys_gained,
-        "Cost per WELLBY": cost_per_wellby,
-        "Total Clients Seen": total_EAs,
-        "Clients Retained": total_retained_EAs,
-        "Net WELLBYs per Retained Client": net_wellbys_per_retained_client
-    } 
\ No newline at end of file
+    return results
@@ -0,0 +1,181 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+import altair as alt
+from config import (
+    ORGANISATION_FIXED_COSTS,
+    DEFAULT_PROJECTION_YEARS,
+    DEFAULT_SALARY_GROWTH,
+    DEFAULT_BRANCHES_ADDED_PER_YEAR,
+    DEFAULT_OPENING_BALANCE,
+    DEFAULT_MONTHLY_FUNDING
+)
+from projection import core_team_arrays, core_team_table, project_finances, scenario_grid
+from tabs.overall_tab import modelled_num_branches
+
+def display_projection_tab(branch_monthly_cost):
+    st.header("Financial Projection")
+    st.markdown("Project the core team's salaries, the marginal costs of running branches and our funding runway month by month.")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Plan")
+        projection_years = st.slider("Years to project", 1, 10, DEFAULT_PROJECTION_YEARS, 1, key="projection_years")
+        include_optional = st.checkbox("Include optional salaries (e.g. the founder's)", value=True, key="projection_include_optional")
+        salary_growth = st.slider(
+            "Annual salary growth (%)", 0.0, 20.0, DEFAULT_SALARY_GROWTH, 0.5, key="projection_salary_growth",
+            help="Applied once a year to the core team's salaries and to branch running costs."
+        ) / 100.0
+        # Follow the Overall tab's branches until this slider is moved away from them
+        modelled_branches = max(modelled_num_branches(), 1)
+        max_branches = max(20, modelled_branches)
+        previous_default = st.session_state.get("_projection_branches_default")
+        if st.session_state.get("projection_initial_branches", previous_default) == previous_default:
+            st.session_state["projection_initial_branches"] = modelled_branches
+        st.session_state["projection_initial_branches"] = min(st.session_state["projection_initial_branches"], max_branches)
+        st.session_state["_projection_branches_default"] = modelled_branches
+        initial_branches = st.slider(
+            "Branches running today", 1, max_branches, step=1, key="projection_initial_branches",
+            help="Starts at the number of branches on the Overall tab."
+        )
+        branches_added_per_year = st.slider(
+            "Branches opened each year", 0, 10, DEFAULT_BRANCHES_ADDED_PER_YEAR, 1, key="projection_branches_added"
+        )
+
+    with col2:
+        st.subheader("Funding")
+        opening_balance = st.number_input(
+            "Cash in the bank today ($)", min_value=0, value=DEFAULT_OPENING_BALANCE, step=5000, key="projection_opening_balance"
+        )
+        monthly_funding = st.number_input(
+            "Funding received per month ($)", min_value=0, value=DEFAULT_MONTHLY_FUNDING, step=1000, key="projection_monthly_funding"
+        )
+        st.caption(f"Each branch costs ${branch_monthly_cost:,.0f} per month, taken from the Marginal Costs tab.")
+
+        st.markdown("**Range of budget scenarios to compare against the plan:**")
+        salary_growth_range = st.slider(
+            "Salary growth range (%)", 0.0, 20.0, (0.0, 10.0), 0.5, key="projection_growth_range"
+        )
+        branches_added_range = st.slider(
+            "Branches opened each year range", 0, 10, (0, 3), 1, key="projection_added_range"
+        )
+        funding_range = st.slider(
+            "Monthly funding range ($)", 0, 100000, (5000, 30000), 1000, key="projection_funding_range"
+        )
+
+    st.subheader("Core Team")
+    st.markdown("Edit salaries and start months (months from today), or add rows for planned hires.")
+    team = st.data_editor(
+        core_team_table(),
+        num_rows="dynamic",
+        key="projection_team_editor",
+        column_config={
+            "Annual salary ($)": st.column_config.NumberColumn("Annual salary ($)", min_value=0, step=1000, format="$%d"),
+            "Start month": st.column_config.NumberColumn("Start month", min_value=0, step=1),
+            "Optional": st.column_config.CheckboxColumn("Optional", help="Left out when optional salaries are excluded."),
+        },
+        use_container_width=True
+    )
+    try:
+        annual_salaries, start_months = core_team_arrays(include_optional, team)
+    except ValueError as error:
+        st.error(f"The team table has a problem: {error}")
+        annual_salaries, start_months = core_team_arrays(include_optional)
+
+    months = projection_years * 12
+
+    # The plan itself
+    plan = project_finances(
+        annual_salaries, start_months,
+        salary_growth=salary_growth,
+        initial_branches=initial_branches,
+        branches_added_per_year=branches_added_per_year,
+        branch_monthly_cost=branch_monthly_cost,
+        opening_balance=opening_balance,
+        monthly_funding=monthly_funding,
+        months=months
+    )
+
+    # Thousands of alternative budgets, evaluated in one vectorized pass
+    growth_values, added_values, funding_values = scenario_grid(
+        np.linspace(salary_growth_range[0], salary_growth_range[1], 21) / 100.0,
+        np.arange(branches_added_range[0], branches_added_range[1] + 1),
+        np.linspace(funding_range[0], funding_range[1], 51)
+    )
+    scenarios = project_finances(
+        annual_salaries, start_months,
+        salary_growth=growth_values,
+        initial_branches=initial_branches,
+        branches_added_per_year=added_values,
+        branch_monthly_cost=branch_monthly_cost,
+        opening_balance=opening_balance,
+        monthly_funding=funding_values,
+        months=months
+    )
+
+    st.subheader("Plan Outcomes")
+    runway = int(plan["runway_months"][0])
+    metric_col1, metric_col2, metric_col3 = st.columns(3)
+    with metric_col1:
+        st.metric("First-year Fixed Costs", f"${plan['annual_fixed_costs'][0, 0]:,.0f}")
+    with metric_col2:
+        st.metric("Runway", f"{runway} months" if runway < months else f"Beyond {projection_years} years")
+    with metric_col3:
+        survives = (scenarios["runway_months"] >= months).mean()
+        st.metric(
+            "Scenarios Funded Throughout", f"{survives:.0%}",
+            help=f"Share of the {growth_values.size:,} budget scenarios whose balance never goes negative."
+        )
+
+    # Cash balance of the plan against the spread of scenarios
+    balance_percentiles = np.percentile(scenarios["cash_balance"], [10, 50, 90], axis=0)
+    balance_df = pd.DataFrame({
+        'Month': np.arange(1, months + 1),
+        'Plan': plan["cash_balance"][0],
+        'Scenario 10th percentile': balance_percentiles[0],
+        'Scenario median': balance_percentiles[1],
+        'Scenario 90th percentile': balance_percentiles[2]
+    })
+    band = alt.Chart(balance_df).mark_area(opacity=0.2).encode(
+        x=alt.X('Month:Q', title='Month'),
+        y=alt.Y('Scenario 10th percentile:Q', title='Cash Balance ($)'),
+        y2='Scenario 90th percentile:Q'
+    )
+    lines = alt.Chart(balance_df).transform_fold(
+        ['Plan', 'Scenario median'], as_=['Series', 'Cash Balance']
+    ).mark_line().encode(
+        x='Month:Q',
+        y='Cash Balance:Q',
+        color=alt.Color('Series:N', title=None),
+        tooltip=['Month:Q', 'Series:N', alt.Tooltip('Cash Balance:Q', format='$,.0f')]
+    )
+    st.altair_chart((band + lines).properties(title="Cash Balance (band: 10th-90th percentile of scenarios)", height=300), use_container_width=True)
+
+    headcount_df = pd.DataFrame({'Month': np.arange(1, months + 1), 'Core Team': plan["headcount"]})
+    st.altair_chart(alt.Chart(headcount_df).mark_line(interpolate='step-after').encode(
+        x=alt.X('Month:Q', title='Month'),
+        y=alt.Y('Core Team:Q', title='Core Team Headcount', axis=alt.Axis(tickMinStep=1)),
+        tooltip=['Month:Q', 'Core Team:Q']
+    ).properties(title="Core Team Headcount", height=200), use_container_width=True)
+
+    annual_df = pd.DataFrame({
+        'Fixed Costs': plan["annual_fixed_costs"][0],
+        'Branch Marginal Costs': plan["annual_marginal_costs"][0],
+        'Total Costs': plan["annual_total_costs"][0],
+        'Branches (Year End)': plan["branches"][0, 11::12],
+    }, index=[f"Year {year + 1}" for year in range(plan["annual_fixed_costs"].shape[1])])
+    st.dataframe(annual_df.style.format({
+        'Fixed Costs': '${:,.0f}',
+        'Branch Marginal Costs': '${:,.0f}',
+        'Total Costs': '${:,.0f}',
+        'Branches (Year End)': '{:,.0f}'
+    }))
+
+    use_projection = st.checkbox(
+        "Use the plan's first-year fixed costs in the Overall tab",
+        value=False,
+        key="projection_feeds_overall",
+        help=f"Otherwise the Overall tab uses the fixed R&D budget of ${ORGANISATION_FIXED_COSTS:,}."
+    )
+    return float(plan["annual_fixed_costs"][0, 0]) if use_projection else ORGANISATION_FIXED_COSTS
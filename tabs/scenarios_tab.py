@@ -0,0 +1,162 @@
+import streamlit as st
+import pandas as pd
+import altair as alt
+from config import MAX_SCENARIOS
+from jobs import JobQueueFull, get_session_job, start_session_job, display_session_job
+from report import REPORT_FORMATS, is_cached, cached_report, report_file_name, render_reports, zip_reports
+from scenarios import (
+    get_scenario_evaluator,
+    scenario_key,
+    scenarios_to_json,
+    scenarios_from_json,
+    summary_deltas
+)
+
+SUMMARY_FORMATS = {
+    "Total WELLBYs": "{:,.0f}",
+    "Total Marginal Cost": "${:,.0f}",
+    "Marginal Cost per WELLBY": "${:,.2f}",
+    "Overall Total Cost per WELLBY": "${:,.2f}",
+    "Cost per Session": "${:,.2f}",
+}
+
+def _saved_scenarios():
+    return st.session_state.setdefault("saved_scenarios", {})
+
+def _save_current(graph, name):
+    scenarios = _saved_scenarios()
+    if not name:
+        st.warning("Give the scenario a name first.")
+    elif name not in scenarios and len(scenarios) >= MAX_SCENARIOS:
+        st.warning(f"At most {MAX_SCENARIOS} scenarios can be compared; delete one first.")
+    else:
+        scenarios[name] = graph.input_values()
+
+def _display_deltas(results, baseline):
+    deltas = summary_deltas(results, baseline)
+    delta_df = pd.DataFrame.from_dict(deltas, orient="index").drop(index=baseline)
+    if delta_df.empty:
+        return
+    delta_df = delta_df[["Total WELLBYs", "Total Marginal Cost", "Overall Total Cost per WELLBY"]]
+    chart_df = delta_df.reset_index(names="Scenario").melt(id_vars="Scenario", var_name="Metric", value_name="Change")
+    chart = alt.Chart(chart_df).mark_bar().encode(
+        x=alt.X('Change:Q', title=f'Change from {baseline}'),
+        y=alt.Y('Scenario:N', sort=list(delta_df.index), title=None),
+        color=alt.condition(alt.datum.Change > 0, alt.value('#2ca02c'), alt.value('#d62728')),
+        tooltip=['Scenario', 'Metric', alt.Tooltip('Change:Q', format=',.2f')]
+    ).properties(width=260, height=max(80, 30 * len(delta_df))).facet(
+        column=alt.Column('Metric:N', title=None, sort=["Total WELLBYs", "Total Marginal Cost", "Overall Total Cost per WELLBY"])
+    ).resolve_scale(x='independent')
+    st.altair_chart(chart)
+    st.caption("Green is an increase and red a decrease; for cost per WELLBY, lower is better.")
+
+def _report_job(job, scenarios, report_format):
+    job.report(0.0, f"Rendering {len(scenarios)} report(s)...")
+    files = render_reports(scenarios, report_format, report=job.report)
+    return next(iter(files.values())) if len(files) == 1 else zip_reports(files)
+
+def _display_report_download(job_name, scenarios, report_format, file_name, label):
+    """A download button for the reports of `scenarios`, rendering them in the background first if needed."""
+    mime = REPORT_FORMATS[report_format] if len(scenarios) == 1 else "application/zip"
+    if len(scenarios) == 1:
+        (name, inputs), = scenarios.items()
+        report = cached_report(name, inputs, report_format)
+        if report is not None:
+            st.download_button(f"Download {label}", report, file_name=file_name, mime=mime, key=f"{job_name}_download")
+            return
+
+    job_inputs = {"scenarios": {name: scenario_key(inputs) for name, inputs in scenarios.items()}, "format": report_format}
+    job = get_session_job(job_name, job_inputs)
+    if job is not None and job.status == "done":
+        st.download_button(f"Download {label}", job.result, file_name=file_name, mime=mime, key=f"{job_name}_download")
+        return
+    num_cached = sum(is_cached(name, inputs, report_format) for name, inputs in scenarios.items())
+    if len(scenarios) > 1:
+        st.caption(f"{num_cached} of {len(scenarios)} reports already rendered.")
+    if st.button(f"Prepare {label}", key=f"{job_name}_prepare", disabled=job is not None and not job.finished):
+        try:
+            start_session_job(job_name, job_inputs, _report_job, scenarios, report_format)
+        except JobQueueFull as error:
+            st.warning(str(error))
+    display_session_job(job_name)
+
+def _display_funder_report(graph, name):
+    st.subheader("Funder Report")
+    st.markdown("""
+    A report of a scenario for funders: the cost per session, each programme's inputs, results and decay curve,
+    and the scaled results including fixed costs (and by country, for a branch table). HTML reports open in any
+    browser; PDFs are for printing. Reports are rendered in the background and kept on the server, so downloading
+    the same scenario again is instant.
+    """)
+    report_format = st.radio("Format", list(REPORT_FORMATS), format_func=str.upper, horizontal=True, key="report_format")
+    report_name = name or "Current inputs"
+    _display_report_download(
+        "report_current", {report_name: graph.input_values()}, report_format,
+        report_file_name(report_name, report_format), "report of the current inputs"
+    )
+    scenarios = _saved_scenarios()
+    if scenarios:
+        _display_report_download(
+            "report_saved", dict(scenarios), report_format,
+            f"scenario_reports_{report_format}.zip", "reports of all saved scenarios"
+        )
+
+def display_scenarios_tab(graph):
+    st.header("Scenario Comparison")
+    st.markdown(f"""
+    Save the current inputs of every tab as a named scenario, change some sliders, and save again to compare
+    up to {MAX_SCENARIOS} scenarios side by side. Scenarios only last for this session, so download them to keep or share them.
+    """)
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        name = st.text_input("Scenario name", key="scenario_name", placeholder="e.g. 5 branches, insomnia-heavy mix")
+    with col2:
+        st.write("")
+        st.write("")
+        if st.button("Save current inputs", key="scenario_save"):
+            _save_current(graph, name.strip())
+
+    scenarios = _saved_scenarios()
+    with st.expander("Manage scenarios"):
+        to_delete = st.multiselect("Delete scenarios", list(scenarios), key="scenario_delete")
+        if to_delete and st.button("Delete selected", key="scenario_delete_button"):
+            for scenario_name in to_delete:
+                scenarios.pop(scenario_name, None)
+            st.rerun()
+        st.download_button("Download scenarios", scenarios_to_json(scenarios), file_name="scenarios.json",
+                           mime="application/json", disabled=not scenarios)
+        uploaded = st.file_uploader("Load scenarios", type="json", key="scenario_upload")
+        # Apply each upload once, so deleted or re-saved scenarios aren't replaced on every rerun
+        if uploaded is not None and st.session_state.get("_scenario_upload_id") != uploaded.file_id:
+            try:
+                loaded = scenarios_from_json(uploaded.getvalue().decode("utf-8"))
+            except ValueError as error:
+                st.error(f"Could not load scenarios: {error}")
+            else:
+                scenarios.update(dict(list(loaded.items())[:max(0, MAX_SCENARIOS - len(scenarios))]))
+                st.session_state["_scenario_upload_id"] = uploaded.file_id
+
+    _display_funder_report(graph, name.strip())
+
+    if len(scenarios) < 2:
+        st.info("Save at least two scenarios to compare them.")
+        return
+
+    results, num_evaluated = get_scenario_evaluator().evaluate(scenarios)
+    st.caption(f"{num_evaluated} scenario(s) evaluated, {len(scenarios) - num_evaluated} reused from the cache.")
+
+    st.subheader("Portfolio Totals")
+    summary_df = pd.DataFrame({scenario_name: result["summary"] for scenario_name, result in results.items()}).T
+    st.dataframe(summary_df.style.format(SUMMARY_FORMATS, na_rep="N/A"))
+
+    st.subheader("Total Cost per WELLBY by Programme")
+    programme_df = pd.DataFrame({
+        scenario_name: {programme: metrics["Total Cost per WELLBY"] for programme, metrics in result["programmes"].items()}
+        for scenario_name, result in results.items()
+    }).T
+    st.dataframe(programme_df.style.format("${:,.2f}", na_rep="N/A"))
+
+    st.subheader("Changes from a Baseline")
+    baseline = st.selectbox("Baseline scenario", list(results), key="scenario_baseline")
+    _display_deltas(results, baseline)
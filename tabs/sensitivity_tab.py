@@ -0,0 +1,122 @@
+import streamlit as st
+import altair as alt
+import pandas as pd
+from gradients import scenario_gradients, input_label
+from jobs import JobQueueFull, get_session_job, start_session_job, display_session_job
+from sensitivity import sobol_indices
+from uncertainty import programme_parameter_space, overall_parameter_space, evaluate_programme, evaluate_overall
+
+OVERALL_TARGET = "Overall (Total Cost per WELLBY)"
+
+def _sobol_job(job, target, space, num_samples):
+    if target == OVERALL_TARGET:
+        def model(values):
+            return evaluate_overall(values)["Overall Total Cost per WELLBY"]
+    else:
+        def model(values):
+            return evaluate_programme(values, target)["Cost per WELLBY"]
+    return sobol_indices(model, space, num_samples, report=job.report)
+
+def _display_indices_chart(table):
+    chart_df = table[["First-order", "Total-effect"]].reset_index(names="Input").melt(
+        id_vars="Input", var_name="Index", value_name="Value"
+    )
+    chart = alt.Chart(chart_df).mark_bar().encode(
+        y=alt.Y('Input:N', sort=list(table.sort_values("Total-effect", ascending=False).index), title=None),
+        x=alt.X('Value:Q', title='Share of variance in cost per WELLBY'),
+        color=alt.Color('Index:N', title=None),
+        yOffset='Index:N',
+        tooltip=['Input', 'Index', alt.Tooltip('Value:Q', format='.3f')]
+    ).properties(height=max(200, 40 * len(table)))
+    st.altair_chart(chart, use_container_width=True)
+
+def _display_local_sensitivity(graph, target):
+    st.subheader("Local Sensitivity")
+    st.markdown("""
+    How cost per WELLBY responds to a small change in each input at its current value, from exact derivatives of the model.
+    The **elasticity** is the % change in cost per WELLBY for a 1% increase in the input, so inputs in different units can be compared.
+    """)
+    scenario_inputs = graph.input_values()
+    gradients = scenario_gradients(scenario_inputs)
+    result = gradients["overall"] if target == OVERALL_TARGET else gradients["programmes"][target]
+    # Capacity per branch is fixed in the app, and the cost per session follows the staffing inputs unless it is overridden
+    hidden = {"coaches_per_cohort", "clients_per_coach"}
+    if scenario_inputs.get("cost_per_session_override") is None:
+        hidden.add("cost_per_session")
+    table = pd.DataFrame({
+        "Input": [input_label(name) for name in result["gradient"] if name not in hidden],
+        "Current value": [float(result["inputs"][name]) for name in result["gradient"] if name not in hidden],
+        "Derivative": [float(value) for name, value in result["gradient"].items() if name not in hidden],
+        "Elasticity": [float(result["elasticity"][name]) for name in result["gradient"] if name not in hidden],
+    }).set_index("Input")
+    table = table.reindex(table["Elasticity"].abs().sort_values(ascending=False).index)
+
+    chart = alt.Chart(table.reset_index()).mark_bar().encode(
+        y=alt.Y('Input:N', sort=list(table.index), title=None),
+        x=alt.X('Elasticity:Q', title='% change in cost per WELLBY per 1% increase'),
+        color=alt.condition(alt.datum.Elasticity > 0, alt.value('#d62728'), alt.value('#2ca02c')),
+        tooltip=['Input', alt.Tooltip('Elasticity:Q', format='.3f'), alt.Tooltip('Derivative:Q', format='.4g')]
+    ).properties(height=max(200, 22 * len(table)))
+    st.altair_chart(chart, use_container_width=True)
+    st.dataframe(table.style.format({"Current value": "{:,.4g}", "Derivative": "{:,.4g}", "Elasticity": "{:.3f}"}))
+    caption = (f"Cost per WELLBY at the current inputs: ${float(result['cost_per_wellby']):,.2f}. "
+               "Red inputs raise cost per WELLBY as they increase, green ones lower it.")
+    if target == OVERALL_TARGET:
+        caption += (" Clients seen are rounded down in the Overall tab, so for the client shares and number of branches"
+                    " these are the slopes of the trend rather than of each step.")
+    st.caption(caption)
+
+def display_sensitivity_tab(offering_results, overall_results, graph):
+    st.header("Global Sensitivity")
+    st.markdown("""
+    Which inputs drive the uncertainty in cost per WELLBY? Each input is varied across its plausible range
+    (peaking at its current slider value) and the variance of cost per WELLBY is split between them.
+
+    - **First-order index:** share of the variance explained by that input on its own.
+    - **Total-effect index:** share explained by the input including its interactions with others
+      (e.g. retention together with harm proportion). A large gap between the two means the input matters through interactions.
+    """)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        target = st.selectbox("Output to analyse", list(offering_results.keys()) + [OVERALL_TARGET], key="sobol_target")
+    with col2:
+        num_samples = st.select_slider(
+            "Base sample size", options=[2 ** power for power in range(12, 21)], value=2 ** 15, key="sobol_samples",
+            help="The model is evaluated base sample size x (number of inputs + 2) times."
+        )
+
+    use_trial_evidence = st.checkbox("Update inputs with trial evidence", value=False, key="sobol_trial_evidence")
+    programme_inputs = {name: results.get("Inputs") for name, results in offering_results.items()}
+    if target == OVERALL_TARGET:
+        space = overall_parameter_space(programme_inputs, overall_results, use_trial_evidence=use_trial_evidence)
+    else:
+        space = programme_parameter_space(target, programme_inputs.get(target), use_trial_evidence=use_trial_evidence)
+    st.caption(f"{len(space)} inputs, {num_samples * (len(space) + 2):,} model evaluations. "
+               "Non-exponential decay models are analysed at their programme's default decay rate.")
+
+    # Changing any slider changes the inputs, which cancels a stale analysis
+    job_inputs = {"target": target, "num_samples": num_samples, "space": space}
+    job = get_session_job("sobol", job_inputs)
+    if st.button("Run sensitivity analysis", key="sobol_run", disabled=job is not None and not job.finished):
+        try:
+            start_session_job("sobol", job_inputs, _sobol_job, target, space, num_samples)
+        except JobQueueFull as error:
+            st.warning(str(error))
+
+    def render_partial(partial_table):
+        st.caption("Estimates so far:")
+        _display_indices_chart(partial_table)
+
+    job = display_session_job("sobol", render_partial=render_partial)
+    if job is not None and job.status == "done":
+        table, info = job.result
+        _display_indices_chart(table)
+        st.dataframe(table.sort_values("Total-effect", ascending=False).style.format("{:.3f}"))
+        st.caption(
+            f"{info['model_evaluations']:,} model evaluations in {info['seconds']:.1f}s. "
+            f"Intervals are 95% bootstrap confidence intervals."
+            + (f" {info['rows_dropped']:,} samples with no wellbeing gain were left out." if info["rows_dropped"] else "")
+        )
+
+    _display_local_sensitivity(graph, target)
@@ -0,0 +1,172 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+import altair as alt
+from uncertainty import SAMPLING_METHODS, overall_parameter_space, sample_values, acceptability_curves
+from value_of_information import value_of_information
+from convergence import OVERALL_TARGET, estimate_to_precision
+
+@st.cache_data(max_entries=20)
+def compute_acceptability_curves(space, num_samples, max_threshold, num_thresholds, method="random"):
+    values = sample_values(space, num_samples, method=method)
+    thresholds = np.linspace(0, max_threshold, num_thresholds)
+    return thresholds, acceptability_curves(values, thresholds)
+
+@st.cache_data(max_entries=20)
+def compute_value_of_information(space, num_samples, budget, method="random"):
+    return value_of_information(sample_values(space, num_samples, method=method), space, budget)
+
+@st.cache_data(max_entries=20)
+def compute_estimates(space, target, method, use_control, target_relative_se, max_samples):
+    return estimate_to_precision(
+        space, target, method=method, use_control=use_control, target_relative_se=target_relative_se, max_samples=max_samples
+    )
+
+def _control_note(se_reduction):
+    if se_reduction > 0:
+        return f"The control variate cut the standard error of the mean by {se_reduction:.0%}. "
+    return "The control variate was left out of the mean because it did not reduce the spread between batches. "
+
+def _display_precision(space, programmes, method):
+    st.subheader("Cost per WELLBY to a Target Precision")
+    st.markdown("""
+    The mean and percentiles of cost per WELLBY, sampled in independent batches until the standard error of every
+    estimate is below the target. The **control variate** corrects the mean using how far each batch's inputs
+    happen to fall from their expected values, which removes most of the noise of random draws. It is only
+    applied when it narrows the spread between batches.
+    """)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        target = st.selectbox("Output", programmes + [OVERALL_TARGET], index=len(programmes), key="precision_target")
+    with col2:
+        target_relative_se = st.select_slider(
+            "Target relative standard error", options=[0.02, 0.01, 0.005, 0.002, 0.001], value=0.005,
+            format_func=lambda value: f"{value:.1%}", key="precision_target_se"
+        )
+    with col3:
+        max_samples = st.select_slider(
+            "Sample budget", options=[2 ** power for power in range(16, 23)], value=2 ** 20, format_func=lambda value: f"{value:,}",
+            key="precision_max_samples"
+        )
+    use_control = st.checkbox("Use control variate for the mean", value=True, key="precision_control")
+
+    # The space of one programme is the Overall space without the mix, branches and fixed costs
+    if target != OVERALL_TARGET:
+        space = [parameter for parameter in space if parameter["name"].startswith(f"{target}/") or parameter["name"] == "cost_per_session"]
+    result = compute_estimates(space, target, method, use_control, target_relative_se, max_samples)
+    st.dataframe(result["table"].style.format({"Estimate": "${:,.2f}", "Standard error": "${:,.3f}", "Relative SE": "{:.2%}"}))
+    status = "Reached" if result["converged"] else "Did not reach"
+    st.caption(
+        f"{status} the target with {result['num_samples']:,} samples ({result['replicates']} batches of "
+        f"{result['num_samples'] // result['replicates']:,}) in {result['seconds']:.1f}s. "
+        + (_control_note(result["control_se_reduction"]) if use_control else "")
+        + "Samples with no WELLBYs count as infinitely expensive in the percentiles and are left out of the mean."
+    )
+
+def _display_posteriors(space):
+    posterior_df = pd.DataFrame([
+        {"Input": parameter["label"], "Posterior mean": parameter["mode"],
+         "99% interval low": parameter["low"], "99% interval high": parameter["high"]}
+        for parameter in space if "posterior" in parameter
+    ])
+    if not posterior_df.empty:
+        st.dataframe(posterior_df.set_index("Input").style.format("{:.2f}"))
+        st.caption("Priors are the input ranges centred on the current sliders; see trial_summaries in config.py for the trial data.")
+
+def display_uncertainty_tab(offering_results, overall_results):
+    st.header("Uncertainty")
+    st.markdown("""
+    Funders compare us against thresholds such as "$X per WELLBY". Every programme input is uncertain, so we
+    sample all of them together (each across its plausible range, peaking at its current slider value) and show
+    the probability that cost per WELLBY beats each threshold.
+    """)
+
+    method = st.selectbox(
+        "Sampling design", list(SAMPLING_METHODS), index=list(SAMPLING_METHODS).index("sobol"),
+        format_func=SAMPLING_METHODS.get, key="sampling_method",
+        help="Latin hypercube and scrambled Sobol designs spread the draws evenly across the inputs, so estimates settle "
+             "with far fewer samples than random draws. Antithetic pairs mirror each draw."
+    )
+
+    st.subheader("Cost-effectiveness Acceptability Curves")
+    col1, col2 = st.columns(2)
+    with col1:
+        max_threshold = st.slider("Highest threshold ($ per WELLBY)", 10, 500, 100, 10, key="ceac_max_threshold")
+    with col2:
+        num_samples = st.select_slider(
+            "Samples", options=[1024, 4096, 16384, 65536, 131072], value=16384, key="ceac_samples"
+        )
+
+    use_trial_evidence = st.checkbox(
+        "Update inputs with trial evidence", value=False, key="use_trial_evidence",
+        help="Programmes with trial results sample retention and wellbeing gain from their Bayesian posterior."
+    )
+    programme_inputs = {name: results.get("Inputs") for name, results in offering_results.items()}
+    space = overall_parameter_space(programme_inputs, overall_results, use_trial_evidence=use_trial_evidence)
+    if use_trial_evidence:
+        _display_posteriors(space)
+    thresholds, curves = compute_acceptability_curves(space, num_samples, max_threshold, 400, method)
+
+    curve_df = pd.DataFrame({"Threshold": thresholds, **curves}).melt(
+        id_vars="Threshold", var_name="Programme", value_name="Probability"
+    )
+    chart = alt.Chart(curve_df).mark_line().encode(
+        x=alt.X('Threshold:Q', title='Cost-effectiveness threshold ($ per WELLBY)'),
+        y=alt.Y('Probability:Q', title='Probability cost per WELLBY is below threshold', scale=alt.Scale(domain=[0, 1]), axis=alt.Axis(format='%')),
+        color=alt.Color('Programme:N', title=None),
+        tooltip=['Programme', alt.Tooltip('Threshold:Q', format='$,.0f'), alt.Tooltip('Probability:Q', format='.0%')]
+    ).properties(height=350)
+    st.altair_chart(chart, use_container_width=True)
+
+    threshold = st.number_input(
+        "Probability of beating a threshold of ($ per WELLBY)", min_value=0.0, max_value=float(max_threshold),
+        value=float(min(50, max_threshold)), step=5.0, key="ceac_threshold"
+    )
+    threshold_index = int(np.searchsorted(thresholds, threshold))
+    threshold_index = min(threshold_index, len(thresholds) - 1)
+    metric_columns = st.columns(len(curves))
+    for column, (name, curve) in zip(metric_columns, curves.items()):
+        with column:
+            st.metric(name, f"{curve[threshold_index]:.0%}")
+    st.caption(f"Based on {num_samples:,} joint draws of the programme, marginal cost and Overall inputs. "
+               "Non-exponential decay models are sampled at their programme's default decay rate.")
+
+    _display_precision(space, list(offering_results), method)
+
+    st.subheader("Value of Information")
+    st.markdown("""
+    If we knew every input exactly, would we fund a different programme? The **expected value of perfect
+    information (EVPI)** is how many more WELLBYs the next budget would buy, on average, if all uncertainty were
+    resolved before choosing between the programmes and the current mix. The **EVPPI** of an input is the same
+    gain from learning that input alone - an upper bound on what a study measuring it (e.g. an RCT of one
+    programme's retention or wellbeing gain) is worth.
+    """)
+    col1, col2 = st.columns(2)
+    with col1:
+        budget = st.number_input("Budget to allocate ($)", min_value=1000, value=100000, step=10000, key="voi_budget")
+    with col2:
+        wellby_value = st.number_input("Value of one WELLBY ($)", min_value=0.0, value=100.0, step=10.0, key="voi_wellby_value",
+                                       help="Converts WELLBYs into dollars, e.g. the threshold a funder would pay per WELLBY.")
+
+    voi = compute_value_of_information(space, num_samples, budget, method)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Best option on current evidence", voi["best_option"])
+    with col2:
+        st.metric("EVPI (WELLBYs)", f"{voi['evpi']:,.0f}")
+    with col3:
+        st.metric("EVPI ($)", f"${voi['evpi'] * wellby_value:,.0f}")
+
+    st.dataframe(voi["options"].to_frame().style.format("{:,.0f}"))
+
+    evppi_df = voi["evppi"].reset_index()
+    evppi_df.columns = ["Input", "EVPPI"]
+    evppi_df["EVPPI ($)"] = evppi_df["EVPPI"] * wellby_value
+    chart = alt.Chart(evppi_df).mark_bar().encode(
+        y=alt.Y('Input:N', sort=list(evppi_df["Input"]), title=None),
+        x=alt.X('EVPPI:Q', title=f'Expected WELLBYs gained per ${budget:,} by learning the input'),
+        tooltip=['Input', alt.Tooltip('EVPPI:Q', format=',.0f'), alt.Tooltip('EVPPI ($):Q', format='$,.0f')]
+    ).properties(height=max(200, 20 * len(evppi_df)))
+    st.altair_chart(chart, use_container_width=True)
+    st.caption("EVPPI is estimated by regressing each option's WELLBYs on one input at a time (a non-nested "
+               "estimator), so inputs that cannot change the decision may show small non-zero values from noise.")
@@ -0,0 +1,314 @@
+"""
+Parameter spaces for the sampling-based analyses.
+
+A parameter space is a list of inputs, each with a (low, mode, high) triangular
+distribution: the ranges come from config and the mode is the input's current slider
+value. Unit-cube samples (random or quasi-random) are mapped onto the inputs with the
+triangular inverse CDF and evaluated with the vectorized model in model.py.
+
+With trial evidence switched on, inputs measured by a trial (see bayes.py) follow their
+posterior instead, and the baseline and peak wellbeing of that programme are replaced by
+a single wellbeing gain.
+"""
+import numpy as np
+from scipy.stats import qmc
+
+from config import (
+    offerings,
+    programme_input_ranges,
+    cost_per_session_range,
+    overall_input_ranges,
+    DEFAULT_COST_PER_SESSION,
+    DEFAULT_COACHES_PER_COHORT,
+    DEFAULT_CLIENTS_PER_COACH,
+    DEFAULT_NUM_BRANCHES,
+    ORGANISATION_FIXED_COSTS
+)
+from model import programme_outcomes, overall_outcomes, clients_per_branch_per_year
+from bayes import QUANTILE_GRID, programme_posteriors, triangular_moments, inverse_cdf_table, draw_from_unit
+
+INPUT_LABELS = {
+    "retention_rate": "Retention rate",
+    "baseline_wellbeing": "Baseline wellbeing",
+    "peak_wellbeing": "Peak wellbeing",
+    "wellbeing_gain": "Wellbeing gain",
+    "annual_decay_rate": "Annual decay rate",
+    "months_to_zero": "Months to zero",
+    "harm_proportion": "Harm proportion",
+    "sessions_per_participant": "Sessions per participant",
+    "cost_per_session": "Cost per session",
+    "num_branches": "Number of branches",
+    "fixed_costs": "Fixed costs",
+    "client_share": "Client share",
+}
+
+# Default overall slider values, as in the Overall tab
+DEFAULT_CLIENT_SHARES = {programme: defaults["default_client_share"] for programme, defaults in offerings.items()}
+
+
+def programme_default_inputs(programme):
+    """The programme tab's default slider values, in model units."""
+    defaults = offerings[programme]
+    return {
+        "retention_rate": defaults["retention"] / 100.0,
+        "baseline_wellbeing": defaults["baseline_wellbeing_score"],
+        "peak_wellbeing": defaults["peak_wellbeing_score"],
+        "annual_decay_rate": defaults["default_decay_rate"] / 100.0,
+        "harm_proportion": defaults.get("default_harm_proportion", 75) / 100.0,
+        "sessions_per_participant": defaults["sessions_per_participant"],
+        "cost_per_session": DEFAULT_COST_PER_SESSION,
+    }
+
+
+def _parameter(name, label, low, mode, high):
+    # Widen the range if the current value has been moved outside it
+    low, high = min(low, mode), max(high, mode)
+    return {"name": name, "label": label, "low": float(low), "mode": float(mode), "high": float(high)}
+
+
+def _current_value(current_inputs, name, default):
+    value = (current_inputs or {}).get(name)
+    return default if value is None else value
+
+
+def _posterior_parameter(name, label, posterior):
+    return {
+        "name": name, "label": label,
+        "low": posterior["low"], "mode": posterior["mean"], "high": posterior["high"],
+        "posterior": {"distribution": posterior["distribution"], "params": posterior["params"]},
+    }
+
+
+def programme_parameter_space(programme, current_inputs=None, include_cost_per_session=True, use_trial_evidence=False):
+    """Uncertain inputs of one programme; `current_inputs` is the tab's "Inputs" dict."""
+    defaults = programme_default_inputs(programme)
+    space = [
+        _parameter(
+            f"{programme}/{name}", f"{programme}: {INPUT_LABELS[name]}",
+            low, _current_value(current_inputs, name, defaults[name]), high
+        )
+        for name, (low, high) in programme_input_ranges[programme].items()
+    ]
+    if use_trial_evidence:
+        space = _apply_trial_evidence(programme, space)
+    if include_cost_per_session:
+        space.append(_parameter(
+            "cost_per_session", INPUT_LABELS["cost_per_session"],
+            cost_per_session_range[0], _current_value(current_inputs, "cost_per_session", DEFAULT_COST_PER_SESSION), cost_per_session_range[1]
+        ))
+    return space
+
+
+def _apply_trial_evidence(programme, space):
+    by_name = {parameter["name"].split("/", 1)[1]: parameter for parameter in space}
+    retention = by_name["retention_rate"]
+    baseline, peak = by_name["baseline_wellbeing"], by_name["peak_wellbeing"]
+    baseline_mean, baseline_variance = triangular_moments(baseline["low"], baseline["mode"], baseline["high"])
+    peak_mean, peak_variance = triangular_moments(peak["low"], peak["mode"], peak["high"])
+    # The gain prior is centred on the current sliders, with the spread of both triangles
+    posteriors = programme_posteriors(
+        programme,
+        (retention["low"], retention["mode"], retention["high"]),
+        (peak["mode"] - baseline["mode"], baseline_variance + peak_variance)
+    )
+    if not posteriors:
+        return space
+    updated = []
+    for parameter in space:
+        name = parameter["name"].split("/", 1)[1]
+        if name == "retention_rate":
+            updated.append(_posterior_parameter(parameter["name"], parameter["label"], posteriors["retention_rate"]))
+        elif name == "baseline_wellbeing":
+            updated.append(_posterior_parameter(
+                f"{programme}/wellbeing_gain", f"{programme}: {INPUT_LABELS['wellbeing_gain']}", posteriors["wellbeing_gain"]
+            ))
+        elif name != "peak_wellbeing":
+            updated.append(parameter)
+    return updated
+
+
+def overall_parameter_space(programme_inputs=None, overall_inputs=None, use_trial_evidence=False):
+    """
+    Uncertain inputs of the Overall tab: every programme's inputs plus the mix and branches.
+
+    `programme_inputs` maps programme name to its "Inputs" dict; `overall_inputs` is the
+    dict returned by the Overall tab.
+    """
+    programme_inputs = programme_inputs or {}
+    overall_inputs = overall_inputs or {}
+    space = []
+    for programme in programme_input_ranges:
+        space += programme_parameter_space(
+            programme, programme_inputs.get(programme), include_cost_per_session=False, use_trial_evidence=use_trial_evidence
+        )
+    any_inputs = next(iter(programme_inputs.values()), None)
+    space.append(_parameter(
+        "cost_per_session", INPUT_LABELS["cost_per_session"],
+        cost_per_session_range[0], _current_value(any_inputs, "cost_per_session", DEFAULT_COST_PER_SESSION), cost_per_session_range[1]
+    ))
+    low, high = overall_input_ranges["num_branches"]
+    space.append(_parameter(
+        "num_branches", INPUT_LABELS["num_branches"], low, overall_inputs.get("Number of Branches", DEFAULT_NUM_BRANCHES), high
+    ))
+    low, high = overall_input_ranges["fixed_costs"]
+    space.append(_parameter(
+        "fixed_costs", INPUT_LABELS["fixed_costs"], low, overall_inputs.get("Fixed Costs", ORGANISATION_FIXED_COSTS), high
+    ))
+    current_shares = overall_inputs.get("Client Distribution (%)", DEFAULT_CLIENT_SHARES)
+    for programme, (low, high) in overall_input_ranges["client_share"].items():
+        space.append(_parameter(
+            f"client_share/{programme}", f"{programme}: {INPUT_LABELS['client_share']}",
+            low, current_shares.get(programme, DEFAULT_CLIENT_SHARES[programme]), high
+        ))
+    return space
+
+
+def values_from_unit(unit_samples, space):
+    """Map (N, d) samples in [0, 1) onto the inputs with the triangular inverse CDF."""
+    unit_samples = np.asarray(unit_samples, dtype=float)
+    values = {}
+    for column, parameter in enumerate(space):
+        low, mode, high = parameter["low"], parameter["mode"], parameter["high"]
+        u = unit_samples[:, column]
+        if "posterior" in parameter:
+            values[parameter["name"]] = draw_from_unit(u, parameter["posterior"])
+            continue
+        width = high - low
+        if width <= 0:
+            values[parameter["name"]] = np.full(u.shape, mode)
+            continue
+        peak = (mode - low) / width
+        values[parameter["name"]] = np.where(
+            u < peak,
+            low + np.sqrt(u * width * (mode - low)),
+            high - np.sqrt((1 - u) * width * (high - mode))
+        )
+    return values
+
+
+def point_values(space):
+    """Each input at its current (mode) value, as length-1 arrays."""
+    return {parameter["name"]: np.array([parameter["mode"]]) for parameter in space}
+
+
+def _programme_value(values, programme, name):
+    return values[f"{programme}/{name}"]
+
+
+def _wellbeing_gain(values, programme):
+    if f"{programme}/wellbeing_gain" in values:
+        return _programme_value(values, programme, "wellbeing_gain")
+    return _programme_value(values, programme, "peak_wellbeing") - _programme_value(values, programme, "baseline_wellbeing")
+
+
+def evaluate_programme(values, programme):
+    """Programme results for sampled `values` (as produced by values_from_unit)."""
+    return programme_outcomes(
+        retention_rate=_programme_value(values, programme, "retention_rate"),
+        wellbeing_gain=_wellbeing_gain(values, programme),
+        annual_decay_rate=_programme_value(values, programme, "annual_decay_rate"),
+        harm_proportion=_programme_value(values, programme, "harm_proportion"),
+        cost_per_session=values["cost_per_session"],
+        sessions_per_participant=_programme_value(values, programme, "sessions_per_participant"),
+        num_participants=offerings[programme]["num_participants"]
+    )
+
+
+def evaluate_overall(values, programmes=None):
+    """Overall tab results for sampled `values`, with programmes on the first axis."""
+    programmes = programmes or list(programme_input_ranges)
+    per_programme = [evaluate_programme(values, programme) for programme in programmes]
+    num_participants = np.array([offerings[programme]["num_participants"] for programme in programmes], dtype=float)[:, None]
+    cost_per_client = np.stack([np.broadcast_to(results["Total Cost (Money Spent)"], values["num_branches"].shape) for results in per_programme]) / num_participants
+    wellbys_per_client = np.stack([results["Net WELLBYs Generated"] for results in per_programme]) / num_participants
+    retained_per_client = np.stack([results["Clients Retained"] for results in per_programme]) / num_participants
+    client_shares = np.stack([values[f"client_share/{programme}"] for programme in programmes])
+    return overall_outcomes(
+        cost_per_client, wellbys_per_client, retained_per_client, client_shares,
+        # The branches slider only takes whole numbers
+        num_branches=np.round(values["num_branches"]),
+        fixed_costs=values["fixed_costs"],
+        branch_clients_per_year=clients_per_branch_per_year(DEFAULT_COACHES_PER_COHORT, DEFAULT_CLIENTS_PER_COACH)
+    )
+
+
+def input_means(space):
+    """Expected value of every input in `space` under its sampling distribution."""
+    means = {}
+    for parameter in space:
+        if "posterior" in parameter:
+            posterior = parameter["posterior"]
+            table = inverse_cdf_table(posterior["distribution"], posterior["params"][0], posterior["params"][1])
+            # Draws interpolate the quantile table linearly, so their mean is its integral
+            means[parameter["name"]] = float(np.trapezoid(table, QUANTILE_GRID))
+        elif parameter["high"] > parameter["low"]:
+            means[parameter["name"]] = (parameter["low"] + parameter["mode"] + parameter["high"]) / 3
+        else:
+            means[parameter["name"]] = parameter["mode"]
+    return means
+
+
+# Designs for the unit-cube samples. Random sampling converges as 1/sqrt(N); the
+# others spread the draws more evenly and usually need far fewer for the same precision.
+SAMPLING_METHODS = {
+    "random": "Random",
+    "antithetic": "Antithetic pairs",
+    "latin_hypercube": "Latin hypercube",
+    "sobol": "Scrambled Sobol",
+}
+
+
+def unit_samples(num_samples, dimensions, method="random", seed=0):
+    """
+    (num_samples, dimensions) points in [0, 1) from one of SAMPLING_METHODS.
+
+    Each seed gives an independent randomisation of the design, so repeating a design
+    with different seeds gives independent estimates to compute standard errors from.
+    Sobol designs are best used with a power-of-2 number of samples.
+    """
+    rng = np.random.default_rng(seed)
+    if method == "random":
+        return rng.random((num_samples, dimensions))
+    if method == "antithetic":
+        # Each draw u is paired with 1 - u, which mirrors it in every input
+        half = rng.random(((num_samples + 1) // 2, dimensions))
+        return np.concatenate([half, 1.0 - half])[:num_samples]
+    if method == "latin_hypercube":
+        return qmc.LatinHypercube(dimensions, seed=rng).random(num_samples)
+    if method == "sobol":
+        sampler = qmc.Sobol(dimensions, scramble=True, seed=rng)
+        if num_samples & (num_samples - 1) == 0:
+            return sampler.random_base2(int(np.log2(num_samples)))
+        return sampler.random(num_samples)
+    raise ValueError(f"Unknown sampling method {method!r}; expected one of {list(SAMPLING_METHODS)}")
+
+
+def sample_values(space, num_samples, seed=0, method="random"):
+    """Draws of every input in `space`, from one of SAMPLING_METHODS."""
+    return values_from_unit(unit_samples(num_samples, len(space), method, seed), space)
+
+
+def acceptability_curve(cost_per_wellby_samples, thresholds):
+    """
+    Probability that cost per WELLBY is at or below each threshold.
+
+    One sort of the samples and one searchsorted pass over the thresholds, so the
+    cost is O((samples + thresholds) log samples) however many thresholds there are.
+    Samples with no WELLBYs (NaN) never beat a threshold.
+    """
+    samples = np.asarray(cost_per_wellby_samples, dtype=float)
+    sorted_samples = np.sort(np.where(np.isfinite(samples), samples, np.inf))
+    return np.searchsorted(sorted_samples, thresholds, side="right") / sorted_samples.size
+
+
+def acceptability_curves(values, thresholds, programmes=None):
+    """Acceptability curves of every programme and the Overall mix, from the same draws."""
+    programmes = programmes or list(programme_input_ranges)
+    curves = {
+        programme: acceptability_curve(evaluate_programme(values, programme)["Cost per WELLBY"], thresholds)
+        for programme in programmes
+    }
+    curves["Overall (incl. fixed costs)"] = acceptability_curve(
+        evaluate_overall(values, programmes)["Overall Total Cost per WELLBY"], thresholds
+    )
+    return curves
@@ -3,6 +3,7 @@ import numpy as np
 import pandas as pd
 import altair as alt
 from scipy.interpolate import PchipInterpolator
+from decay_fitting import survival_curve
 
 # --- Function to display Decay Visualisation --- (Phase 2)
 def display_decay_visualisation(decay_model, annual_decay_rate_input, months_to_zero_input, month_3_slider, month_6_slider, month_9_slider, month_12_slider, timeframe_of_interest_weeks):
@@ -100,6 +101,40 @@ def display_decay_visualisation(decay_model, annual_decay_rate_input, months_to_
 
     return custom_curve_weekly_points
 
+# --- Function to display a decay curve fitted to follow-up data ---
+def display_fitted_decay_visualisation(decay_form, fitted_programme, timeframe_of_interest_weeks):
+    fitted_model = fitted_programme["models"][decay_form]
+    curve_df = pd.DataFrame({
+        'Month': fitted_programme["curve_months"],
+        'Relative Benefit': fitted_model["survival"]
+    })
+
+    line_chart = alt.Chart(curve_df).mark_line(point=True).encode(
+        x=alt.X('Month:Q', title='Month'),
+        y=alt.Y('Relative Benefit:Q', title='Relative Benefit', scale=alt.Scale(domain=[0, 1])),
+        tooltip=['Month', 'Relative Benefit']
+    )
+    chart = line_chart
+    if "survival_ci_low" in fitted_model:
+        curve_df['Lower'] = fitted_model["survival_ci_low"]
+        curve_df['Upper'] = fitted_model["survival_ci_high"]
+        band_chart = alt.Chart(curve_df).mark_area(opacity=0.2).encode(x='Month:Q', y='Lower:Q', y2='Upper:Q')
+        chart = band_chart + line_chart
+    st.altair_chart(chart.properties(
+        title=f"{decay_form} Fit to Follow-up Data ({fitted_programme['num_clients']:,} clients)",
+        width=600,
+        height=300
+    ), use_container_width=True)
+    if "survival_ci_low" in fitted_model:
+        st.caption(f"This graph shows the proportion of clients still in remission, fitted to our follow-up data. The shaded band is the {fitted_programme['confidence']:.0%} bootstrap confidence interval.")
+    else:
+        st.caption("This graph shows the proportion of clients still in remission, fitted to our follow-up data.")
+
+    # Weekly benefit factors over the timeframe, on the same month scale as the custom curve
+    weeks_in_period_calc = int(timeframe_of_interest_weeks)
+    months_at_weeks = np.arange(weeks_in_period_calc) / weeks_in_period_calc * 12
+    return np.clip(survival_curve(decay_form, fitted_model["params"], months_at_weeks), 0, 1).tolist()
+
 # --- Function to calculate total WELLBYs per client --- 
 def calculate_total_wellbys_per_ea(
     initial_weekly_wellbeing_gain_per_ea,
@@ -115,12 +150,12 @@ def calculate_total_wellbys_per_ea(
     
     Args:
         initial_weekly_wellbeing_gain_per_ea: Weekly wellbeing gain at peak effectiveness (in wellbeing points)
-        decay_model: "Exponential Decay", "Linear Decay", or "Custom Curve"
+        decay_model: "Exponential Decay", "Linear Decay", "Custom Curve" or "Fitted Curve"
         timeframe_of_interest_weeks: Total weeks to calculate over
         working_weeks_per_year: Working weeks per year (used for decay calculations)
         annual_decay_rate: Annual decay rate for exponential decay (0-1)
         months_to_zero: Months until effect reaches zero for linear decay
-        custom_weekly_points: List of weekly decay factors for custom curve
+        custom_weekly_points: List of weekly decay factors for custom or fitted curve
         
     Returns:
         Total WELLBYs gained over the timeframe
@@ -161,7 +196,7 @@ def calculate_total_wellbys_per_ea(
         else: 
              total_wellbys = 0 
 
-    elif decay_model == "Custom Curve":
+    elif decay_model in ("Custom Curve", "Fitted Curve"):
         if custom_weekly_points:
             total_weekly_wellbeing = 0.0
             for week_benefit_factor in custom_weekly_points:
@@ -172,4 +207,60 @@ def calculate_total_wellbys_per_ea(
             total_weekly_wellbeing = initial_weekly_wellbeing_gain_per_ea * timeframe_of_interest_weeks * 0.5
             total_wellbys = total_weekly_wellbeing / weeks_per_year
     
-    return total_wellbys 
\ No newline at end of file
+    return total_wellbys 
+
+def calculate_programme_results(inputs, cost_per_session):
+    """
+    Programme results from a programme tab's inputs, as shown in its Programme Outcomes.
+
+    `inputs` holds the tab's slider values (rates as fractions) plus "weekly_points"
+    for custom or fitted curves and "timeframe_weeks".
+    """
+    # This calculates GROSS WELLBYs gained per client over the period, before accounting for time spent on intervention
+    gross_wellbys_per_ea_who_completes = calculate_total_wellbys_per_ea(
+        initial_weekly_wellbeing_gain_per_ea=inputs["peak_wellbeing"] - inputs["baseline_wellbeing"],
+        decay_model=inputs["decay_model"],
+        timeframe_of_interest_weeks=inputs["timeframe_weeks"],
+        working_weeks_per_year=52,
+        annual_decay_rate=inputs["annual_decay_rate"],
+        months_to_zero=inputs["months_to_zero"],
+        custom_weekly_points=inputs["weekly_points"]
+    )
+
+    total_EAs = inputs["num_participants"]
+    total_retained_EAs = total_EAs * inputs["retention_rate"]
+
+    # Total gross WELLBYs from all clients who are retained
+    gross_wellbys_from_retained = gross_wellbys_per_ea_who_completes * total_retained_EAs
+    # Divide by harm proportion to account for broader societal benefits beyond the individual
+    net_wellbys_gained = gross_wellbys_from_retained / inputs["harm_proportion"]
+
+    # Total cost is only the direct sessions cost
+    total_cost = inputs["sessions_per_participant"] * cost_per_session * total_EAs
+    cost_per_wellby = total_cost / net_wellbys_gained if net_wellbys_gained > 0 else np.nan
+
+    net_wellbys_per_retained_client = (net_wellbys_gained / total_retained_EAs) if total_retained_EAs > 0 else 0
+    gross_wellbys_per_retained_client = (gross_wellbys_from_retained / total_retained_EAs) if total_retained_EAs > 0 else 0
+
+    return {
+        "Total Cost (Money Spent)": total_cost,
+        "Net WELLBYs Generated": net_wellbys_gained,
+        "Cost per WELLBY": cost_per_wellby,
+        "Total Clients Seen": total_EAs,
+        "Clients Retained": total_retained_EAs,
+        "Net WELLBYs per Retained Client": net_wellbys_per_retained_client,
+        "Gross WELLBYs per Retained Client": gross_wellbys_per_retained_client,
+        # The inputs behind these results, for logging and scenario analyses
+        "Inputs": {
+            "decay_model": inputs["decay_model"],
+            "annual_decay_rate": inputs["annual_decay_rate"],
+            "months_to_zero": inputs["months_to_zero"],
+            "baseline_wellbeing": inputs["baseline_wellbeing"],
+            "peak_wellbeing": inputs["peak_wellbeing"],
+            "retention_rate": inputs["retention_rate"],
+            "harm_proportion": inputs["harm_proportion"],
+            "cost_per_session": cost_per_session,
+            "sessions_per_participant": inputs["sessions_per_participant"],
+            "num_participants": inputs["num_participants"]
+        }
+    }